@@ -3,8 +3,10 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
 from config import config
+from .replica import SessaoRoteada
 
-db = SQLAlchemy()
+# A sessão manda as leituras das rotas somente leitura para a réplica, quando configurada (app/replica.py).
+db = SQLAlchemy(session_options={'class_': SessaoRoteada})
 migrate = Migrate()
 
 # Configuração do LoginManager
@@ -26,6 +28,20 @@ def create_app(config_name='default'):
 
     db.init_app(app)
     migrate.init_app(app, db)
+
+    # PRAGMAs do perfil SQLite configurado em toda conexão nova (no PostgreSQL não faz nada).
+    from .dialeto import aplicar_pragmas_sqlite, pragmas_sqlite
+    pragmas = pragmas_sqlite(app.config['SQLITE_PERFIL'], app.config['SQLITE_PRAGMAS'])
+    with app.app_context():
+        for engine in db.engines.values():
+            aplicar_pragmas_sqlite(engine, pragmas)
+
+    from .replica import replica, replica_cli
+    replica.init_app(app)
+    app.cli.add_command(replica_cli)
+
+    from .instrumentacao import instrumentacao_sql
+    instrumentacao_sql.init_app(app)
     login_manager.init_app(app)
 
     # Registro dos Blueprints
@@ -38,4 +54,14 @@ def create_app(config_name='default'):
     from .admin import admin_bp
     app.register_blueprint(admin_bp, url_prefix='/admin')
 
+    # Índice unificado de vencimentos: registra os eventos de sincronização e o comando de reconstrução.
+    from .vencimentos import vencimentos_cli
+    app.cli.add_command(vencimentos_cli)
+
+    from .cache import cache_painel
+    cache_painel.init_app(app)
+
+    from .tarefas import fila_importacao
+    fila_importacao.init_app(app)
+
     return app
@@ -1,15 +1,21 @@
-from flask import render_template, redirect, url_for, flash, current_app, request, Response
+from flask import render_template, redirect, url_for, flash, current_app, request, Response, make_response, session, stream_with_context, jsonify
 from . import admin_bp
 from ..auth.decorators import admin_required
 from itsdangerous import URLSafeTimedSerializer
 import re
-from datetime import date, timedelta
+from datetime import date
 from sqlalchemy.orm import joinedload
 from sqlalchemy import distinct
-from sqlalchemy import or_, func, literal_column
+from sqlalchemy import func
 import re
 from flask_login import current_user
+from markupsafe import escape
 import io
+import csv
+import hashlib
+import tempfile
+import os
+from werkzeug.utils import secure_filename
 
 
 
@@ -19,7 +25,15 @@ import pandas as pd
 from datetime import datetime
 from .. import db
 from ..models import (Empresa, DocumentoFiscal, Motorista, Usuario, Veiculo, DocumentoMotorista, 
-DocumentoVeiculo, ConfiguracaoAlerta, format_cnpj, format_cpf)
+DocumentoVeiculo, ConfiguracaoAlerta, TarefaImportacao, chave_cnpj, format_cnpj)
+from ..classificador import obter_classificador
+from ..vencimentos import ROTULOS_ENTIDADE, FiltrosVencimento, contadores_painel, iterar_vencimentos
+from ..cache import cache_painel, versao_dados
+from ..exportacao import gerar_xlsx
+from ..importacao import ArquivoInvalido, Previa, simular_importacao
+from ..tarefas import fila_importacao, salvar_envio
+from ..replica import leitura_na_replica
+from ..instrumentacao import metricas_compilacao
 
 # Aplica o decorador a TODAS as rotas deste blueprint
 @admin_bp.before_request
@@ -30,6 +44,7 @@ def require_admin_access():
 # --- ROTAS DE GERENCIAMENTO ---
 
 @admin_bp.route('/empresas')
+@leitura_na_replica
 def gerenciar_empresas():
     query = Empresa.query.order_by(Empresa.razao_social)
     # Se o usuário não for 'master', filtra para mostrar apenas a sua empresa
@@ -83,7 +98,7 @@ def editar_empresa(empresa_id):
 
         # Validação de duplicidade (ignorando a própria empresa)
         razao_existente = Empresa.query.filter(
-            Empresa.razao_social == nova_razao,
+            func.upper(Empresa.razao_social) == nova_razao,
             Empresa.id != empresa_id
         ).first()
         if razao_existente:
@@ -91,7 +106,7 @@ def editar_empresa(empresa_id):
             return render_template('admin/editar_empresa.html', empresa=empresa)
 
         cnpj_existente = Empresa.query.filter(
-            Empresa.cnpj == novo_cnpj_formatado,
+            Empresa.cnpj_chave == chave_cnpj(novo_cnpj_limpo),
             Empresa.id != empresa_id
         ).first()
         if cnpj_existente:
@@ -100,7 +115,7 @@ def editar_empresa(empresa_id):
 
         # Atualiza os dados e salva no banco
         empresa.razao_social = nova_razao
-        empresa.cnpj = novo_cnpj_limpo  # Salva o CNPJ sem formatação
+        empresa.cnpj = novo_cnpj_formatado  # O validador também atualiza a chave (cnpj_chave)
         db.session.commit()
 
         flash('Dados da empresa atualizados com sucesso!', 'success')
@@ -143,6 +158,7 @@ def toggle_usuario_status(usuario_id):
 
 
 @admin_bp.route('/motoristas')
+@leitura_na_replica
 def gerenciar_motoristas():
     query = Motorista.query.options(db.joinedload(Motorista.empresa)).order_by(Motorista.nome)
     # Se o usuário não for 'master', filtra pelos motoristas da sua empresa
@@ -157,6 +173,7 @@ def gerenciar_motoristas():
 
 
 @admin_bp.route('/veiculos')
+@leitura_na_replica
 def gerenciar_veiculos():
     query = Veiculo.query.options(db.joinedload(Veiculo.empresa)).order_by(Veiculo.placa)
     # Se o usuário não for 'master', filtra pelos veículos da sua empresa
@@ -167,9 +184,79 @@ def gerenciar_veiculos():
     return render_template('admin/gerenciar_veiculos.html', veiculos=todos_veiculos)
 
 # --- Rota da página de Upload ---
+
+# Quantidade de importações recentes do usuário exibidas na página de upload.
+TAREFAS_RECENTES = 10
+
 @admin_bp.route('/upload_page')
 def upload_page():
-    return render_template('admin/upload_documentos.html')
+    tarefas = (TarefaImportacao.query.filter_by(usuario_id=current_user.id)
+               .order_by(TarefaImportacao.id.desc()).limit(TAREFAS_RECENTES).all())
+    return render_template('admin/upload_documentos.html', tarefas=tarefas)
+
+
+def _receber_importacao(tipo, arquivos):
+    """
+    Com `dry_run` marcado no formulário (ou na URL), devolve na hora a prévia da
+    importação para download; sem ele, salva os arquivos em disco, cria a tarefa e
+    a envia para a fila, e a importação roda em segundo plano. Vários arquivos
+    (ou planilhas de uma mesma pasta de trabalho) formam uma única tarefa.
+    """
+    if request.values.get('dry_run', '').lower() in ('1', 'true', 'on'):
+        return _previa_importacao(tipo, arquivos)
+    tarefa = fila_importacao.salvar_arquivos(tipo, arquivos, current_user.id)
+    fila_importacao.enfileirar(tarefa.id)
+    rotulo = 'Arquivo' if len(arquivos) == 1 else f'{len(arquivos)} arquivos:'
+    flash(f'{rotulo} <b>{escape(tarefa.nome_arquivo)}</b> recebido(s). A importação está em andamento; '
+          'acompanhe o progresso em "Importações recentes".', 'info')
+    return redirect(url_for('admin.upload_page'))
+
+
+def _previa_importacao(tipo, arquivos):
+    """Simula a importação em uma transação somente leitura e devolve o relatório em CSV."""
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho = salvar_envio(arquivos, os.path.join(diretorio, 'envio'))
+        try:
+            previa, _, contadores = simular_importacao(tipo, caminho, fila_importacao.obter_processos())
+        except ArquivoInvalido as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('admin.upload_page'))
+
+    # A coluna da planilha só aparece quando o envio tem mais de uma.
+    com_planilha = any(item.planilha for item in previa.linhas)
+    buffer = io.StringIO()
+    buffer.write('\ufeff')  # BOM, para o Excel reconhecer o arquivo como UTF-8
+    escritor = csv.writer(buffer, delimiter=';', lineterminator='\n')
+    escritor.writerow(['Planilha'] * com_planilha + ['Linha', 'Situação', 'Chave', 'Valor atual', 'Valor novo', 'Detalhe'])
+    for item in previa.ordenadas():
+        escritor.writerow([item.planilha] * com_planilha + [
+            item.linha or '', Previa.SITUACOES[item.situacao], item.chave,
+            _valor_da_previa(item.valor_atual), _valor_da_previa(item.valor_novo), item.detalhe])
+    escritor.writerow([])
+    for nome, valor in contadores.items():
+        escritor.writerow([''] * com_planilha + ['', 'Total', nome, '', valor, ''])
+
+    nome_relatorio = f"previa_{tipo}_{secure_filename(arquivos[0].filename.rsplit('.', 1)[0]) or 'arquivo'}.csv"
+    return Response(buffer.getvalue(), mimetype='text/csv',
+                    headers={'Content-Disposition': f'attachment;filename={nome_relatorio}'})
+
+
+def _valor_da_previa(valor):
+    if isinstance(valor, date):
+        return valor.strftime('%d/%m/%Y')
+    return '' if valor is None else valor
+
+
+@admin_bp.route('/importacoes/<int:tarefa_id>')
+def status_importacao(tarefa_id):
+    """Estado, progresso e mensagens de uma importação, consultados pela página de upload."""
+    tarefa = db.session.get(TarefaImportacao, tarefa_id)
+    if tarefa is None or (current_user.role != 'master' and tarefa.usuario_id != current_user.id):
+        return jsonify({'erro': 'Importação não encontrada.'}), 404
+    # Uma tarefa deixada para trás por um processo que terminou volta para a fila ou termina em erro.
+    fila_importacao.recuperar(tarefa)
+    return jsonify(tarefa.como_dict())
+
 
 # --- Geração de Link de Registro ---
 @admin_bp.route('/convites/gerar')
@@ -189,84 +276,16 @@ def upload_empresas():
         flash('Nenhum arquivo foi enviado.', 'danger')
         return redirect(url_for('admin.upload_page'))
 
-    arquivo = request.files['arquivo']
-    if arquivo.filename == '':
+    arquivos = [arquivo for arquivo in request.files.getlist('arquivo') if arquivo.filename]
+    if not arquivos:
         flash('Nenhum arquivo foi selecionado.', 'danger')
         return redirect(url_for('admin.upload_page'))
 
-    extensao = arquivo.filename.rsplit('.', 1)[1].lower()
-    if extensao not in ['csv', 'xlsx', 'xls']:
+    if any(arquivo.filename.rsplit('.', 1)[-1].lower() not in ['csv', 'xlsx', 'xls'] for arquivo in arquivos):
         flash('Formato de arquivo inválido. Por favor, envie um arquivo .csv, .xls ou .xlsx', 'danger')
         return redirect(url_for('admin.upload_page'))
 
-    try:
-        if extensao == 'csv':
-            df = pd.read_csv(arquivo.stream, dtype=str, encoding='latin-1')
-        else:
-            df = pd.read_excel(arquivo.stream, dtype=str)
-
-        df.columns = [str(col).strip().lower() for col in df.columns]
-        colunas_esperadas = ['razao_social', 'cnpj']
-
-        if not all(col in df.columns for col in colunas_esperadas):
-            flash(f'O arquivo para empresas deve conter as colunas: {", ".join(colunas_esperadas)}', 'danger')
-            return redirect(url_for('admin.upload_page'))
-
-        novas_empresas = 0
-        cnpjs_ignorados = set()
-        razoes_ignoradas = set()
-
-        for _, row in df.iterrows():
-            cnpj = row.get('cnpj')
-            razao_social = row.get('razao_social')
-
-            if pd.isna(cnpj) or pd.isna(razao_social):
-                continue
-
-            cnpj_limpo = re.sub(r'[^0-9]', '', str(cnpj))
-            if len(cnpj_limpo) != 14:
-                continue
-            
-            razao_social_upper = str(razao_social).strip().upper()
-            cnpj_formatado = format_cnpj(cnpj_limpo)
-
-            # Verifica se o CNPJ ou a Razão Social já existem
-            empresa_por_cnpj = Empresa.query.filter_by(cnpj=cnpj_formatado).first()
-            empresa_por_razao = Empresa.query.filter_by(razao_social=razao_social_upper).first()
-
-            if empresa_por_cnpj:
-                cnpjs_ignorados.add(f"{razao_social_upper} ({cnpj_formatado})")
-                continue
-            
-            if empresa_por_razao:
-                razoes_ignoradas.add(f"{razao_social_upper} ({cnpj_formatado})")
-                continue
-
-            # Se nenhum existir, cria a nova empresa
-            nova_empresa = Empresa(
-                razao_social=razao_social_upper,
-                cnpj=cnpj_limpo
-            )
-            db.session.add(nova_empresa)
-            novas_empresas += 1
-        
-        if novas_empresas > 0:
-            db.session.commit()
-            flash(f'{novas_empresas} novas empresas foram cadastradas com sucesso!', 'success')
-        else:
-            flash('Nenhuma nova empresa para cadastrar.', 'info')
-
-        # Informa sobre as duplicatas ignoradas
-        if cnpjs_ignorados:
-            flash(f'<b>CNPJs já existentes (ignorados):</b><br>' + '<br>'.join(sorted(list(cnpjs_ignorados))), 'warning')
-        if razoes_ignoradas:
-            flash(f'<b>Razões Sociais já existentes (ignoradas):</b><br>' + '<br>'.join(sorted(list(razoes_ignoradas))), 'warning')
-
-    except Exception as e:
-        db.session.rollback()
-        flash(f'Ocorreu um erro inesperado ao processar o arquivo: {e}', 'danger')
-
-    return redirect(url_for('admin.upload_page'))
+    return _receber_importacao('empresas', arquivos)
 
 
 
@@ -276,8 +295,8 @@ def upload_motoristas():
         flash('Nenhum arquivo foi enviado.', 'danger')
         return redirect(url_for('admin.upload_page'))
 
-    arquivo = request.files['arquivo']
-    if arquivo.filename == '':
+    arquivos = [arquivo for arquivo in request.files.getlist('arquivo') if arquivo.filename]
+    if not arquivos:
         flash('Nenhum arquivo foi selecionado.', 'danger')
         return redirect(url_for('admin.upload_page'))
     
@@ -285,90 +304,11 @@ def upload_motoristas():
         flash('<b>Ação Necessária:</b> Nenhuma empresa está cadastrada. Por favor, cadastre ao menos uma empresa no <b>PASSO 1</b> antes de importar motoristas.', 'warning')
         return redirect(url_for('admin.upload_page'))
 
-    extensao = arquivo.filename.rsplit('.', 1)[1].lower()
-    if extensao not in ['csv', 'xlsx', 'xls']:
+    if any(arquivo.filename.rsplit('.', 1)[-1].lower() not in ['csv', 'xlsx', 'xls'] for arquivo in arquivos):
         flash('Formato de arquivo inválido. Use .csv, .xls ou .xlsx.', 'danger')
         return redirect(url_for('admin.upload_page'))
 
-    try:
-        if extensao == 'csv':
-            try:
-                df = pd.read_csv(arquivo.stream, dtype=str)
-            except UnicodeDecodeError:
-                arquivo.stream.seek(0)
-                df = pd.read_csv(arquivo.stream, dtype=str, encoding='latin-1')
-        else:
-            df = pd.read_excel(arquivo.stream, dtype=str)
-
-        df.columns = [str(col).strip().lower() for col in df.columns]
-        colunas_esperadas = ['nome', 'cpf', 'cnpj_transportador']
-        
-        if not all(col in df.columns for col in colunas_esperadas):
-            flash(f'O arquivo para motoristas deve conter as colunas obrigatórias: {", ".join(colunas_esperadas)}', 'danger')
-            return redirect(url_for('admin.upload_page'))
-
-        cadastrados_count = 0
-        cpfs_ja_existentes_count = 0
-        empresas_nao_encontradas = set()
-        dados_invalidos = []
-
-        for index, row in df.iterrows():
-            linha_num = index + 2
-            nome, cpf, cnpj = row.get('nome'), row.get('cpf'), row.get('cnpj_transportador')
-            
-            if pd.isna(nome) or pd.isna(cpf) or pd.isna(cnpj):
-                dados_invalidos.append(f"Linha {linha_num}: Faltando nome, cpf ou cnpj.")
-                continue
-
-            cnpj_limpo = re.sub(r'[^0-9]', '', str(cnpj))
-            if len(cnpj_limpo) != 14:
-                dados_invalidos.append(f"Linha {linha_num}: CNPJ '{cnpj}' inválido.")
-                continue
-
-            empresa = Empresa.query.filter_by(cnpj=format_cnpj(cnpj_limpo)).first()
-            if not empresa:
-                empresas_nao_encontradas.add(format_cnpj(cnpj_limpo))
-                continue
-            
-            cpf_limpo = re.sub(r'[^0-9]', '', str(cpf))
-            if len(cpf_limpo) != 11:
-                dados_invalidos.append(f"Linha {linha_num}: CPF '{cpf}' inválido.")
-                continue
-
-            if Motorista.query.filter_by(cpf=format_cpf(cpf_limpo)).first():
-                cpfs_ja_existentes_count += 1
-                continue
-
-            novo_motorista = Motorista(
-                nome=str(nome).upper(), cpf=cpf_limpo,
-                cnh=str(row.get('cnh')) if pd.notna(row.get('cnh')) else None,
-                operacao=str(row.get('operacao')).upper() if pd.notna(row.get('operacao')) else None,
-                empresa_id=empresa.id
-            )
-            db.session.add(novo_motorista)
-            cadastrados_count += 1
-        
-        if cadastrados_count > 0:
-            db.session.commit()
-            flash(f'<b><i class="fas fa-check-circle"></i> Sucesso: {cadastrados_count} novo(s) motorista(s) foram cadastrado(s).</b>', 'success')
-        
-        if cpfs_ja_existentes_count > 0:
-            flash(f'<b><i class="fas fa-info-circle"></i> Aviso: {cpfs_ja_existentes_count} motorista(s) foram ignorado(s) porque o CPF já consta no sistema.</b>', 'info')
-
-        if empresas_nao_encontradas:
-            flash(f'<b><i class="fas fa-exclamation-triangle"></i> Erro Crítico: A(s) empresa(s) com o(s) seguinte(s) CNPJ(s) não foi(ram) encontrada(s):</b><br>' + '<br>'.join(sorted(list(empresas_nao_encontradas))), 'danger')
-
-        if dados_invalidos:
-            flash(f'<b><i class="fas fa-exclamation-triangle"></i> {len(dados_invalidos)} linha(s) com dados inválidos foram ignoradas:</b><br>' + '<br>'.join(dados_invalidos), 'danger')
-
-        if not any([cadastrados_count, cpfs_ja_existentes_count, empresas_nao_encontradas, dados_invalidos]):
-             flash('Arquivo processado, mas nenhuma alteração foi necessária. Verifique se os dados do arquivo já existem no sistema.', 'info')
-
-    except Exception as e:
-        db.session.rollback()
-        flash(f'Ocorreu um erro inesperado ao processar o arquivo: {e}', 'danger')
-
-    return redirect(url_for('admin.upload_page'))
+    return _receber_importacao('motoristas', arquivos)
 
 
 @admin_bp.route('/upload/veiculos', methods=['POST'])
@@ -377,8 +317,8 @@ def upload_veiculos():
         flash('Nenhum arquivo foi enviado.', 'danger')
         return redirect(url_for('admin.upload_page'))
 
-    arquivo = request.files['arquivo']
-    if arquivo.filename == '':
+    arquivos = [arquivo for arquivo in request.files.getlist('arquivo') if arquivo.filename]
+    if not arquivos:
         flash('Nenhum arquivo foi selecionado.', 'danger')
         return redirect(url_for('admin.upload_page'))
 
@@ -386,144 +326,16 @@ def upload_veiculos():
         flash('<b>Ação Necessária:</b> Nenhuma empresa está cadastrada. Por favor, cadastre ao menos uma empresa no <b>PASSO 1</b> antes de importar veículos.', 'warning')
         return redirect(url_for('admin.upload_page'))
 
-    extensao = arquivo.filename.rsplit('.', 1)[1].lower()
-    if extensao not in ['csv', 'xlsx', 'xls']:
+    if any(arquivo.filename.rsplit('.', 1)[-1].lower() not in ['csv', 'xlsx', 'xls'] for arquivo in arquivos):
         flash('Formato de arquivo inválido. Use .csv, .xls ou .xlsx.', 'danger')
         return redirect(url_for('admin.upload_page'))
 
-    try:
-        if extensao == 'csv':
-            try:
-                df = pd.read_csv(arquivo.stream, dtype=str)
-            except UnicodeDecodeError:
-                arquivo.stream.seek(0)
-                df = pd.read_csv(arquivo.stream, dtype=str, encoding='latin-1')
-        else:
-            df = pd.read_excel(arquivo.stream, dtype=str)
-
-        df.columns = [str(col).strip().lower() for col in df.columns]
-        colunas_esperadas = ['placa', 'cnpj_transportador']
-
-        if not all(col in df.columns for col in colunas_esperadas):
-            flash(f'O arquivo para veículos deve conter as colunas obrigatórias: {", ".join(colunas_esperadas)}', 'danger')
-            return redirect(url_for('admin.upload_page'))
-
-        cadastrados_count = 0
-        placas_ja_existentes_count = 0
-        empresas_nao_encontradas = set()
-        dados_invalidos = []
-
-        for index, row in df.iterrows():
-            linha_num = index + 2
-            placa, cnpj = row.get('placa'), row.get('cnpj_transportador')
-
-            if pd.isna(placa) or pd.isna(cnpj):
-                dados_invalidos.append(f"Linha {linha_num}: Faltando placa ou cnpj.")
-                continue
-
-            cnpj_limpo = re.sub(r'[^0-9]', '', str(cnpj))
-            if len(cnpj_limpo) != 14:
-                dados_invalidos.append(f"Linha {linha_num}: CNPJ '{cnpj}' inválido.")
-                continue
-            
-            empresa = Empresa.query.filter_by(cnpj=format_cnpj(cnpj_limpo)).first()
-            if not empresa:
-                empresas_nao_encontradas.add(format_cnpj(cnpj_limpo))
-                continue
-            
-            placa_upper = str(placa).strip().upper()
-            if not placa_upper:
-                dados_invalidos.append(f"Linha {linha_num}: Placa não pode estar em branco.")
-                continue
-
-            if Veiculo.query.filter_by(placa=placa_upper).first():
-                placas_ja_existentes_count += 1
-                continue
-
-            novo_veiculo = Veiculo(
-                placa=placa_upper,
-                operacao=str(row.get('operacao')).upper() if pd.notna(row.get('operacao')) else None,
-                empresa_id=empresa.id
-            )
-            db.session.add(novo_veiculo)
-            cadastrados_count += 1
-
-        if cadastrados_count > 0:
-            db.session.commit()
-            flash(f'<b><i class="fas fa-check-circle"></i> Sucesso: {cadastrados_count} novo(s) veículo(s) foram cadastrado(s).</b>', 'success')
-        
-        if placas_ja_existentes_count > 0:
-            flash(f'<b><i class="fas fa-info-circle"></i> Aviso: {placas_ja_existentes_count} veículo(s) foram ignorado(s) porque a placa já consta no sistema.</b>', 'info')
-
-        if empresas_nao_encontradas:
-            flash(f'<b><i class="fas fa-exclamation-triangle"></i> Erro Crítico: A(s) empresa(s) com o(s) seguinte(s) CNPJ(s) não foi(ram) encontrada(s):</b><br>' + '<br>'.join(sorted(list(empresas_nao_encontradas))), 'danger')
-
-        if dados_invalidos:
-            flash(f'<b><i class="fas fa-exclamation-triangle"></i> {len(dados_invalidos)} linha(s) com dados inválidos foram ignoradas:</b><br>' + '<br>'.join(dados_invalidos), 'danger')
-
-        if not any([cadastrados_count, placas_ja_existentes_count, empresas_nao_encontradas, dados_invalidos]):
-             flash('Arquivo processado, mas nenhuma alteração foi necessária. Verifique se os dados do arquivo já existem no sistema.', 'info')
-
-    except Exception as e:
-        db.session.rollback()
-        flash(f'Ocorreu um erro inesperado ao processar o arquivo: {e}', 'danger')
-
-    return redirect(url_for('admin.upload_page'))
+    return _receber_importacao('veiculos', arquivos)
 
 
 
 # --- BLOCO 2: ROTAS DE VALIDADE DE DOCUMENTOS (COM CORREÇÃO DE ENCODING) ---
 
-def process_document_validity(df, id_col, id_type_name, model, find_entity_func, entity_fk_name):
-    novos, atualizados, nao_encontrados = 0, 0, set()
-
-    for _, row in df.iterrows():
-        entity_identifier = row.get(id_col)
-        doc_name = row.get('nome_documento')
-        vencimento_str = row.get('data_vencimento')
-
-        if pd.isna(entity_identifier) or pd.isna(doc_name) or pd.isna(vencimento_str):
-            continue
-
-        entity = find_entity_func(entity_identifier)
-        if not entity:
-            nao_encontrados.add(str(entity_identifier))
-            continue
-
-        try:
-            data_vencimento = pd.to_datetime(vencimento_str, dayfirst=True, errors='coerce').date()
-            if pd.isna(data_vencimento):
-                continue
-        except (ValueError, TypeError):
-            continue
-
-        documento_existente = model.query.filter(
-            getattr(model, entity_fk_name) == entity.id,
-            model.nome_documento == str(doc_name).upper()
-        ).first()
-
-        if documento_existente:
-            if documento_existente.data_vencimento != data_vencimento:
-                documento_existente.data_vencimento = data_vencimento
-                atualizados += 1
-        else:
-            novo_documento = model(**{
-                entity_fk_name: entity.id,
-                'nome_documento': str(doc_name).upper(),
-                'data_vencimento': data_vencimento
-            })
-            db.session.add(novo_documento)
-            novos += 1
-            
-    if novos > 0:
-        flash(f'{novos} novas validades de documentos foram cadastradas.', 'success')
-    if atualizados > 0:
-        flash(f'{atualizados} validades de documentos foram atualizadas.', 'success')
-    if not novos and not atualizados:
-        flash('Nenhum documento novo ou atualização necessária com base no arquivo enviado.', 'info')
-    if nao_encontrados:
-        flash(f'Atenção: Os seguintes {id_type_name} não foram encontrados: {", ".join(nao_encontrados)}', 'warning')
-
 def handle_upload_and_process(required_cols, process_func):
     if 'arquivo' not in request.files:
         flash('Nenhum arquivo foi enviado.', 'danger')
@@ -568,483 +380,251 @@ def upload_doc_fiscal():
     if file_input_name not in request.files:
         flash('Nenhum arquivo fiscal enviado.', 'danger')
         return redirect(url_for('admin.upload_page'))
-    arquivo = request.files[file_input_name]
-    if arquivo.filename == '':
+    arquivos = [arquivo for arquivo in request.files.getlist(file_input_name) if arquivo.filename]
+    if not arquivos:
         flash('Nenhum arquivo fiscal selecionado.', 'danger')
         return redirect(url_for('admin.upload_page'))
-    try:
-        df = pd.read_excel(arquivo, engine='openpyxl', dtype={'Nome': str, 'Tipo evento': str})
-        df.columns = [str(col).strip().lower() for col in df.columns]
-
-        # CORREÇÃO: Usa 'nome' como a coluna de identificação
-        nome_col, doc_name_col, due_date_col = 'nome', 'tipo evento', 'data vencimento'
-        
-        required_cols = [nome_col, doc_name_col, due_date_col]
-        if not all(col in df.columns for col in required_cols):
-            flash(f'Arquivo fiscal deve conter as colunas: "Nome", "Tipo evento", "Data vencimento".', 'danger')
-            return redirect(url_for('admin.upload_page'))
-
-        df.dropna(subset=required_cols, inplace=True)
-
-        novos, atualizados, nao_encontrados = 0, 0, set()
-        for _, row in df.iterrows():
-            nome_empresa, doc_name, vencimento_obj = row.get(nome_col), row.get(doc_name_col), row.get(due_date_col)
-
-            empresa = Empresa.query.filter(Empresa.razao_social.ilike(f"%{str(nome_empresa).strip()}%")).first()
-            if not empresa:
-                nao_encontrados.add(str(nome_empresa))
-                continue
-            try:
-                data_vencimento = pd.to_datetime(vencimento_obj).date()
-            except (ValueError, TypeError):
-                continue
-                
-            doc_existente = DocumentoFiscal.query.filter_by(empresa_id=empresa.id, nome_documento=str(doc_name).upper()).first()
-            if doc_existente:
-                if doc_existente.data_vencimento != data_vencimento:
-                    doc_existente.data_vencimento = data_vencimento
-                    atualizados += 1
-            else:
-                novo_documento = DocumentoFiscal(empresa_id=empresa.id, nome_documento=str(doc_name).upper(), data_vencimento=data_vencimento)
-                db.session.add(novo_documento)
-                novos += 1
-                
-        db.session.commit()
-
-        if novos: flash(f'{novos} novas validades fiscais cadastradas.', 'success')
-        if atualizados: flash(f'{atualizados} validades fiscais atualizadas.', 'info')
-        if nao_encontrados: flash(f'Atenção: As seguintes empresas não foram encontradas: {", ".join(sorted(nao_encontrados))}', 'warning')
-
-    except Exception as e:
-        db.session.rollback()
-        flash(f'Erro ao processar arquivo fiscal: {e}', 'danger')
-        
-    return redirect(url_for('admin.upload_page'))
-
+    return _receber_importacao('doc_fiscal', arquivos)
 
 @admin_bp.route('/upload/doc_motorista', methods=['POST'])
 def upload_doc_motorista():
     if 'documentos-motorista-file' not in request.files:
         flash('Nenhum arquivo de motorista enviado.', 'danger')
         return redirect(url_for('admin.upload_page'))
-    file = request.files['documentos-motorista-file']
-    if file.filename == '':
+    arquivos = [arquivo for arquivo in request.files.getlist('documentos-motorista-file') if arquivo.filename]
+    if not arquivos:
         flash('Nenhum arquivo de motorista selecionado.', 'danger')
         return redirect(url_for('admin.upload_page'))
-    try:
-        df = pd.read_excel(file, engine='openpyxl', dtype={'Nome': str, 'Tipo evento': str})
-        df.columns = [str(c).strip().lower().replace(' ', '_') for c in df.columns]
-        
-        expected_cols = {'tipo_evento', 'nome', 'data_vencimento'}
-        if not expected_cols.issubset(df.columns):
-            flash(f"Arquivo de motorista deve conter: 'Tipo evento', 'Nome', 'Data vencimento'.", 'danger')
-            return redirect(url_for('admin.upload_page'))
-
-        df.dropna(subset=['tipo_evento', 'nome', 'data_vencimento'], inplace=True)
-
-        novos, atualizados, nao_encontrados, duplicados = 0, 0, set(), set()
-        for _, row in df.iterrows():
-            nome_doc, nome_mot, venc_obj = row.get('tipo_evento'), row.get('nome'), row.get('data_vencimento')
-            
-            try:
-                venc_date = pd.to_datetime(venc_obj).date()
-            except (ValueError, TypeError):
-                continue
-
-            motoristas = Motorista.query.filter(Motorista.nome.ilike(str(nome_mot).strip())).all()
-            if len(motoristas) == 1:
-                motorista = motoristas[0]
-            elif len(motoristas) > 1:
-                duplicados.add(str(nome_mot).strip())
-                continue
-            else:
-                nao_encontrados.add(str(nome_mot).strip())
-                continue
-
-            doc_existente = DocumentoMotorista.query.filter_by(
-                motorista_id=motorista.id,
-                nome_documento=str(nome_doc).strip().upper()
-            ).first()
-
-            if doc_existente:
-                if doc_existente.data_vencimento != venc_date:
-                    doc_existente.data_vencimento = venc_date
-                    atualizados += 1
-            else:
-                novo_doc = DocumentoMotorista(
-                    nome_documento=str(nome_doc).strip().upper(),
-                    data_vencimento=venc_date,
-                    motorista_id=motorista.id
-                )
-                db.session.add(novo_doc)
-                novos += 1
-
-        db.session.commit()
-        
-        if novos: flash(f'{novos} novas validades de motoristas cadastradas.', 'success')
-        if atualizados: flash(f'{atualizados} validades de motoristas foram atualizadas.', 'info')
-        if nao_encontrados: flash(f'Motoristas não encontrados: {", ".join(sorted(list(nao_encontrados)))}', 'warning')
-        if duplicados: flash(f'Motoristas com nome duplicado (não processados): {", ".join(sorted(list(duplicados)))}', 'danger')
-
-    except Exception as e:
-        db.session.rollback()
-        flash(f'Erro ao processar arquivo de motoristas: {e}', 'danger')
-        
-    return redirect(url_for('admin.upload_page'))
+    return _receber_importacao('doc_motorista', arquivos)
 
 @admin_bp.route('/upload/doc_veiculo', methods=['POST'])
 def upload_doc_veiculo():
     if 'documentos-veiculo-file' not in request.files:
         flash('Nenhum arquivo de veículo enviado.', 'danger')
         return redirect(url_for('admin.upload_page'))
-    file = request.files['documentos-veiculo-file']
-    if file.filename == '':
+    arquivos = [arquivo for arquivo in request.files.getlist('documentos-veiculo-file') if arquivo.filename]
+    if not arquivos:
         flash('Nenhum arquivo de veículo selecionado.', 'danger')
         return redirect(url_for('admin.upload_page'))
+    return _receber_importacao('doc_veiculo', arquivos)
+
+
+# --- ROTA DO PAINEL PRINCIPAL (DASHBOARD) ---
+
+def _filtros_da_requisicao():
+    """Lê os filtros do painel da URL; o usuário 'comum' fica sempre restrito à própria empresa."""
+    if current_user.role != 'master':
+        empresa_id = current_user.empresa_id
+    else:
+        empresa_id = request.args.get('empresa_id', type=int)
+    return FiltrosVencimento(
+        empresa_id=empresa_id,
+        entidade=request.args.get('entidade', ''),
+        status=request.args.get('status', ''),
+        busca=request.args.get('q', '').strip(),
+        ocultar_vencidos=request.args.get('hide_expired', 'false').lower() == 'true',
+    )
+
+
+# Linhas lidas do banco por lote e tamanho (em caracteres) de cada bloco enviado nas exportações.
+LOTE_EXPORTACAO = 1000
+TAMANHO_BLOCO_EXPORTACAO = 64 * 1024
+
+TAMANHO_PAGINA_PADRAO = 100
+TAMANHO_PAGINA_MAXIMO = 500
+
+
+def _ler_cursor(valor):
+    """Converte o parâmetro 'apos' ("AAAA-MM-DD_entidade_id") na chave do último item exibido."""
     try:
-        df = pd.read_excel(file, engine='openpyxl', dtype={'Nome': str, 'Tipo evento': str})
-        df.columns = [str(c).strip().lower().replace(' ', '_') for c in df.columns]
-        df.rename(columns={'tipo_evento': 'documento', 'nome': 'placa', 'data_vencimento': 'vencimento'}, inplace=True)
-        
-        expected_cols = {'documento', 'placa', 'vencimento'}
-        if not expected_cols.issubset(df.columns):
-            flash(f"Arquivo de veículo deve conter: 'Tipo evento', 'Nome' (placa), 'Data vencimento'.", 'danger')
-            return redirect(url_for('admin.upload_page'))
-        
-        df.dropna(subset=['documento', 'placa', 'vencimento'], inplace=True)
-        
-        novos, atualizados, nao_encontrados = 0, 0, set()
-        for _, row in df.iterrows():
-            nome_doc, placa_veic, venc_obj = row['documento'], row['placa'], row['vencimento']
-            
-            try:
-                venc_date = pd.to_datetime(venc_obj).date()
-            except (ValueError, TypeError):
-                continue
-
-            placa_limpa = str(placa_veic).strip().upper()
-            veiculo = Veiculo.query.filter(Veiculo.placa.ilike(placa_limpa)).first()
-            if not veiculo:
-                nao_encontrados.add(placa_limpa)
-                continue
-
-            doc_existente = DocumentoVeiculo.query.filter_by(
-                veiculo_id=veiculo.id,
-                nome_documento=str(nome_doc).strip().upper()
-            ).first()
-
-            if doc_existente:
-                if doc_existente.data_vencimento != venc_date:
-                    doc_existente.data_vencimento = venc_date
-                    atualizados += 1
-            else:
-                novo_doc = DocumentoVeiculo(
-                    nome_documento=str(nome_doc).strip().upper(),
-                    data_vencimento=venc_date,
-                    veiculo_id=veiculo.id
-                )
-                db.session.add(novo_doc)
-                novos += 1
-            
-        db.session.commit()
-        
-        if novos: flash(f'{novos} novas validades de veículos cadastradas.', 'success')
-        if atualizados: flash(f'{atualizados} validades de veículos foram atualizadas.', 'info')
-        if nao_encontrados: flash(f'Placas não encontradas: {", ".join(sorted(list(nao_encontrados)))}', 'warning')
+        data_str, entidade, id_str = valor.split('_', 2)
+        return date.fromisoformat(data_str), entidade, int(id_str)
+    except ValueError:
+        return None
 
-    except Exception as e:
-        db.session.rollback()
-        flash(f'Erro ao processar arquivo de veículos: {e}', 'danger')
-        
-    return redirect(url_for('admin.upload_page'))
 
+def _escrever_cursor(vencimento):
+    return f"{vencimento.data_vencimento.isoformat()}_{vencimento.entidade}_{vencimento.id}"
+
+
+
+
+def _montar_painel(today, filtros, user_empresa_id, por_pagina, cursor):
+    """Consulta a página de vencimentos, os contadores e a lista de empresas exibidos no painel."""
+    # Paginação por cursor (keyset): a página seguinte começa logo após a chave
+    # (vencimento, entidade, id) do último item, então qualquer página custa o mesmo que a primeira.
+    resultados = list(iterar_vencimentos(filtros, today, cursor=cursor, limite=por_pagina + 1))
+    proximo_cursor = None
+    if len(resultados) > por_pagina:
+        resultados = resultados[:por_pagina]
+        proximo_cursor = _escrever_cursor(resultados[-1])
+
+    urls_entidade = {
+        'motorista': url_for('admin.gerenciar_motoristas'),
+        'veiculo': url_for('admin.gerenciar_veiculos'),
+        'empresa': url_for('admin.gerenciar_empresas'),
+    }
+    final_items = []
+    for vencimento in resultados:
+        final_items.append({
+            'type': ROTULOS_ENTIDADE[vencimento.entidade], 'name': vencimento.nome, 'document_type': vencimento.nome_exibicao,
+            'empresa_name': vencimento.empresa_nome, 'due_date': vencimento.data_vencimento,
+            'days_left': vencimento.days_left, 'url': urls_entidade[vencimento.entidade], 'status': vencimento.status
+        })
+
+    # A lista de empresas para o filtro dropdown também é restrita
+    empresas_query = db.session.query(Empresa.id, Empresa.razao_social).order_by(Empresa.razao_social)
+    if user_empresa_id:
+        empresas_query = empresas_query.filter(Empresa.id == user_empresa_id)
+
+    # Apenas valores simples: o resultado é guardado em cache e reutilizado por outras requisições.
+    return {
+        'items': final_items,
+        'counts': contadores_painel(today, user_empresa_id),
+        'empresas': [{'id': id_, 'razao_social': razao} for id_, razao in empresas_query],
+        'proximo_cursor': proximo_cursor,
+    }
 
-# --- ROTA DO PAINEL PRINCIPAL (DASHBOARD) ---
 
 @admin_bp.route('/')
+@leitura_na_replica
 def admin_dashboard():
     """
     Painel principal (Dashboard) que exibe um resumo dos vencimentos de documentos,
     filtrando os dados com base na empresa do usuário logado, se não for 'master'.
+
+    Os dados de cada combinação (escopo da empresa, filtros, data) ficam em cache
+    até a próxima gravação que altere a versão dos dados; o ETag permite ao
+    navegador revalidar a página com uma resposta 304.
     """
     today = date.today()
-    
-    entidade_filter = request.args.get('entidade', '')
-    empresa_id_filter = request.args.get('empresa_id', '')
-    status_filter = request.args.get('status', '')
-    search_query = request.args.get('q', '').strip()
-    hide_expired = request.args.get('hide_expired', 'false').lower() == 'true'
+    filtros = _filtros_da_requisicao()
+    por_pagina = request.args.get('por_pagina', TAMANHO_PAGINA_PADRAO, type=int)
+    por_pagina = min(max(por_pagina, 1), TAMANHO_PAGINA_MAXIMO)
+    cursor = _ler_cursor(request.args.get('apos', ''))
 
     # Identifica o usuário e sua empresa. Se não for 'master', restringe a visão.
     user_empresa_id = None
+    escopo = 'master'
     if current_user.role != 'master':
         user_empresa_id = current_user.empresa_id
-        # Força o filtro para a empresa do usuário logado.
-        empresa_id_filter = user_empresa_id 
+        escopo = ('empresa', user_empresa_id)
 
-    configs = ConfiguracaoAlerta.query.all()
-    configs_dict = {config.nome_documento.upper(): config.prazo_alerta_dias for config in configs}
-    default_prazo = 30
-    known_generic_types = ['CVVTR', 'CIV', 'CIPP', 'CRLV', 'ANTT', 'CNH', 'ASO', 'ALVARÁ', 'LICENCIAMENTO']
+    chave = (escopo, tuple(sorted(request.args.items(multi=True))), today, versao_dados())
+    etag = hashlib.sha1(repr((chave, current_user.id, current_user.nome)).encode('utf-8')).hexdigest()
 
-    # --- Base de Consultas ---
-    q_motoristas = db.session.query(literal_column("'Motorista'").label('type'), Motorista.nome.label('name'), DocumentoMotorista.nome_documento.label('document_type'), Empresa.razao_social.label('empresa_name'), DocumentoMotorista.data_vencimento.label('due_date'), Motorista.id.label('owner_id'), Empresa.id.label('empresa_id')).join(Motorista, DocumentoMotorista.motorista_id == Motorista.id).join(Empresa, Motorista.empresa_id == Empresa.id)
-    q_veiculos = db.session.query(literal_column("'Veículo'").label('type'), Veiculo.placa.label('name'), DocumentoVeiculo.nome_documento.label('document_type'), Empresa.razao_social.label('empresa_name'), DocumentoVeiculo.data_vencimento.label('due_date'), Veiculo.id.label('owner_id'), Empresa.id.label('empresa_id')).join(Veiculo, DocumentoVeiculo.veiculo_id == Veiculo.id).join(Empresa, Veiculo.empresa_id == Empresa.id)
-    q_empresas = db.session.query(literal_column("'Empresa'").label('type'), Empresa.razao_social.label('name'), DocumentoFiscal.nome_documento.label('document_type'), Empresa.razao_social.label('empresa_name'), DocumentoFiscal.data_vencimento.label('due_date'), Empresa.id.label('owner_id'), Empresa.id.label('empresa_id')).join(Empresa, DocumentoFiscal.empresa_id == Empresa.id)
+    # Com mensagens flash pendentes a página precisa ser renderizada para exibi-las.
+    if '_flashes' not in session and etag in request.if_none_match:
+        resposta = Response(status=304)
+        resposta.set_etag(etag)
+        return resposta
 
-    # Se o usuário for 'comum', aplica o filtro da empresa dele em todas as consultas.
-    if user_empresa_id:
-        q_motoristas = q_motoristas.filter(Motorista.empresa_id == user_empresa_id)
-        q_veiculos = q_veiculos.filter(Veiculo.empresa_id == user_empresa_id)
-        q_empresas = q_empresas.filter(DocumentoFiscal.empresa_id == user_empresa_id)
+    dados = cache_painel.obter(chave)
+    if dados is None:
+        dados = _montar_painel(today, filtros, user_empresa_id, por_pagina, cursor)
+        cache_painel.guardar(chave, dados)
 
-    queries = []
-    if not entidade_filter or entidade_filter == 'motorista': queries.append(q_motoristas)
-    if not entidade_filter or entidade_filter == 'veiculo': queries.append(q_veiculos)
-    if not entidade_filter or entidade_filter == 'empresa': queries.append(q_empresas)
+    # Filtros atuais, repassados aos links de navegação entre páginas.
+    filtros_pagina = {chave: valor for chave, valor in request.args.items() if chave != 'apos'}
 
-    final_items = []
-    if queries:
-        unioned_query = queries[0].union_all(*queries[1:])
-        subquery = unioned_query.subquery()
-        query_to_filter = db.session.query(subquery)
-
-        # Aplica filtros de busca e de empresa (se for 'master')
-        if current_user.role == 'master' and empresa_id_filter:
-            query_to_filter = query_to_filter.filter(subquery.c.empresa_id == empresa_id_filter)
-        
-        if search_query:
-            search_term = f"%{search_query}%"
-            query_to_filter = query_to_filter.filter(or_(subquery.c.name.ilike(search_term), subquery.c.document_type.ilike(search_term)))
-        
-        all_results = query_to_filter.all()
-
-        for row in all_results:
-            doc_name_upper = str(row.document_type).upper()
-            prazo_alerta = default_prazo
-            
-            found_generic = False
-            for generic_type in known_generic_types:
-                type_to_check = 'ALVARA' if generic_type == 'ALVARÁ' else generic_type
-                if type_to_check in doc_name_upper:
-                    prazo_alerta = configs_dict.get(generic_type, default_prazo)
-                    found_generic = True
-                    break
-            
-            if not found_generic:
-                cleaned_name_for_logic = re.sub(r'[\\s\\d.-]+$', '', doc_name_upper.replace('DOCUMENTO', '').strip()).strip()
-                if cleaned_name_for_logic in configs_dict:
-                    prazo_alerta = configs_dict.get(cleaned_name_for_logic, default_prazo)
-
-            days_left = (row.due_date - today).days
-            
-            current_status = 'ok'
-            if days_left < 0:
-                current_status = 'vencido'
-            elif days_left <= prazo_alerta:
-                current_status = 'vencendo'
-            
-            if not status_filter and current_status == 'ok': continue
-            if status_filter and current_status != status_filter: continue
-            if hide_expired and current_status == 'vencido': continue
-
-            cleaned_doc_display_name = re.sub(r'\\s*(NAME|DTYPE):.*', '', str(row.document_type), flags=re.IGNORECASE).strip()
-            cleaned_doc_display_name = re.sub(r'DOCUMENTO', '', cleaned_doc_display_name, flags=re.IGNORECASE).strip()
-            cleaned_doc_display_name = re.sub(r'\\s+', ' ', cleaned_doc_display_name).strip().upper()
-
-            url = url_for('admin.gerenciar_empresas')
-            if row.type == 'Motorista': url = url_for('admin.gerenciar_motoristas')
-            elif row.type == 'Veículo': url = url_for('admin.gerenciar_veiculos')
-
-            final_items.append({
-                'type': row.type, 'name': row.name, 'document_type': cleaned_doc_display_name,
-                'empresa_name': row.empresa_name, 'due_date': row.due_date,
-                'days_left': days_left, 'url': url, 'status': current_status
-            })
-        
-        final_items.sort(key=lambda x: x['days_left'])
-
-    t_plus_30 = today + timedelta(days=30)
-    
-    # --- Contadores filtrados por empresa ---
-    vencidos_motoristas = db.session.query(func.count(DocumentoMotorista.id)).filter(DocumentoMotorista.data_vencimento < today)
-    vencidos_veiculos = db.session.query(func.count(DocumentoVeiculo.id)).filter(DocumentoVeiculo.data_vencimento < today)
-    vencidos_empresas = db.session.query(func.count(DocumentoFiscal.id)).filter(DocumentoFiscal.data_vencimento < today)
-    
-    vencendo_motoristas = db.session.query(func.count(DocumentoMotorista.id)).filter(DocumentoMotorista.data_vencimento.between(today, t_plus_30))
-    vencendo_veiculos = db.session.query(func.count(DocumentoVeiculo.id)).filter(DocumentoVeiculo.data_vencimento.between(today, t_plus_30))
-    vencendo_empresas = db.session.query(func.count(DocumentoFiscal.id)).filter(DocumentoFiscal.data_vencimento.between(today, t_plus_30))
-
-    total_empresas = db.session.query(func.count(Empresa.id))
-    total_motoristas = db.session.query(func.count(Motorista.id))
+    resposta = make_response(render_template(
+        'admin/adm.html', items=dados['items'], counts=dados['counts'], empresas=dados['empresas'],
+        hide_expired=filtros.ocultar_vencidos, request=request, proximo_cursor=dados['proximo_cursor'],
+        voltar_inicio=bool(cursor), filtros_pagina=filtros_pagina
+    ))
+    resposta.set_etag(etag)
+    resposta.headers['Cache-Control'] = 'private, no-cache'
+    return resposta
 
-    if user_empresa_id:
-        vencidos_motoristas = vencidos_motoristas.join(Motorista).filter(Motorista.empresa_id == user_empresa_id)
-        vencidos_veiculos = vencidos_veiculos.join(Veiculo).filter(Veiculo.empresa_id == user_empresa_id)
-        vencidos_empresas = vencidos_empresas.filter(DocumentoFiscal.empresa_id == user_empresa_id)
-        
-        vencendo_motoristas = vencendo_motoristas.join(Motorista).filter(Motorista.empresa_id == user_empresa_id)
-        vencendo_veiculos = vencendo_veiculos.join(Veiculo).filter(Veiculo.empresa_id == user_empresa_id)
-        vencendo_empresas = vencendo_empresas.filter(DocumentoFiscal.empresa_id == user_empresa_id)
-        
-        total_empresas = total_empresas.filter(Empresa.id == user_empresa_id)
-        total_motoristas = total_motoristas.filter(Motorista.empresa_id == user_empresa_id)
-
-    counts = {
-        'vencidos': vencidos_motoristas.scalar() + vencidos_veiculos.scalar() + vencidos_empresas.scalar(),
-        'vencendo_30d': vencendo_motoristas.scalar() + vencendo_veiculos.scalar() + vencendo_empresas.scalar(),
-        'empresas': total_empresas.scalar(),
-        'motoristas': total_motoristas.scalar()
-    }
-    
-    # A lista de empresas para o filtro dropdown também é restrita
-    empresas_query = Empresa.query.order_by(Empresa.razao_social)
-    if user_empresa_id:
-        empresas_query = empresas_query.filter(Empresa.id == user_empresa_id)
 
-    todas_empresas = empresas_query.all()
-    
-    return render_template('admin/adm.html', items=final_items, counts=counts, empresas=todas_empresas, hide_expired=hide_expired, request=request)
 
+def _status_descritivo(current_status, days_left):
+    if current_status == 'vencido':
+        return f"Vencido há {abs(days_left)} dia(s)"
+    if current_status == 'vencendo':
+        return "Vence hoje" if days_left == 0 else f"Vence em {days_left} dia(s)"
+    return 'OK'
 
 
 @admin_bp.route('/export/dashboard/csv')
 @admin_required
+@leitura_na_replica
 def export_dashboard_csv():
     """
     Exporta os dados do painel de vencimentos para um arquivo CSV,
     respeitando os filtros aplicados na URL.
     """
-    # --- 1. Replicar a Lógica de Consulta do Dashboard ---
-    today = date.today()
-    entidade_filter = request.args.get('entidade', '')
-    empresa_id_filter = request.args.get('empresa_id', '')
-    status_filter = request.args.get('status', '')
-    search_query = request.args.get('q', '').strip()
-    hide_expired = request.args.get('hide_expired', 'false').lower() == 'true'
+    linhas = iterar_vencimentos(_filtros_da_requisicao(), date.today(), lote=LOTE_EXPORTACAO)
 
-    user_empresa_id = None
-    if current_user.role != 'master':
-        user_empresa_id = current_user.empresa_id
-        empresa_id_filter = user_empresa_id 
+    # --- Gerar o CSV em fluxo ---
+    # As linhas são lidas em lotes (yield_per usa cursor do lado do servidor no
+    # PostgreSQL) e enviadas em blocos, então a memória não depende do tamanho do relatório.
+    def gerar_csv():
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer, delimiter=';', lineterminator='\n')
 
-    configs = ConfiguracaoAlerta.query.all()
-    configs_dict = {config.nome_documento.upper(): config.prazo_alerta_dias for config in configs}
-    default_prazo = 30
-    known_generic_types = ['CVVTR', 'CIV', 'CIPP', 'CRLV', 'ANTT', 'CNH', 'ASO', 'ALVARÁ', 'LICENCIAMENTO']
+        yield '\ufeff'  # BOM, para o Excel reconhecer o arquivo como UTF-8
+        escritor.writerow(['Tipo', 'Nome/Placa', 'Documento', 'Empresa', 'Data de Vencimento', 'Status'])
 
-    q_motoristas = db.session.query(literal_column("'Motorista'").label('type'), Motorista.nome.label('name'), DocumentoMotorista.nome_documento.label('document_type'), Empresa.razao_social.label('empresa_name'), DocumentoMotorista.data_vencimento.label('due_date'), Motorista.id.label('owner_id'), Empresa.id.label('empresa_id')).join(Motorista, DocumentoMotorista.motorista_id == Motorista.id).join(Empresa, Motorista.empresa_id == Empresa.id)
-    q_veiculos = db.session.query(literal_column("'Veículo'").label('type'), Veiculo.placa.label('name'), DocumentoVeiculo.nome_documento.label('document_type'), Empresa.razao_social.label('empresa_name'), DocumentoVeiculo.data_vencimento.label('due_date'), Veiculo.id.label('owner_id'), Empresa.id.label('empresa_id')).join(Veiculo, DocumentoVeiculo.veiculo_id == Veiculo.id).join(Empresa, Veiculo.empresa_id == Empresa.id)
-    q_empresas = db.session.query(literal_column("'Empresa'").label('type'), Empresa.razao_social.label('name'), DocumentoFiscal.nome_documento.label('document_type'), Empresa.razao_social.label('empresa_name'), DocumentoFiscal.data_vencimento.label('due_date'), Empresa.id.label('owner_id'), Empresa.id.label('empresa_id')).join(Empresa, DocumentoFiscal.empresa_id == Empresa.id)
+        for linha in linhas:
+            escritor.writerow([ROTULOS_ENTIDADE[linha.entidade], linha.nome, linha.nome_exibicao, linha.empresa_nome,
+                               linha.data_vencimento.strftime('%d/%m/%Y'),
+                               _status_descritivo(linha.status, linha.days_left)])
 
-    if user_empresa_id:
-        q_motoristas = q_motoristas.filter(Motorista.empresa_id == user_empresa_id)
-        q_veiculos = q_veiculos.filter(Veiculo.empresa_id == user_empresa_id)
-        q_empresas = q_empresas.filter(DocumentoFiscal.empresa_id == user_empresa_id)
+            if buffer.tell() >= TAMANHO_BLOCO_EXPORTACAO:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
 
-    queries = []
-    if not entidade_filter or entidade_filter == 'motorista': queries.append(q_motoristas)
-    if not entidade_filter or entidade_filter == 'veiculo': queries.append(q_veiculos)
-    if not entidade_filter or entidade_filter == 'empresa': queries.append(q_empresas)
+        yield buffer.getvalue()
 
-    final_items = []
-    if queries:
-        unioned_query = queries[0].union_all(*queries[1:])
-        subquery = unioned_query.subquery()
-        query_to_filter = db.session.query(subquery)
+    # --- Enviar a Resposta para Download ---
+    return Response(
+        stream_with_context(gerar_csv()),
+        mimetype="text/csv",
+        headers={"Content-Disposition": "attachment;filename=relatorio_de_vencimentos.csv"}
+    )
 
-        if current_user.role == 'master' and empresa_id_filter:
-            query_to_filter = query_to_filter.filter(subquery.c.empresa_id == empresa_id_filter)
-        
-        if search_query:
-            search_term = f"%{search_query}%"
-            query_to_filter = query_to_filter.filter(or_(subquery.c.name.ilike(search_term), subquery.c.document_type.ilike(search_term)))
-        
-        all_results = query_to_filter.all()
-
-        for row in all_results:
-            doc_name_upper = str(row.document_type).upper()
-            prazo_alerta = default_prazo
-            
-            found_generic = False
-            for generic_type in known_generic_types:
-                type_to_check = 'ALVARA' if generic_type == 'ALVARÁ' else generic_type
-                if type_to_check in doc_name_upper:
-                    prazo_alerta = configs_dict.get(generic_type, default_prazo)
-                    found_generic = True
-                    break
-            
-            if not found_generic:
-                cleaned_name_for_logic = re.sub(r'[\\s\\d.-]+$', '', doc_name_upper.replace('DOCUMENTO', '').strip()).strip()
-                if cleaned_name_for_logic in configs_dict:
-                    prazo_alerta = configs_dict.get(cleaned_name_for_logic, default_prazo)
-
-            days_left = (row.due_date - today).days
-            
-            current_status = 'ok'
-            if days_left < 0:
-                current_status = 'vencido'
-            elif days_left <= prazo_alerta:
-                current_status = 'vencendo'
-            
-            if not status_filter and current_status == 'ok': continue
-            if status_filter and current_status != status_filter: continue
-            if hide_expired and current_status == 'vencido': continue
-
-            cleaned_doc_display_name = re.sub(r'\\s*(NAME|DTYPE):.*', '', str(row.document_type), flags=re.IGNORECASE).strip()
-            cleaned_doc_display_name = re.sub(r'DOCUMENTO', '', cleaned_doc_display_name, flags=re.IGNORECASE).strip()
-            cleaned_doc_display_name = re.sub(r'\\s+', ' ', cleaned_doc_display_name).strip().upper()
-
-            final_items.append({
-                'type': row.type, 'name': row.name, 'document_type': cleaned_doc_display_name,
-                'empresa_name': row.empresa_name, 'due_date': row.due_date,
-                'days_left': days_left, 'status': current_status
-            })
-        
-        final_items.sort(key=lambda x: x['days_left'])
-
-    # --- 2. Preparar e Gerar o CSV ---
-    dados_para_csv = []
-    for item in final_items:
-        # Define o status de forma mais descritiva
-        status_descritivo = ''
-        if item['status'] == 'vencido':
-            status_descritivo = f"Vencido há {abs(item['days_left'])} dia(s)"
-        elif item['status'] == 'vencendo':
-            if item['days_left'] == 0:
-                status_descritivo = "Vence hoje"
-            else:
-                status_descritivo = f"Vence em {item['days_left']} dia(s)"
-        else:
-            status_descritivo = 'OK'
-
-        dados_para_csv.append({
-            'Tipo': item['type'],
-            'Nome/Placa': item['name'],
-            'Documento': item['document_type'],
-            'Empresa': item['empresa_name'],
-            'Data de Vencimento': item['due_date'].strftime('%d/%m/%Y'),
-            'Status': status_descritivo
-        })
-    
-    # Cria o DataFrame
-    df = pd.DataFrame(dados_para_csv)
 
-    # Salva o DataFrame em um buffer de string
-    output = io.StringIO()
-    df.to_csv(output, index=False, sep=';', encoding='utf-8-sig')
-    output.seek(0)
 
-    # --- 3. Enviar a Resposta para Download ---
+@admin_bp.route('/export/dashboard/xlsx')
+@admin_required
+@leitura_na_replica
+def export_dashboard_xlsx():
+    """
+    Exporta os dados do painel de vencimentos para uma planilha Excel (.xlsx),
+    com os mesmos filtros do CSV e as datas gravadas como células de data.
+
+    A planilha é gerada em fluxo (app/exportacao.py): os pedaços do arquivo
+    são enviados à medida que as linhas são lidas em lotes, como no CSV.
+    """
+    linhas = iterar_vencimentos(_filtros_da_requisicao(), date.today(), lote=LOTE_EXPORTACAO)
+    valores = ((ROTULOS_ENTIDADE[linha.entidade], linha.nome, linha.nome_exibicao, linha.empresa_nome,
+                linha.data_vencimento, _status_descritivo(linha.status, linha.days_left)) for linha in linhas)
+    planilha = gerar_xlsx('Vencimentos',
+                          ['Tipo', 'Nome/Placa', 'Documento', 'Empresa', 'Data de Vencimento', 'Status'],
+                          valores, larguras=[12, 40, 30, 40, 20, 24])
+
     return Response(
-        output,
-        mimetype="text/csv",
-        headers={"Content-Disposition": "attachment;filename=relatorio_de_vencimentos.csv"}
+        stream_with_context(planilha),
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        headers={"Content-Disposition": "attachment;filename=relatorio_de_vencimentos.xlsx"}
     )
 
 
 
+@admin_bp.route('/metricas/consultas')
+def metricas_consultas():
+    """Métricas do cache de compilação de instruções SQL deste processo (apenas para o 'master')."""
+    if current_user.role != 'master':
+        return jsonify({'erro': 'Acesso negado.'}), 403
+    if not current_app.config.get('SQL_INSTRUMENTACAO'):
+        return jsonify({'erro': 'Métricas desligadas: ative SQL_INSTRUMENTACAO.'}), 404
+    return jsonify(metricas_compilacao())
+
+
 @admin_bp.route('/configuracoes', methods=['GET'])
+@leitura_na_replica
 def gerenciar_configuracoes():
     """
     Exibe a página de configurações, agrupando todos os documentos por tipos genéricos
@@ -1056,39 +636,16 @@ def gerenciar_configuracoes():
 
     raw_doc_names = [item[0] for item in doc_fiscais + doc_motoristas + doc_veiculos if item and item[0]]
 
-    # **CORREÇÃO: 'CVVTR' foi adicionado à lista**
-    known_generic_types = ['CVVTR', 'CIV', 'CIPP', 'CRLV', 'ANTT', 'CNH', 'ASO', 'ALVARÁ', 'LICENCIAMENTO']
-    
+    classificador = obter_classificador()
     clean_doc_types = set()
 
     for raw_name in raw_doc_names:
-        name_upper = str(raw_name).upper()
-        name_upper = re.sub(r'\s*(NAME|DTYPE):.*', '', name_upper).strip()
-
-        if not name_upper:
-            continue
-
-        found = False
-        for generic_type in known_generic_types:
-            type_to_check = 'ALVARA' if generic_type == 'ALVARÁ' else generic_type
-            if type_to_check in name_upper:
-                clean_doc_types.add(generic_type)
-                found = True
-                break
-        
-        if not found:
-            cleaned_name = name_upper.replace('DOCUMENTO', '').strip()
-            cleaned_name = re.sub(r'[\s\d.-]+$', '', cleaned_name).strip()
-            if cleaned_name:
-                clean_doc_types.add(cleaned_name)
+        tipo = classificador.classificar(raw_name).tipo
+        if tipo:
+            clean_doc_types.add(tipo)
 
     sorted_doc_types = sorted(list(clean_doc_types))
-
-    configs = ConfiguracaoAlerta.query.all()
-    configs_dict = {config.nome_documento.upper(): config.prazo_alerta_dias for config in configs}
-
-    default_prazo = 30
-    final_configs = {doc_type: configs_dict.get(doc_type, default_prazo) for doc_type in sorted_doc_types}
+    final_configs = {doc_type: classificador.prazos.get(doc_type, classificador.prazo_padrao) for doc_type in sorted_doc_types}
     
     return render_template('admin/configuracoes.html', configuracoes=final_configs)
 
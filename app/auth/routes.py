@@ -7,7 +7,7 @@ from sqlalchemy.exc import IntegrityError
 
 
 from . import auth_bp
-from ..models import db, Usuario, Empresa, format_cnpj
+from ..models import db, Usuario, Empresa, chave_cnpj
 from .forms import RegistrationForm, RegistroEmpresaForm
 
 
@@ -55,17 +55,16 @@ def registrar_por_convite(token):
     form = RegistroEmpresaForm()
     if form.validate_on_submit():
         try:
-            cnpj_formatado = format_cnpj(form.cnpj.data)
             razao_social_upper = form.razao_social.data.upper()
 
             # Lógica Simplificada: Busca a empresa pelo CNPJ.
-            empresa_alvo = Empresa.query.filter_by(cnpj=cnpj_formatado).first()
+            empresa_alvo = Empresa.query.filter_by(cnpj_chave=chave_cnpj(form.cnpj.data)).first()
 
             # Se a empresa não existe, cria uma nova.
             if not empresa_alvo:
                 empresa_alvo = Empresa(
                     razao_social=razao_social_upper,
-                    cnpj=cnpj_formatado
+                    cnpj=form.cnpj.data
                 )
                 db.session.add(empresa_alvo)
 
@@ -99,8 +98,7 @@ def registrar_por_convite(token):
 @auth_bp.route('/consultar-cnpj/<cnpj>')
 def consultar_cnpj(cnpj):
     try:
-        cnpj_formatado = format_cnpj(cnpj)
-        empresa = Empresa.query.filter_by(cnpj=cnpj_formatado).first()
+        empresa = Empresa.query.filter_by(cnpj_chave=chave_cnpj(cnpj)).first()
 
         if empresa:
             return jsonify({'razao_social': empresa.razao_social, 'exists': True})
@@ -0,0 +1,101 @@
+"""
+Cache das respostas do painel, invalidado por um contador de versão dos dados.
+
+O contador fica no banco (tabela `versao_dados`), para que todos os processos do
+servidor enxerguem a mesma versão. Ele é incrementado logo após o commit de
+qualquer sessão que tenha alterado documentos, donos, empresas ou configurações
+de alerta; rotinas que gravam direto no banco devem chamar `invalidar_cache()`.
+"""
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import db
+from .models import (ConfiguracaoAlerta, DocumentoFiscal, DocumentoMotorista, DocumentoVeiculo, Empresa,
+                     Motorista, Veiculo, VersaoDados)
+
+# Modelos cujas alterações mudam o que o painel exibe.
+_MODELOS_MONITORADOS = (DocumentoFiscal, DocumentoMotorista, DocumentoVeiculo, Empresa, Motorista, Veiculo,
+                        ConfiguracaoAlerta)
+_CHAVE_ALTERADO = 'dados_do_painel_alterados'
+
+
+class CacheLRU:
+    """Dicionário com limite de itens; o item usado há mais tempo é descartado primeiro."""
+
+    def __init__(self, capacidade=256):
+        self.capacidade = capacidade
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+
+    def init_app(self, app):
+        self.capacidade = app.config.get('PAINEL_CACHE_TAMANHO', self.capacidade)
+
+    def obter(self, chave):
+        with self._trava:
+            try:
+                self._itens.move_to_end(chave)
+            except KeyError:
+                return None
+            return self._itens[chave]
+
+    def guardar(self, chave, valor):
+        with self._trava:
+            self._itens[chave] = valor
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.capacidade:
+                self._itens.popitem(last=False)
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+
+    def __len__(self):
+        return len(self._itens)
+
+
+cache_painel = CacheLRU()
+
+
+def versao_dados():
+    """Versão atual dos dados do painel (faz parte da chave do cache e do ETag)."""
+    versao = db.session.execute(select(VersaoDados.versao).where(VersaoDados.id == 1)).scalar()
+    return versao or 0
+
+
+def invalidar_cache():
+    """Incrementa a versão dos dados em uma transação curta, invalidando os caches de todos os processos."""
+    tabela = VersaoDados.__table__
+    with db.engine.begin() as conexao:
+        alterados = conexao.execute(update(tabela).where(tabela.c.id == 1).values(versao=tabela.c.versao + 1)).rowcount
+    if not alterados:
+        try:
+            with db.engine.begin() as conexao:
+                conexao.execute(insert(tabela).values(id=1, versao=1))
+        except IntegrityError:
+            # Outro processo criou a linha ao mesmo tempo; basta incrementá-la.
+            with db.engine.begin() as conexao:
+                conexao.execute(update(tabela).where(tabela.c.id == 1).values(versao=tabela.c.versao + 1))
+
+
+@event.listens_for(Session, 'after_flush')
+def _marcar_alteracoes(session, flush_context):
+    for objeto in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(objeto, _MODELOS_MONITORADOS):
+            session.info[_CHAVE_ALTERADO] = True
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_apos_commit(session):
+    # Fora da transação que gravou os dados, para não segurar a linha do contador.
+    if session.info.pop(_CHAVE_ALTERADO, False):
+        invalidar_cache()
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _descartar_marcacao(session, previous_transaction):
+    session.info.pop(_CHAVE_ALTERADO, None)
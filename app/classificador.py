@@ -0,0 +1,123 @@
+"""
+Classificação dos nomes de documentos em tipos de alerta.
+
+Os nomes importados das planilhas variam muito ("CNH DOCUMENTO 2",
+"ALVARÁ SANITÁRIO NAME: ..."), mas os prazos de alerta são configurados por
+tipo genérico. Este módulo concentra essa regra em um único lugar, com as
+expressões regulares compiladas uma só vez e um memo por nome bruto.
+"""
+import re
+from collections import namedtuple
+
+from sqlalchemy import select
+
+from . import db
+from .models import ConfiguracaoAlerta
+
+# A ordem importa: o primeiro tipo da lista encontrado no nome prevalece.
+TIPOS_GENERICOS = ('CVVTR', 'CIV', 'CIPP', 'CRLV', 'ANTT', 'CNH', 'ASO', 'ALVARÁ', 'LICENCIAMENTO')
+PRAZO_PADRAO = 30
+
+Classificacao = namedtuple('Classificacao', ['tipo', 'prazo', 'nome_exibicao'])
+
+_RE_METADADOS = re.compile(r'\s*(NAME|DTYPE):.*', re.IGNORECASE | re.DOTALL)
+_SUFIXO_NUMERICO = ' \t\n\r\f\v0123456789.-'
+
+
+def _padrao_tipo(tipo):
+    # 'ALVARÁ' também deve casar com a grafia sem acento.
+    return re.escape(tipo).replace('Á', '[AÁ]')
+
+
+# Um único padrão para todos os tipos genéricos. O lookahead encontra também
+# ocorrências sobrepostas; a prioridade da lista acima (e não a posição no
+# texto) decide qual tipo prevalece.
+_RE_TIPOS_GENERICOS = re.compile('(?=(' + '|'.join(_padrao_tipo(tipo) for tipo in TIPOS_GENERICOS) + '))')
+_PRIORIDADE = {tipo: indice for indice, tipo in enumerate(TIPOS_GENERICOS)}
+_PRIORIDADE['ALVARA'] = _PRIORIDADE['ALVARÁ']
+
+
+def _sem_metadados(nome_documento):
+    nome = str(nome_documento).upper()
+    if ':' in nome:
+        nome = _RE_METADADOS.sub('', nome)
+    return nome.strip()
+
+
+def _tipo(nome):
+    encontrados = _RE_TIPOS_GENERICOS.findall(nome)
+    if encontrados:
+        return TIPOS_GENERICOS[min(_PRIORIDADE[tipo] for tipo in encontrados)]
+    # Equivalente a re.sub(r'[\s\d.-]+$', '', ...), sem o custo da regex.
+    return nome.replace('DOCUMENTO', '').strip().rstrip(_SUFIXO_NUMERICO).strip()
+
+
+def _exibicao(nome):
+    return ' '.join(nome.replace('DOCUMENTO', '').split())
+
+
+def tipo_canonico(nome_documento):
+    """Retorna o tipo de documento usado como chave em ConfiguracaoAlerta."""
+    nome = _sem_metadados(nome_documento)
+    return _tipo(nome) if nome else ''
+
+
+def nome_exibicao(nome_documento):
+    """Limpa o nome bruto do documento para exibição no painel e nos relatórios."""
+    return _exibicao(_sem_metadados(nome_documento))
+
+
+class ClassificadorDocumentos:
+    """
+    Associa cada nome bruto de documento ao seu tipo canônico e prazo de alerta.
+
+    O resultado é memorizado por nome bruto; como a quantidade de nomes
+    distintos é pequena perto do número de documentos, quase todas as
+    chamadas são uma simples consulta a dicionário.
+    """
+
+    def __init__(self, prazos, prazo_padrao=PRAZO_PADRAO):
+        self.prazos = dict(prazos)
+        self.prazo_padrao = prazo_padrao
+        self._memo = {}
+
+    def classificar(self, nome_documento):
+        try:
+            return self._memo[nome_documento]
+        except KeyError:
+            pass
+
+        nome = _sem_metadados(nome_documento)
+        tipo = _tipo(nome) if nome else ''
+        classificacao = Classificacao(
+            tipo=tipo,
+            prazo=self.prazos.get(tipo, self.prazo_padrao),
+            nome_exibicao=_exibicao(nome)
+        )
+        self._memo[nome_documento] = classificacao
+        return classificacao
+
+    def prazo(self, nome_documento):
+        return self.classificar(nome_documento).prazo
+
+
+_classificador_atual = None
+
+
+def obter_classificador(conexao=None):
+    """
+    Retorna o classificador vigente, recriando-o apenas quando os registros de
+    ConfiguracaoAlerta mudaram desde a última chamada.
+
+    A tabela de configurações é pequena; compará-la a cada requisição mantém
+    todos os processos do servidor coerentes sem depender de eventos locais.
+    `conexao` permite o uso dentro de eventos de flush, fora da sessão.
+    """
+    global _classificador_atual
+    consulta = select(ConfiguracaoAlerta.nome_documento, ConfiguracaoAlerta.prazo_alerta_dias)
+    prazos = {nome.upper(): prazo for nome, prazo in (conexao or db.session).execute(consulta)}
+    classificador = _classificador_atual
+    if classificador is None or classificador.prazos != prazos:
+        classificador = ClassificadorDocumentos(prazos)
+        _classificador_atual = classificador
+    return classificador
@@ -0,0 +1,144 @@
+"""
+Conversão das colunas de data das planilhas importadas.
+
+Uma coluna de vencimento chega de formas diferentes conforme o arquivo: datas do
+Excel (datetime), números de série do Excel (dias desde 30/12/1899, quando a
+célula não tem formato de data), texto no padrão brasileiro (dia primeiro:
+'05/01/2027') ou ISO ('2027-01-05'). `NormalizadorDatas` converte a coluna
+inteira de uma vez: cada tipo de valor é tratado em bloco, os textos distintos
+são convertidos uma única vez com o formato detectado para a coluna e o
+resultado fica guardado para os lotes seguintes.
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+
+# Formatos de texto aceitos, na ordem de preferência quando mais de um serve (dia antes do mês).
+FORMATOS_DATA = ('%d/%m/%Y', 'ISO8601', '%d/%m/%y', '%d-%m-%Y', '%d.%m.%Y', '%d/%m/%Y %H:%M:%S',
+                 '%d/%m/%Y %H:%M', '%Y%m%d', '%Y/%m/%d')
+# Origem e maior número de série do Excel (31/12/9999).
+_ORIGEM_EXCEL = pd.Timestamp('1899-12-30')
+_MAIOR_SERIE_EXCEL = 2958465
+# Quantos textos distintos são usados para detectar o formato de uma coluna.
+_AMOSTRA_FORMATO = 200
+
+
+def _como_datas(convertidas):
+    """Timestamps (com NaT) de um array ou Series como objetos date, com None no lugar de NaT."""
+    convertidas = pd.Series(convertidas)
+    return convertidas.dt.date.astype(object).where(convertidas.notna(), None)
+
+
+def _series_do_excel(numeros):
+    """Números de série do Excel (a parte fracionária é a hora, descartada) como datas; fora da faixa, None."""
+    numeros = pd.to_numeric(numeros, errors='coerce').astype('float64')
+    validos = (numeros >= 1) & (numeros <= _MAIOR_SERIE_EXCEL)
+    dias = np.floor(numeros.where(validos))
+    return _como_datas(pd.to_datetime(dias, unit='D', origin=_ORIGEM_EXCEL, errors='coerce'))
+
+
+class NormalizadorDatas:
+    """
+    Converte colunas de data para `datetime.date`. O formato dos textos é
+    detectado na primeira conversão (o de FORMATOS_DATA que converte mais
+    valores de uma amostra) e reaproveitado depois; os textos que não casam com
+    ele tentam os demais formatos e, por fim, a interpretação livre do pandas
+    com o dia primeiro. Use uma instância por coluna de um mesmo arquivo.
+    """
+
+    def __init__(self):
+        self.formato = None
+        # Texto já visto -> data (ou None, se inválido).
+        self._convertidos = {}
+
+    def converter(self, valores):
+        """
+        Devolve uma Series com o mesmo índice de `valores`: `datetime.date` nas
+        células convertidas e None nas vazias ou inválidas. As inválidas são as
+        preenchidas que ficaram None (veja `invalidas`).
+        """
+        resultado = pd.Series([None] * len(valores), index=valores.index, dtype=object)
+        preenchidos = valores[valores.notna()]
+        if preenchidos.empty:
+            return resultado
+        tipo = pd.api.types.infer_dtype(preenchidos, skipna=False)
+        if tipo == 'string':
+            grupos = {'texto': preenchidos}
+        elif tipo in ('integer', 'floating', 'mixed-integer-float'):
+            grupos = {'serie': preenchidos}
+        elif tipo in ('datetime', 'datetime64', 'date'):
+            grupos = {'data': preenchidos}
+        else:
+            classes = preenchidos.map(_classe_do_valor)
+            grupos = {classe: preenchidos[classes == classe] for classe in classes.unique()}
+
+        for classe, grupo in grupos.items():
+            if classe == 'texto':
+                resultado.loc[grupo.index] = self._converter_textos(grupo).to_numpy()
+            elif classe == 'serie':
+                resultado.loc[grupo.index] = _series_do_excel(grupo).to_numpy()
+            elif classe == 'data':
+                resultado.loc[grupo.index] = _como_datas(pd.to_datetime(grupo, errors='coerce')).to_numpy()
+        return resultado
+
+    @staticmethod
+    def invalidas(valores, convertidas):
+        """Máscara das células preenchidas que não viraram data."""
+        return valores.notna() & convertidas.isna()
+
+    def _converter_textos(self, textos):
+        textos = textos.astype(str).str.strip()
+        novos = [texto for texto in pd.unique(textos) if texto not in self._convertidos]
+        if novos:
+            self._convertidos.update(self._interpretar(novos))
+        return textos.map(self._convertidos)
+
+    def _interpretar(self, textos):
+        """Converte textos distintos, em bloco por formato; devolve {texto: date ou None}."""
+        textos = pd.Series(textos, dtype=object)
+        convertidos = pd.Series([None] * len(textos), index=textos.index, dtype=object)
+        # Só dígitos e até 7 caracteres: número de série do Excel salvo como texto (ex.: CSV exportado).
+        serie = textos.str.fullmatch(r'\d{1,7}(\.\d+)?')
+        convertidos[serie] = _series_do_excel(textos[serie]).to_numpy()
+
+        pendentes = textos[~serie & (textos != '')]
+        if self.formato is None and not pendentes.empty:
+            self.formato = self._detectar_formato(pendentes)
+        formatos = [self.formato] + [formato for formato in FORMATOS_DATA if formato != self.formato]
+        for formato in formatos:
+            if pendentes.empty:
+                break
+            datas = pd.to_datetime(pendentes, format=formato, errors='coerce')
+            casaram = datas.notna()
+            convertidos[pendentes.index[casaram]] = _como_datas(datas[casaram]).to_numpy()
+            pendentes = pendentes[~casaram]
+        for indice, texto in pendentes.items():
+            convertidos[indice] = _interpretar_livre(texto)
+        return dict(zip(textos, convertidos))
+
+    @staticmethod
+    def _detectar_formato(textos):
+        amostra = textos.iloc[:_AMOSTRA_FORMATO]
+        acertos = {formato: int(pd.to_datetime(amostra, format=formato, errors='coerce').notna().sum())
+                   for formato in FORMATOS_DATA}
+        # max() fica com o primeiro dos empatados, que é o preferido em FORMATOS_DATA.
+        return max(FORMATOS_DATA, key=lambda formato: acertos[formato])
+
+
+def _classe_do_valor(valor):
+    if isinstance(valor, str):
+        return 'texto'
+    if isinstance(valor, (datetime.date, np.datetime64)):
+        return 'data'
+    if isinstance(valor, (int, float, np.number)) and not isinstance(valor, bool):
+        return 'serie'
+    return 'outro'
+
+
+def _interpretar_livre(texto):
+    try:
+        convertida = pd.to_datetime(texto, dayfirst=True)
+    except (ValueError, TypeError, OverflowError):
+        return None
+    return None if pd.isna(convertida) else convertida.date()
@@ -0,0 +1,102 @@
+"""
+Construções SQL que precisam de uma forma diferente em cada banco.
+
+A aplicação roda em SQLite no desenvolvimento e em PostgreSQL em produção;
+as expressões abaixo são compiladas conforme o dialeto da conexão.
+"""
+from contextlib import contextmanager
+
+from sqlalchemy import Integer, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+
+
+class dias_entre(FunctionElement):
+    """Número inteiro de dias de `inicio` até `fim` (fim - inicio)."""
+    type = Integer()
+    inherit_cache = True
+    name = 'dias_entre'
+
+
+@compiles(dias_entre)
+def _dias_entre_padrao(elemento, compilador, **kw):
+    # PostgreSQL (e o padrão SQL): date - date resulta em inteiro de dias.
+    inicio, fim = list(elemento.clauses)
+    return f"({compilador.process(fim, **kw)} - {compilador.process(inicio, **kw)})"
+
+
+@compiles(dias_entre, 'sqlite')
+def _dias_entre_sqlite(elemento, compilador, **kw):
+    inicio, fim = list(elemento.clauses)
+    return (
+        f"CAST(julianday({compilador.process(fim, **kw)}) - "
+        f"julianday({compilador.process(inicio, **kw)}) AS INTEGER)"
+    )
+
+
+def insert_com_conflito(tabela, conexao):
+    """INSERT do dialeto da conexão, com suporte a ON CONFLICT (DO NOTHING / DO UPDATE)."""
+    if conexao.dialect.name == 'postgresql':
+        return postgresql.insert(tabela)
+    return sqlite.insert(tabela)
+
+
+@contextmanager
+def transacao_somente_leitura(sessao):
+    """
+    Executa o bloco em uma transação nova que o banco recusa usar para gravar
+    (SET TRANSACTION READ ONLY no PostgreSQL, PRAGMA query_only no SQLite) e a
+    desfaz ao final. O que estiver pendente na sessão é descartado antes.
+    """
+    sessao.rollback()
+    conexao = sessao.connection()
+    em_sqlite = conexao.dialect.name == 'sqlite'
+    if em_sqlite:
+        conexao.exec_driver_sql('PRAGMA query_only = ON')
+    elif conexao.dialect.name == 'postgresql':
+        conexao.exec_driver_sql('SET TRANSACTION READ ONLY')
+    try:
+        yield conexao
+    finally:
+        if em_sqlite:
+            # O pragma vale para a conexão, que volta para o pool depois do rollback.
+            conexao.exec_driver_sql('PRAGMA query_only = OFF')
+        sessao.rollback()
+
+
+# Perfis de PRAGMAs aplicados a cada conexão SQLite aberta (configuração SQLITE_PERFIL).
+PERFIS_SQLITE = {
+    # Os padrões do SQLite: journal de rollback, um gravador bloqueia os leitores ao confirmar.
+    'padrao': {},
+    # WAL: leitores não esperam o gravador (e vice-versa); com synchronous=NORMAL a confirmação não
+    # espera o fsync do WAL, só o checkpoint. Quem ainda encontrar o banco ocupado espera até busy_timeout.
+    'producao': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,  # ms
+        'cache_size': -65536,  # negativo: em KiB (64 MiB por conexão)
+        'mmap_size': 268435456,  # 256 MiB
+        'temp_store': 'MEMORY',
+    },
+}
+
+
+def pragmas_sqlite(perfil, ajustes=None):
+    """PRAGMAs do perfil com os `ajustes` (nome -> valor) sobrepostos."""
+    if perfil not in PERFIS_SQLITE:
+        raise ValueError(f"Perfil SQLite desconhecido: {perfil!r} (use {', '.join(PERFIS_SQLITE)}).")
+    return {**PERFIS_SQLITE[perfil], **(ajustes or {})}
+
+
+def aplicar_pragmas_sqlite(engine, pragmas):
+    """Executa os `pragmas` em toda conexão nova do engine, se ele for SQLite."""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _aplicar(conexao_dbapi, registro):
+        cursor = conexao_dbapi.cursor()
+        for nome, valor in pragmas.items():
+            cursor.execute(f'PRAGMA {nome} = {valor}')
+        cursor.close()
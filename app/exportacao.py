@@ -0,0 +1,147 @@
+"""
+Geração em fluxo das planilhas .xlsx exportadas.
+
+Um .xlsx é um zip de arquivos XML. `gerar_xlsx` monta esse zip com o
+`zipfile` da biblioteca padrão gravando em um canal sem posicionamento (os
+tamanhos de cada parte vão em descritores depois dos dados), e escreve o XML
+da planilha linha a linha: a cada TAMANHO_BLOCO bytes comprimidos o gerador
+entrega um pedaço do arquivo. Assim o primeiro byte sai logo após a primeira
+consulta e a memória não depende do tamanho do relatório, como no CSV.
+
+O openpyxl, mesmo em modo write-only, só monta o zip no `save()`, depois da
+última linha; por isso as partes fixas (tipos, relações, pasta de trabalho e
+estilos) são escritas aqui diretamente.
+"""
+import datetime
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+# Bytes comprimidos acumulados antes de cada entrega ao cliente.
+TAMANHO_BLOCO = 64 * 1024
+
+_EPOCA_EXCEL = datetime.date(1899, 12, 30)
+# Caracteres de controle que o XML não aceita (o openpyxl recusa as células que os contêm).
+_RE_CARACTERES_INVALIDOS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_XML = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_NS_PLANILHA = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+_NS_RELACOES = 'http://schemas.openxmlformats.org/package/2006/relationships'
+_NS_DOCUMENTO = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_TIPO_OFFICE = 'application/vnd.openxmlformats-officedocument.spreadsheetml'
+
+_TIPOS_CONTEUDO = (
+    f'{_XML}<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    f'<Override PartName="/xl/workbook.xml" ContentType="{_TIPO_OFFICE}.sheet.main+xml"/>'
+    f'<Override PartName="/xl/worksheets/sheet1.xml" ContentType="{_TIPO_OFFICE}.worksheet+xml"/>'
+    f'<Override PartName="/xl/styles.xml" ContentType="{_TIPO_OFFICE}.styles+xml"/>'
+    '</Types>'
+)
+_RELACOES_PACOTE = (
+    f'{_XML}<Relationships xmlns="{_NS_RELACOES}">'
+    f'<Relationship Id="rId1" Type="{_NS_DOCUMENTO}/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_RELACOES_PASTA = (
+    f'{_XML}<Relationships xmlns="{_NS_RELACOES}">'
+    f'<Relationship Id="rId1" Type="{_NS_DOCUMENTO}/worksheet" Target="worksheets/sheet1.xml"/>'
+    f'<Relationship Id="rId2" Type="{_NS_DOCUMENTO}/styles" Target="styles.xml"/>'
+    '</Relationships>'
+)
+# Estilo 0: padrão; estilo 1: data no formato DD/MM/AAAA (formato personalizado 164).
+_ESTILOS = (
+    f'{_XML}<styleSheet xmlns="{_NS_PLANILHA}">'
+    '<numFmts count="1"><numFmt numFmtId="164" formatCode="DD/MM/YYYY"/></numFmts>'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+
+class _Canal:
+    """Arquivo só de escrita, sem tell/seek, que acumula os bytes até o gerador recolhê-los."""
+
+    def __init__(self):
+        self._partes = []
+        self.tamanho = 0
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        self.tamanho += len(dados)
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def recolher(self):
+        dados = b''.join(self._partes)
+        self._partes.clear()
+        self.tamanho = 0
+        return dados
+
+
+def _coluna(indice):
+    """Letra da coluna de índice 0 (A, B, ..., Z, AA, ...)."""
+    letras = ''
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(ord('A') + resto) + letras
+    return letras
+
+
+def _celula(referencia, valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, datetime.date) and not isinstance(valor, datetime.datetime):
+        return f'<c r="{referencia}" s="1"><v>{(valor - _EPOCA_EXCEL).days}</v></c>'
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return f'<c r="{referencia}"><v>{valor}</v></c>'
+    texto = escape(_RE_CARACTERES_INVALIDOS.sub('', str(valor)))
+    return f'<c r="{referencia}" t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _linha(numero, colunas, valores):
+    celulas = ''.join(_celula(f'{coluna}{numero}', valor) for coluna, valor in zip(colunas, valores))
+    return f'<row r="{numero}">{celulas}</row>'
+
+
+def gerar_xlsx(nome_planilha, cabecalho, linhas, larguras=None):
+    """
+    Gera, em pedaços de bytes, um .xlsx com uma planilha: a linha de
+    `cabecalho` seguida de `linhas` (sequências de valores; datas viram
+    células de data DD/MM/AAAA). `larguras` são as larguras das colunas.
+    """
+    canal = _Canal()
+    colunas = [_coluna(indice) for indice in range(len(cabecalho))]
+    with zipfile.ZipFile(canal, 'w', zipfile.ZIP_DEFLATED) as arquivo:
+        arquivo.writestr('[Content_Types].xml', _TIPOS_CONTEUDO)
+        arquivo.writestr('_rels/.rels', _RELACOES_PACOTE)
+        arquivo.writestr('xl/workbook.xml', (
+            f'{_XML}<workbook xmlns="{_NS_PLANILHA}" xmlns:r="{_NS_DOCUMENTO}"><sheets>'
+            f'<sheet name="{escape(nome_planilha, {chr(34): "&quot;"})}" sheetId="1" r:id="rId1"/>'
+            '</sheets></workbook>'))
+        arquivo.writestr('xl/_rels/workbook.xml.rels', _RELACOES_PASTA)
+        arquivo.writestr('xl/styles.xml', _ESTILOS)
+
+        with arquivo.open('xl/worksheets/sheet1.xml', 'w') as planilha:
+            inicio = f'{_XML}<worksheet xmlns="{_NS_PLANILHA}">'
+            if larguras:
+                inicio += '<cols>' + ''.join(
+                    f'<col min="{indice}" max="{indice}" width="{largura}" customWidth="1"/>'
+                    for indice, largura in enumerate(larguras, start=1)) + '</cols>'
+            planilha.write(f'{inicio}<sheetData>{_linha(1, colunas, cabecalho)}'.encode('utf-8'))
+            for numero, valores in enumerate(linhas, start=2):
+                planilha.write(_linha(numero, colunas, valores).encode('utf-8'))
+                if canal.tamanho >= TAMANHO_BLOCO:
+                    yield canal.recolher()
+            planilha.write(b'</sheetData></worksheet>')
+    yield canal.recolher()
@@ -0,0 +1,1144 @@
+"""
+Importação em massa das planilhas de cadastro e de validades.
+
+As rotinas trabalham por conjunto: as chaves já cadastradas são lidas uma única
+vez, as linhas do arquivo são normalizadas e deduplicadas em memória e as novas
+são gravadas em lotes com INSERT ... ON CONFLICT DO NOTHING. Como essas gravações
+não passam pelo ORM, a normalização que os @validates dos modelos fariam é feita
+aqui, e quem confirma a transação deve chamar `invalidar_cache()`.
+
+`executar_importacao` lê um arquivo já salvo em disco e roda a importação
+completa de um tipo de planilha (é o que as tarefas em segundo plano chamam);
+`simular_importacao` faz o mesmo caminho sem gravar nada e devolve a prévia do
+que mudaria em cada linha.
+
+As funções que recebem `previa` (uma Previa) registram nela o destino de cada
+linha e, nesse modo, não gravam nada.
+"""
+import os
+import pickle
+import tempfile
+from collections import deque, namedtuple
+from concurrent.futures import wait
+from contextlib import closing
+
+import pandas as pd
+from flask import current_app
+from markupsafe import escape
+from sqlalchemy import select, tuple_
+
+from . import db
+from .cache import invalidar_cache
+from .datas import NormalizadorDatas
+from .dialeto import insert_com_conflito, transacao_somente_leitura
+from .models import DocumentoFiscal, DocumentoMotorista, DocumentoVeiculo, Empresa, Motorista, Veiculo
+from .planilhas import inspecionar, ler_em_lotes, planilhas_com_dados
+from .resolucao import ResolvedorEmpresas, ResolvedorMotoristas, ResolvedorVeiculos
+from .vencimentos import sincronizar_documentos
+
+TAMANHO_LOTE = 1000
+# A cada quantas linhas os laços das planilhas de validade informam o progresso.
+INTERVALO_PROGRESSO = 500
+# De quantos em quantos segundos `importar_partes` repete o progresso enquanto
+# espera uma parte: é o que mostra que a tarefa continua viva (app/tarefas.py).
+INTERVALO_SINAL = 5
+# Quantas datas de vencimento inválidas são listadas na mensagem da importação.
+_DATAS_INVALIDAS_EXIBIDAS = 20
+
+ResultadoEmpresas = namedtuple('ResultadoEmpresas', 'novas cnpjs_ignorados razoes_ignoradas')
+# `dados_invalidos` são as mensagens "Linha N: ..." na ordem do arquivo.
+ResultadoCadastro = namedtuple('ResultadoCadastro', 'novos ja_existentes empresas_nao_encontradas dados_invalidos')
+ResultadoValidades = namedtuple('ResultadoValidades', 'novos atualizados inalterados')
+# `planilha` identifica a parte de um envio com várias planilhas (veja `importar_partes`).
+LinhaPrevia = namedtuple('LinhaPrevia', 'linha situacao chave valor_atual valor_novo detalhe planilha')
+
+# Coluna do dono (parte da restrição única com nome_documento) e entidade no índice de vencimentos.
+_DOCUMENTOS = {
+    DocumentoFiscal: ('empresa_id', 'empresa'),
+    DocumentoMotorista: ('motorista_id', 'motorista'),
+    DocumentoVeiculo: ('veiculo_id', 'veiculo'),
+}
+
+
+class Previa:
+    """O que uma importação faria com cada linha do arquivo, sem gravar nada."""
+
+    # Situações possíveis, na ordem usada no relatório.
+    SITUACOES = {
+        'novo': 'Novo', 'atualizado': 'Atualizado', 'inalterado': 'Sem alteração',
+        'ja_existente': 'Já cadastrado', 'nao_encontrado': 'Não encontrado', 'ambiguo': 'Ambíguo',
+        'repetido': 'Repetido no arquivo', 'invalido': 'Inválido',
+    }
+
+    def __init__(self, planilha=''):
+        self.linhas = []
+        # Planilha atribuída às próximas linhas registradas.
+        self.planilha = planilha
+        # Datas que a importação real já teria gravado nos lotes anteriores, por
+        # tabela: {(dono, nome_documento): data}. Valem como as datas atuais.
+        self.validades = {}
+
+    def registrar(self, linha, situacao, chave, valor_atual=None, valor_novo=None, detalhe=''):
+        self.linhas.append(LinhaPrevia(linha, situacao, chave, valor_atual, valor_novo, detalhe, self.planilha))
+
+    def registrar_erros(self, erros):
+        """Erros no formato (linha, 'Linha N: mensagem') das rotinas de cadastro."""
+        for linha, mensagem in erros:
+            self.registrar(linha, 'invalido', '', detalhe=mensagem.split(': ', 1)[-1])
+
+    def ordenadas(self):
+        return sorted(self.linhas, key=lambda item: (item.planilha, item.linha is None, item.linha or 0))
+
+
+def _somente_digitos(serie):
+    return serie.astype(str).str.replace(r'\D', '', regex=True)
+
+
+def _formatar_cnpj(serie):
+    """Equivalente vetorizado de format_cnpj para uma série de CNPJs com 14 dígitos."""
+    return serie.str[:2] + '.' + serie.str[2:5] + '.' + serie.str[5:8] + '/' + serie.str[8:12] + '-' + serie.str[12:]
+
+
+def _formatar_cpf(serie):
+    """Equivalente vetorizado de format_cpf para uma série de CPFs com 11 dígitos."""
+    return serie.str[:3] + '.' + serie.str[3:6] + '.' + serie.str[6:9] + '-' + serie.str[9:]
+
+
+# Quinta posição da placa antiga -> letra da placa Mercosul (veja chave_placa).
+_PARA_MERCOSUL = str.maketrans('0123456789', 'ABCDEFGHIJ')
+
+
+def _chaves_placa(serie):
+    """Equivalente vetorizado de chave_placa."""
+    chaves = serie.astype(str).str.upper().str.replace(r'[^A-Z0-9]', '', regex=True)
+    antiga = chaves.str.fullmatch(r'[A-Z]{3}[0-9]{4}')
+    convertidas = chaves.str[:4] + chaves.str[4].str.translate(_PARA_MERCOSUL) + chaves.str[5:]
+    return convertidas.where(antiga, chaves)
+
+
+def _maiusculas_ou_nulo(serie):
+    return serie.astype(str).str.upper().where(serie.notna(), None)
+
+
+def _registros(dados):
+    """Linhas do DataFrame como dicionários de tipos Python, com None no lugar de NaN."""
+    return dados.astype(object).where(dados.notna(), None).to_dict('records')
+
+
+def _erros(dados, mascara, mensagem):
+    """Pares (linha, mensagem) das linhas marcadas; `mensagem` recebe a linha com os valores originais."""
+    return [(linha['linha'], mensagem.format(**linha)) for linha in dados[mascara].to_dict('records')]
+
+
+def inserir_novos(tabela, linhas, chave):
+    """
+    Insere as linhas em lotes com ON CONFLICT (chave) DO NOTHING e devolve
+    quantas foram de fato gravadas (as que colidiram na coluna `chave` com uma
+    gravação concorrente são ignoradas). As demais colunas únicas são validadas
+    antes; uma colisão nelas é erro.
+    """
+    conexao = db.session.connection()
+    stmt = (insert_com_conflito(tabela, conexao).on_conflict_do_nothing(index_elements=[chave])
+            .returning(tabela.c.id))
+    gravadas = 0
+    for inicio in range(0, len(linhas), TAMANHO_LOTE):
+        gravadas += len(conexao.execute(stmt, linhas[inicio:inicio + TAMANHO_LOTE]).all())
+    return gravadas
+
+
+def _preparar_empresas(df, chaves, previa):
+    """Validação de `importar_empresas`, sem gravar: devolve as linhas novas e o resultado."""
+    dados = df[['razao_social', 'cnpj']].dropna()
+    cnpjs = _somente_digitos(dados['cnpj'])
+    validas = cnpjs.str.len() == 14
+    if previa is not None:
+        for linha in df.index.difference(dados.index):
+            previa.registrar(linha + 2, 'invalido', '', detalhe='Faltando razão social ou CNPJ.')
+        for linha, cnpj in dados.loc[~validas, 'cnpj'].items():
+            previa.registrar(linha + 2, 'invalido', str(cnpj), detalhe='CNPJ inválido.')
+    chaves_cnpj = cnpjs[validas].astype('int64')
+    cnpjs = _formatar_cnpj(cnpjs[validas])
+    razoes = dados.loc[validas, 'razao_social'].astype(str).str.strip().str.upper()
+
+    if 'empresas' not in chaves:
+        existentes = db.session.execute(select(Empresa.cnpj_chave, Empresa.razao_social)).all()
+        chaves['empresas'] = ({chave for chave, _ in existentes}, {razao for _, razao in existentes})
+    cnpjs_conhecidos, razoes_conhecidas = chaves['empresas']
+
+    novas, cnpjs_ignorados, razoes_ignoradas = [], set(), set()
+    for linha, cnpj, chave, razao_social in zip(cnpjs.index + 2, cnpjs, chaves_cnpj.tolist(), razoes):
+        if chave in cnpjs_conhecidos:
+            cnpjs_ignorados.add(f"{razao_social} ({cnpj})")
+            situacao, detalhe = 'ja_existente', 'CNPJ já cadastrado.'
+        elif razao_social in razoes_conhecidas:
+            razoes_ignoradas.add(f"{razao_social} ({cnpj})")
+            situacao, detalhe = 'ja_existente', 'Razão social já cadastrada.'
+        else:
+            # As próximas linhas do arquivo com a mesma chave passam a ser duplicatas.
+            cnpjs_conhecidos.add(chave)
+            razoes_conhecidas.add(razao_social)
+            nova = {'cnpj': cnpj, 'cnpj_chave': chave, 'razao_social': razao_social}
+            # Na prévia, a linha segue com a empresa: a situação dela é registrada na gravação.
+            novas.append(nova if previa is None else {**nova, 'linha': linha})
+            continue
+        if previa is not None:
+            previa.registrar(linha, situacao, cnpj, valor_novo=razao_social, detalhe=detalhe)
+    return novas, ResultadoEmpresas(len(novas), cnpjs_ignorados, razoes_ignoradas)
+
+
+def importar_empresas(df, chaves=None, previa=None):
+    """
+    Cadastra as empresas da planilha (colunas razao_social e cnpj) que ainda não
+    existem, sem confirmar a transação.
+
+    Linhas sem os dois campos ou com CNPJ sem 14 dígitos são descartadas. Uma
+    linha é ignorada se o CNPJ ou a razão social já existirem no banco ou em uma
+    linha anterior do próprio arquivo; os rótulos "RAZÃO (CNPJ)" das ignoradas
+    voltam em `cnpjs_ignorados` e `razoes_ignoradas`.
+
+    Para um arquivo lido em lotes, passe o mesmo dict `chaves` a cada lote: ele
+    guarda as chaves lidas do banco e as gravadas nos lotes anteriores.
+    """
+    novas, resultado = _preparar_empresas(df, {} if chaves is None else chaves, previa)
+    if previa is not None:
+        for empresa in novas:
+            previa.registrar(empresa['linha'], 'novo', empresa['cnpj'], valor_novo=empresa['razao_social'])
+        return resultado
+    return resultado._replace(novas=inserir_novos(Empresa.__table__, novas, 'cnpj_chave'))
+
+
+def _cadastros_com_empresa(df, obrigatorias, aviso_faltando, chaves):
+    """
+    Etapas comuns às planilhas de motoristas e de veículos, na ordem da validação
+    original: campos obrigatórios, CNPJ do transportador com 14 dígitos e empresa
+    cadastrada com esse CNPJ (um merge com a tabela chave do CNPJ -> id, lida uma vez).
+
+    Devolve as linhas aprovadas (com `linha` e `empresa_id`), os erros como pares
+    (linha, mensagem) e as linhas (`linha`, `cnpj`) cujo CNPJ não tem empresa.
+    """
+    dados = df.assign(linha=df.index + 2)
+
+    faltando = dados[obrigatorias].isna().any(axis=1)
+    erros = _erros(dados, faltando, 'Linha {linha}: ' + aviso_faltando)
+    dados = dados[~faltando]
+
+    cnpjs = _somente_digitos(dados['cnpj_transportador'])
+    cnpj_invalido = cnpjs.str.len() != 14
+    erros += _erros(dados, cnpj_invalido, "Linha {linha}: CNPJ '{cnpj_transportador}' inválido.")
+    cnpjs = cnpjs[~cnpj_invalido]
+    dados = dados[~cnpj_invalido].assign(cnpj=_formatar_cnpj(cnpjs), cnpj_chave=cnpjs.astype('int64'))
+
+    if 'cnpj_empresa' not in chaves:
+        chaves['cnpj_empresa'] = pd.DataFrame(db.session.execute(select(Empresa.cnpj_chave, Empresa.id)).all(),
+                                              columns=['cnpj_chave', 'empresa_id']).astype('int64')
+    # O merge devolve um índice novo; a numeração das linhas do arquivo segue em `linha`.
+    dados = dados.merge(chaves['cnpj_empresa'], on='cnpj_chave', how='left')
+    sem_empresa = dados['empresa_id'].isna()
+    aprovados = dados[~sem_empresa].astype({'empresa_id': 'int64'})
+    return aprovados, erros, dados.loc[sem_empresa, ['linha', 'cnpj']]
+
+
+def _registrar_cadastro(previa, erros, sem_empresa, repetidos, chave):
+    """
+    Registra na prévia o destino das linhas recusadas de uma planilha de
+    motoristas ou veículos; as novas seguem com a `linha` nos registros e são
+    registradas na gravação (veja `_registrar_novos`).
+    """
+    previa.registrar_erros(erros)
+    for linha, cnpj in zip(sem_empresa['linha'], sem_empresa['cnpj']):
+        previa.registrar(linha, 'nao_encontrado', cnpj, detalhe='Nenhuma empresa com este CNPJ.')
+    for linha, valor in zip(repetidos['linha'], repetidos[chave]):
+        previa.registrar(linha, 'ja_existente', valor, detalhe='Já cadastrado ou repetido no arquivo.')
+
+
+def _registrar_novos(previa, registros, chave):
+    for registro in registros:
+        previa.registrar(registro['linha'], 'novo', registro[chave], detalhe=f"Empresa {registro['empresa_id']}")
+
+
+def _preparar_motoristas(df, chaves, previa):
+    """Validação de `importar_motoristas`, sem gravar: devolve as linhas novas e o resultado."""
+    colunas = ['nome', 'cpf', 'cnpj_transportador'] + [c for c in ('cnh', 'operacao') if c in df.columns]
+    dados, erros, sem_empresa = _cadastros_com_empresa(
+        df[colunas], ['nome', 'cpf', 'cnpj_transportador'], 'Faltando nome, cpf ou cnpj.', chaves)
+
+    cpfs = _somente_digitos(dados['cpf'])
+    cpf_invalido = cpfs.str.len() != 11
+    erros += _erros(dados, cpf_invalido, "Linha {linha}: CPF '{cpf}' inválido.")
+    cpfs = cpfs[~cpf_invalido]
+    dados = dados[~cpf_invalido].assign(cpf=_formatar_cpf(cpfs), cpf_chave=cpfs.astype('int64'))
+
+    # Anti-join com os CPFs cadastrados (pela chave); dentro do arquivo vale a primeira ocorrência.
+    if 'cpfs' not in chaves:
+        chaves['cpfs'] = set(db.session.execute(select(Motorista.cpf_chave)).scalars())
+    repetido = dados['cpf_chave'].isin(chaves['cpfs']) | dados['cpf_chave'].duplicated()
+    novos = dados[~repetido]
+
+    # A CNH também é única: a linha com uma CNH já cadastrada ou repetida no arquivo é recusada.
+    if 'cnh' in novos:
+        if 'cnhs' not in chaves:
+            chaves['cnhs'] = set(db.session.execute(select(Motorista.cnh).where(Motorista.cnh.isnot(None))).scalars())
+        cnhs = novos['cnh'].astype(str).where(novos['cnh'].notna(), None)
+        cnh_repetida = cnhs.notna() & (cnhs.isin(chaves['cnhs']) | cnhs.duplicated())
+        erros += _erros(novos.assign(cnh=cnhs), cnh_repetida,
+                        "Linha {linha}: CNH '{cnh}' já cadastrada ou repetida no arquivo.")
+        novos = novos[~cnh_repetida]
+        chaves['cnhs'].update(cnhs[~cnh_repetida].dropna())
+    chaves['cpfs'].update(novos['cpf_chave'].tolist())
+
+    erros.sort()
+    if previa is not None:
+        _registrar_cadastro(previa, erros, sem_empresa, dados[repetido], 'cpf')
+
+    registros = _registros(pd.DataFrame({
+        'nome': novos['nome'].astype(str).str.upper(),
+        'cpf': novos['cpf'],
+        'cpf_chave': novos['cpf_chave'],
+        'cnh': novos['cnh'].astype(str).where(novos['cnh'].notna(), None) if 'cnh' in novos else None,
+        'operacao': _maiusculas_ou_nulo(novos['operacao']) if 'operacao' in novos else None,
+        'empresa_id': novos['empresa_id'],
+        **({'linha': novos['linha']} if previa is not None else {}),
+    }))
+    return registros, ResultadoCadastro(len(registros), int(repetido.sum()), set(sem_empresa['cnpj']),
+                                        [mensagem for _, mensagem in erros])
+
+
+def importar_motoristas(df, chaves=None, previa=None):
+    """
+    Cadastra os motoristas da planilha (nome, cpf, cnpj_transportador e,
+    opcionalmente, cnh e operacao), sem confirmar a transação. CPFs já
+    cadastrados ou repetidos no próprio arquivo são contados em `ja_existentes`.
+    `chaves` tem o mesmo papel que em `importar_empresas`.
+    """
+    registros, resultado = _preparar_motoristas(df, {} if chaves is None else chaves, previa)
+    if previa is not None:
+        _registrar_novos(previa, registros, 'cpf')
+        return resultado
+    return resultado._replace(novos=inserir_novos(Motorista.__table__, registros, 'cpf_chave'))
+
+
+def _preparar_veiculos(df, chaves, previa):
+    """Validação de `importar_veiculos`, sem gravar: devolve as linhas novas e o resultado."""
+    colunas = ['placa', 'cnpj_transportador'] + [c for c in ('operacao',) if c in df.columns]
+    dados, erros, sem_empresa = _cadastros_com_empresa(
+        df[colunas], ['placa', 'cnpj_transportador'], 'Faltando placa ou cnpj.', chaves)
+
+    placas = dados['placa'].astype(str).str.strip().str.upper()
+    chaves_placa = _chaves_placa(placas)
+    em_branco = chaves_placa == ''
+    erros += _erros(dados, em_branco, 'Linha {linha}: Placa não pode estar em branco.')
+    dados = dados[~em_branco].assign(placa=placas[~em_branco], placa_chave=chaves_placa[~em_branco])
+
+    # 'ABC-1234', 'abc1234' e 'ABC1C34' são a mesma placa (veja chave_placa).
+    if 'placas' not in chaves:
+        chaves['placas'] = set(db.session.execute(select(Veiculo.placa_chave)).scalars())
+    repetido = dados['placa_chave'].isin(chaves['placas']) | dados['placa_chave'].duplicated()
+    novos = dados[~repetido]
+    chaves['placas'].update(novos['placa_chave'])
+
+    erros.sort()
+    if previa is not None:
+        _registrar_cadastro(previa, erros, sem_empresa, dados[repetido], 'placa')
+
+    registros = _registros(pd.DataFrame({
+        'placa': novos['placa'],
+        'placa_chave': novos['placa_chave'],
+        'operacao': _maiusculas_ou_nulo(novos['operacao']) if 'operacao' in novos else None,
+        'empresa_id': novos['empresa_id'],
+        **({'linha': novos['linha']} if previa is not None else {}),
+    }))
+    return registros, ResultadoCadastro(len(registros), int(repetido.sum()), set(sem_empresa['cnpj']),
+                                        [mensagem for _, mensagem in erros])
+
+
+def importar_veiculos(df, chaves=None, previa=None):
+    """
+    Cadastra os veículos da planilha (placa, cnpj_transportador e, opcionalmente,
+    operacao), sem confirmar a transação. Placas já cadastradas ou repetidas no
+    próprio arquivo são contadas em `ja_existentes`. `chaves` tem o mesmo papel
+    que em `importar_empresas`.
+    """
+    registros, resultado = _preparar_veiculos(df, {} if chaves is None else chaves, previa)
+    if previa is not None:
+        _registrar_novos(previa, registros, 'placa')
+        return resultado
+    return resultado._replace(novos=inserir_novos(Veiculo.__table__, registros, 'placa_chave'))
+
+
+def gravar_validades(modelo, documentos, previa=None):
+    """
+    Grava as validades de documentos (dicts com a coluna do dono, nome_documento
+    e data_vencimento) de um dos modelos de documento, sem confirmar a transação.
+
+    Por lote, uma consulta lê as datas atuais das chaves do lote (para contar
+    novos, atualizados e inalterados) e um único INSERT ... ON CONFLICT DO UPDATE
+    grava os novos e os que mudaram; o WHERE ... IS DISTINCT FROM garante que uma
+    linha sem mudança não seja reescrita. Se a mesma chave aparece mais de uma
+    vez no arquivo, vale a última linha. O índice de vencimentos é atualizado aqui.
+
+    Os dicts podem trazer também `linha` e `dono` (o nome do dono no arquivo),
+    usados só na prévia; com `previa`, as datas atuais são lidas e nada é gravado.
+    As datas dos lotes anteriores, que a importação real já teria gravado, ficam
+    na prévia e valem como atuais: uma chave repetida em outro lote é contada
+    como atualizada (ou inalterada), como na gravação.
+    """
+    tabela = modelo.__table__
+    coluna_dono, entidade = _DOCUMENTOS[modelo]
+    chave_tabela = tuple_(tabela.c[coluna_dono], tabela.c.nome_documento)
+    ultimos = {(documento[coluna_dono], documento['nome_documento']): documento for documento in documentos}
+    datas = {chave: documento['data_vencimento'] for chave, documento in ultimos.items()}
+    chaves = list(datas)
+
+    conexao = db.session.connection()
+    upsert = insert_com_conflito(tabela, conexao)
+    upsert = upsert.on_conflict_do_update(
+        index_elements=[coluna_dono, 'nome_documento'],
+        set_={'data_vencimento': upsert.excluded.data_vencimento},
+        where=tabela.c.data_vencimento.is_distinct_from(upsert.excluded.data_vencimento),
+    ).returning(tabela.c.id)
+
+    novos = atualizados = inalterados = 0
+    gravados = []
+    simuladas = previa.validades.setdefault(tabela.name, {}) if previa is not None else {}
+    for inicio in range(0, len(chaves), TAMANHO_LOTE):
+        lote = chaves[inicio:inicio + TAMANHO_LOTE]
+        atuais = {(dono, nome): data for dono, nome, data in conexao.execute(
+            select(tabela.c[coluna_dono], tabela.c.nome_documento, tabela.c.data_vencimento)
+            .where(chave_tabela.in_(lote)))}
+        atuais.update((chave, simuladas[chave]) for chave in lote if chave in simuladas)
+
+        alterados = []
+        for chave in lote:
+            data = datas[chave]
+            if chave not in atuais:
+                novos += 1
+            elif atuais[chave] != data:
+                atualizados += 1
+            else:
+                inalterados += 1
+                continue
+            alterados.append({coluna_dono: chave[0], 'nome_documento': chave[1], 'data_vencimento': data})
+        if previa is not None:
+            for chave in lote:
+                documento = ultimos[chave]
+                atual = atuais.get(chave)
+                situacao = 'novo' if chave not in atuais else 'atualizado' if atual != datas[chave] else 'inalterado'
+                previa.registrar(documento.get('linha'), situacao, f"{documento.get('dono', chave[0])} / {chave[1]}",
+                                 atual, datas[chave])
+                simuladas[chave] = datas[chave]
+        elif alterados:
+            gravados += conexao.execute(upsert, alterados).scalars().all()
+
+    if previa is not None:
+        for documento in documentos:
+            ultimo = ultimos[(documento[coluna_dono], documento['nome_documento'])]
+            if ultimo is not documento:
+                previa.registrar(documento.get('linha'), 'repetido',
+                                 f"{documento.get('dono', documento[coluna_dono])} / {documento['nome_documento']}",
+                                 valor_novo=documento['data_vencimento'],
+                                 detalhe=f"Substituída pela linha {ultimo.get('linha')}.")
+    else:
+        sincronizar_documentos(conexao, entidade, gravados)
+    return ResultadoValidades(novos, atualizados, inalterados)
+
+
+# --- Importação completa de um arquivo ---
+
+class ArquivoInvalido(Exception):
+    """O arquivo não pode ser importado; a mensagem é exibida ao usuário."""
+
+
+def _colunas_minusculas(df):
+    df.columns = [str(col).strip().lower() for col in df.columns]
+    return df
+
+
+def _colunas_de_validade(df):
+    df.columns = [str(c).strip().lower().replace(' ', '_') for c in df.columns]
+    return df
+
+
+def _exigir_colunas(df, colunas, mensagem):
+    if not set(colunas).issubset(df.columns):
+        raise ArquivoInvalido(mensagem)
+
+
+def _lotes(caminho, progresso, normalizar_colunas, colunas_texto=None, encoding_csv=None, planilha=None,
+           linhas_por_lote=None):
+    """
+    Lotes do arquivo com as colunas normalizadas. Antes de cada lote informa o
+    progresso (linhas já processadas, total estimado) e, depois do último, o
+    total real; quem consome confirma a transação a cada lote.
+    """
+    total, encoding = inspecionar(caminho, planilha)
+    processadas = 0
+    for lote in ler_em_lotes(caminho, linhas_por_lote or current_app.config['IMPORTACAO_LINHAS_POR_LOTE'],
+                             colunas_texto, encoding_csv or encoding, planilha):
+        progresso(processadas, total)
+        yield normalizar_colunas(lote)
+        processadas += len(lote)
+    progresso(processadas, processadas)
+
+
+def _confirmar(previa, alterou):
+    """Confirma o lote (fora da prévia) e invalida o cache do painel se algo mudou."""
+    if previa is None:
+        db.session.commit()
+        if alterou:
+            invalidar_cache()
+
+
+# Consultas do retrato de cada tabela usada para validar as linhas (veja `tirar_retrato`).
+_CONSULTAS_RETRATO = {
+    'empresas': select(Empresa.id, Empresa.cnpj_chave, Empresa.razao_social),
+    'motoristas': select(Motorista.id, Motorista.nome, Motorista.cpf_chave),
+    'cnhs': select(Motorista.cnh).where(Motorista.cnh.isnot(None)),
+    'veiculos': select(Veiculo.id, Veiculo.placa_chave),
+}
+
+
+def tirar_retrato(tabelas):
+    """
+    Lê de uma vez as chaves das `tabelas` ('empresas', 'motoristas', 'cnhs', 'veiculos')
+    como listas de tuplas, que podem ser enviadas a outro processo: com elas as
+    importações validam e resolvem as linhas sem consultar o banco.
+    """
+    return {tabela: [tuple(linha) for linha in db.session.execute(_CONSULTAS_RETRATO[tabela])] for tabela in tabelas}
+
+
+class _Importacao:
+    """
+    Importação de um tipo de planilha, separada nas etapas que a importação em
+    paralelo distribui: `preparar` valida um lote e resolve as chaves sem gravar
+    (com um retrato, sem consultar o banco), `gravar` grava o que foi preparado
+    e `concluir` monta as mensagens e os contadores.
+
+    O que `preparar` acumula para as mensagens fica nos atributos listados em
+    `acumuladores`; `acumulado` e `juntar` os levam de um processo para outro.
+    """
+    # Tabelas do retrato que a validação usa.
+    tabelas = ()
+    acumuladores = ()
+    colunas_texto = None
+    encoding_csv = None
+    normalizar_colunas = staticmethod(_colunas_minusculas)
+
+    def __init__(self, retrato=None):
+        self.retrato = retrato
+
+    def acumulado(self):
+        return {nome: getattr(self, nome) for nome in self.acumuladores}
+
+    def juntar(self, acumulado):
+        for nome, valor in acumulado.items():
+            atual = getattr(self, nome)
+            if isinstance(atual, (set, dict)):
+                atual.update(valor)
+            else:
+                setattr(self, nome, atual + valor)
+
+
+class _ImportacaoEmpresas(_Importacao):
+    tabelas = ('empresas',)
+    acumuladores = ('cnpjs_ignorados', 'razoes_ignoradas')
+    encoding_csv = 'latin-1'
+    colunas_esperadas = ['razao_social', 'cnpj']
+
+    def __init__(self, retrato=None):
+        super().__init__(retrato)
+        self.chaves = {}
+        if retrato is not None:
+            self.chaves['empresas'] = ({chave for _, chave, _ in retrato['empresas']},
+                                       {razao for _, _, razao in retrato['empresas']})
+        self.novas, self.cnpjs_ignorados, self.razoes_ignoradas = 0, set(), set()
+        # Chaves gravadas nesta importação: partes preparadas em paralelo não veem as linhas umas das outras.
+        self._gravadas = (set(), set())
+
+    def preparar(self, lote, previa, progresso):
+        _exigir_colunas(lote, self.colunas_esperadas,
+                        f'O arquivo para empresas deve conter as colunas: {", ".join(self.colunas_esperadas)}')
+        novas, resultado = _preparar_empresas(lote, self.chaves, previa)
+        self.cnpjs_ignorados |= resultado.cnpjs_ignorados
+        self.razoes_ignoradas |= resultado.razoes_ignoradas
+        return novas
+
+    def gravar(self, novas, previa):
+        cnpjs, razoes = self._gravadas
+        unicas = []
+        for empresa in novas:
+            if empresa['cnpj_chave'] in cnpjs:
+                self.cnpjs_ignorados.add(f"{empresa['razao_social']} ({empresa['cnpj']})")
+                situacao, detalhe = 'ja_existente', 'CNPJ já consta em outra planilha do envio.'
+            elif empresa['razao_social'] in razoes:
+                self.razoes_ignoradas.add(f"{empresa['razao_social']} ({empresa['cnpj']})")
+                situacao, detalhe = 'ja_existente', 'Razão social já consta em outra planilha do envio.'
+            else:
+                cnpjs.add(empresa['cnpj_chave'])
+                razoes.add(empresa['razao_social'])
+                unicas.append(empresa)
+                situacao, detalhe = 'novo', ''
+            if previa is not None:
+                previa.registrar(empresa['linha'], situacao, empresa['cnpj'], valor_novo=empresa['razao_social'],
+                                 detalhe=detalhe)
+        gravadas = len(unicas) if previa is not None else inserir_novos(Empresa.__table__, unicas, 'cnpj_chave')
+        self.novas += gravadas
+        return gravadas
+
+    def concluir(self):
+        mensagens = []
+        if self.novas > 0:
+            mensagens.append(('success', f'{self.novas} novas empresas foram cadastradas com sucesso!'))
+        else:
+            mensagens.append(('info', 'Nenhuma nova empresa para cadastrar.'))
+        if self.cnpjs_ignorados:
+            mensagens.append(('warning', '<b>CNPJs já existentes (ignorados):</b><br>' + '<br>'.join(sorted(self.cnpjs_ignorados))))
+        if self.razoes_ignoradas:
+            mensagens.append(('warning', '<b>Razões Sociais já existentes (ignoradas):</b><br>' + '<br>'.join(sorted(self.razoes_ignoradas))))
+        return mensagens, {'novos': self.novas, 'cnpjs_ignorados': len(self.cnpjs_ignorados),
+                           'razoes_ignoradas': len(self.razoes_ignoradas)}
+
+
+class _ImportacaoCadastro(_Importacao):
+    """Planilhas de motoristas e de veículos, cadastrados na empresa do CNPJ do transportador."""
+    acumuladores = ('ja_existentes', 'empresas_nao_encontradas', 'dados_invalidos')
+
+    def __init__(self, retrato=None):
+        super().__init__(retrato)
+        self.chaves = {}
+        if retrato is not None:
+            self.chaves['cnpj_empresa'] = pd.DataFrame([(chave, id_) for id_, chave, _ in retrato['empresas']],
+                                                       columns=['cnpj_chave', 'empresa_id']).astype('int64')
+            self.chaves.update(self.chaves_do_retrato(retrato))
+        self.cadastrados, self.ja_existentes, self.empresas_nao_encontradas, self.dados_invalidos = 0, 0, set(), []
+        self._gravadas = set()
+
+    def preparar(self, lote, previa, progresso):
+        _exigir_colunas(lote, self.colunas_esperadas,
+                        f'O arquivo para {self.rotulo}s deve conter as colunas obrigatórias: {", ".join(self.colunas_esperadas)}')
+        registros, resultado = self.preparar_lote(lote, self.chaves, previa)
+        self.ja_existentes += resultado.ja_existentes
+        self.empresas_nao_encontradas |= resultado.empresas_nao_encontradas
+        self.dados_invalidos += resultado.dados_invalidos
+        return registros
+
+    def gravar(self, registros, previa):
+        unicos = []
+        for registro in registros:
+            if registro[self.chave] in self._gravadas:
+                self.ja_existentes += 1
+                if previa is not None:
+                    previa.registrar(registro['linha'], 'ja_existente', registro[self.coluna_exibida],
+                                     detalhe='Já consta em outra planilha do envio.')
+                continue
+            self._gravadas.add(registro[self.chave])
+            unicos.append(registro)
+        if previa is not None:
+            _registrar_novos(previa, unicos, self.coluna_exibida)
+        gravados = len(unicos) if previa is not None else inserir_novos(self.tabela, unicos, self.chave)
+        self.cadastrados += gravados
+        return gravados
+
+    def concluir(self):
+        rotulo = self.rotulo
+        mensagens = []
+        if self.cadastrados > 0:
+            mensagens.append(('success', f'<b><i class="fas fa-check-circle"></i> Sucesso: {self.cadastrados} novo(s) {rotulo}(s) foram cadastrado(s).</b>'))
+        if self.ja_existentes > 0:
+            mensagens.append(('info', f'<b><i class="fas fa-info-circle"></i> Aviso: {self.ja_existentes} {rotulo}(s) foram ignorado(s) porque {self.chave_existente} já consta no sistema.</b>'))
+        if self.empresas_nao_encontradas:
+            mensagens.append(('danger', '<b><i class="fas fa-exclamation-triangle"></i> Erro Crítico: A(s) empresa(s) com o(s) seguinte(s) CNPJ(s) não foi(ram) encontrada(s):</b><br>' + '<br>'.join(sorted(self.empresas_nao_encontradas))))
+        if self.dados_invalidos:
+            mensagens.append(('danger', f'<b><i class="fas fa-exclamation-triangle"></i> {len(self.dados_invalidos)} linha(s) com dados inválidos foram ignoradas:</b><br>' + '<br>'.join(self.dados_invalidos)))
+        if not any([self.cadastrados, self.ja_existentes, self.empresas_nao_encontradas, self.dados_invalidos]):
+            mensagens.append(('info', 'Arquivo processado, mas nenhuma alteração foi necessária. Verifique se os dados do arquivo já existem no sistema.'))
+        return mensagens, {'novos': self.cadastrados, 'ja_existentes': self.ja_existentes,
+                           'empresas_nao_encontradas': len(self.empresas_nao_encontradas),
+                           'dados_invalidos': len(self.dados_invalidos)}
+
+
+class _ImportacaoMotoristas(_ImportacaoCadastro):
+    tabelas = ('empresas', 'motoristas', 'cnhs')
+    tabela = Motorista.__table__
+    chave, coluna_exibida = 'cpf_chave', 'cpf'
+    colunas_esperadas = ['nome', 'cpf', 'cnpj_transportador']
+    rotulo, chave_existente = 'motorista', 'o CPF'
+    preparar_lote = staticmethod(_preparar_motoristas)
+
+    def __init__(self, retrato=None):
+        super().__init__(retrato)
+        self._cnhs_gravadas = set()
+
+    def gravar(self, registros, previa):
+        # Partes preparadas em paralelo não veem as CNHs umas das outras.
+        aceitos = []
+        for registro in registros:
+            cnh = registro['cnh']
+            if cnh is not None and registro['cpf_chave'] not in self._gravadas:
+                if cnh in self._cnhs_gravadas:
+                    self.dados_invalidos.append(f"CPF {registro['cpf']}: CNH '{cnh}' repetida no arquivo.")
+                    if previa is not None:
+                        previa.registrar(registro['linha'], 'invalido', registro['cpf'],
+                                         detalhe=f"CNH '{cnh}' já consta em outra planilha do envio.")
+                    continue
+                self._cnhs_gravadas.add(cnh)
+            aceitos.append(registro)
+        return super().gravar(aceitos, previa)
+
+    @staticmethod
+    def chaves_do_retrato(retrato):
+        return {'cpfs': {chave for _, _, chave in retrato['motoristas']},
+                'cnhs': {cnh for cnh, in retrato['cnhs']}}
+
+
+class _ImportacaoVeiculos(_ImportacaoCadastro):
+    tabelas = ('empresas', 'veiculos')
+    tabela = Veiculo.__table__
+    chave, coluna_exibida = 'placa_chave', 'placa'
+    colunas_esperadas = ['placa', 'cnpj_transportador']
+    rotulo, chave_existente = 'veículo', 'a placa'
+    preparar_lote = staticmethod(_preparar_veiculos)
+
+    @staticmethod
+    def chaves_do_retrato(retrato):
+        return {'placas': {chave for _, chave in retrato['veiculos']}}
+
+
+class _ImportacaoValidades(_Importacao):
+    """
+    Planilha de validades (Tipo evento, Nome, Data vencimento). `resolver(row)`
+    devolve (dict com a coluna do dono, situação, detalhe); sem dono, a situação
+    diz por quê ('nao_encontrado', 'ambiguo' ou 'invalido'). Linhas com data
+    inválida ou sem nenhuma das `colunas_dono` (a primeira é obrigatória no
+    cabeçalho, as demais opcionais) são descartadas. Uma chave repetida em lotes
+    diferentes conta como nova e depois como atualizada.
+    """
+    colunas_texto = {'Nome', 'Tipo evento', 'CPF', 'cpf'}
+    normalizar_colunas = staticmethod(_colunas_de_validade)
+    colunas_dono = ('nome',)
+    acumuladores = ('datas_invalidas',)
+
+    def __init__(self, retrato=None):
+        super().__init__(retrato)
+        self.contadores = {'novos': 0, 'atualizados': 0, 'inalterados': 0}
+        self._datas = NormalizadorDatas()
+        # Pares (linha, valor) das datas de vencimento que não puderam ser convertidas.
+        self.datas_invalidas = []
+        self._resolvedor = None
+
+    @property
+    def resolvedor(self):
+        # Montado no primeiro uso: na importação em paralelo, quem grava não resolve nomes.
+        if self._resolvedor is None:
+            self._resolvedor = self.criar_resolvedor()
+        return self._resolvedor
+
+    def preparar(self, lote, previa, progresso):
+        colunas = ['tipo_evento', self.colunas_dono[0], 'data_vencimento']
+        _exigir_colunas(lote, colunas, self.aviso_colunas)
+        dono = [coluna for coluna in self.colunas_dono if coluna in lote.columns]
+        validas = lote[['tipo_evento', 'data_vencimento']].notna().all(axis=1) & lote[dono].notna().any(axis=1)
+        if previa is not None:
+            for linha in lote.index[~validas]:
+                previa.registrar(linha + 2, 'invalido', '', detalhe='Faltando tipo de evento, dono ou data de vencimento.')
+
+        # A coluna de vencimento do lote é convertida de uma vez (app/datas.py).
+        vencimentos = lote.loc[validas, 'data_vencimento']
+        datas = self._datas.converter(vencimentos)
+        invalidas = self._datas.invalidas(vencimentos, datas)
+        self.datas_invalidas += [(indice + 2, str(valor)) for indice, valor in vencimentos[invalidas].items()]
+
+        documentos = []
+        registros = lote[validas].to_dict('records')
+        linhas = zip(lote.index[validas], registros, datas, invalidas)
+        for numero, (indice, row, data_vencimento, invalida) in enumerate(linhas, start=1):
+            if numero % INTERVALO_PROGRESSO == 0:
+                progresso(lote.index[0] + numero, None)
+            rotulo_dono = next(str(row[coluna]).strip() for coluna in dono if pd.notna(row[coluna]))
+            if invalida:
+                if previa is not None:
+                    previa.registrar(indice + 2, 'invalido', rotulo_dono, valor_novo=row['data_vencimento'],
+                                     detalhe='Data de vencimento inválida.')
+                continue
+            chave_dono, situacao, detalhe = self.resolver(row)
+            if chave_dono is None:
+                if previa is not None:
+                    previa.registrar(indice + 2, situacao, rotulo_dono, detalhe=detalhe)
+                continue
+            documentos.append({**chave_dono, 'nome_documento': str(row['tipo_evento']).strip().upper(),
+                               'data_vencimento': data_vencimento, 'linha': indice + 2,
+                               'dono': rotulo_dono})
+        return documentos
+
+    def gravar(self, documentos, previa):
+        resultado = gravar_validades(self.modelo, documentos, previa)
+        for nome, valor in resultado._asdict().items():
+            self.contadores[nome] += valor
+        return resultado.novos or resultado.atualizados
+
+    def concluir(self):
+        contadores, rotulo = dict(self.contadores), self.rotulo
+        mensagens = []
+        if contadores['novos']:
+            mensagens.append(('success', f'{contadores["novos"]} novas validades {rotulo} cadastradas.'))
+        if contadores['atualizados']:
+            mensagens.append(('info', f'{contadores["atualizados"]} validades {rotulo} foram atualizadas.'))
+        if contadores['inalterados']:
+            mensagens.append(('info', f'{contadores["inalterados"]} validades {rotulo} já estavam em dia.'))
+        if self.datas_invalidas:
+            invalidas = sorted(self.datas_invalidas)
+            linhas = [f'Linha {linha}: {escape(valor)}' for linha, valor in invalidas[:_DATAS_INVALIDAS_EXIBIDAS]]
+            if len(invalidas) > _DATAS_INVALIDAS_EXIBIDAS:
+                linhas.append(f'... e mais {len(invalidas) - _DATAS_INVALIDAS_EXIBIDAS}.')
+            mensagens.append(('warning', f'<b>{len(invalidas)} linha(s) com data de vencimento inválida foram ignoradas:</b><br>'
+                              + '<br>'.join(linhas)))
+        contadores['datas_invalidas'] = len(self.datas_invalidas)
+        return mensagens, contadores
+
+
+class _ImportacaoDocFiscal(_ImportacaoValidades):
+    # A coluna 'Nome' identifica a empresa pela razão social.
+    tabelas = ('empresas',)
+    acumuladores = _ImportacaoValidades.acumuladores + ('nao_encontrados', 'ambiguos', 'aproximados')
+    modelo, rotulo = DocumentoFiscal, 'fiscais'
+    aviso_colunas = 'Arquivo fiscal deve conter as colunas: "Nome", "Tipo evento", "Data vencimento".'
+
+    def __init__(self, retrato=None):
+        super().__init__(retrato)
+        self.nao_encontrados, self.ambiguos, self.aproximados = set(), {}, {}
+
+    def criar_resolvedor(self):
+        if self.retrato is None:
+            return ResolvedorEmpresas()
+        return ResolvedorEmpresas([(id_, razao_social) for id_, _, razao_social in self.retrato['empresas']])
+
+    def resolver(self, row):
+        nome = str(row['nome']).strip()
+        resolucao = self.resolvedor.resolver(nome)
+        if resolucao.situacao == 'nao_encontrado':
+            self.nao_encontrados.add(nome)
+            return None, 'nao_encontrado', 'Nenhuma empresa com este nome.'
+        if resolucao.situacao == 'ambiguo':
+            self.ambiguos[nome] = resolucao.candidatas
+            return None, 'ambiguo', f'Possíveis: {"; ".join(resolucao.candidatas)}'
+        detalhe = ''
+        if resolucao.situacao == 'semelhante':
+            self.aproximados[nome] = resolucao.candidatas[0]
+            detalhe = f'Associada por semelhança a {resolucao.candidatas[0]}'
+        return {'empresa_id': resolucao.id}, resolucao.situacao, detalhe
+
+    def concluir(self):
+        mensagens, contadores = super().concluir()
+        if self.nao_encontrados:
+            mensagens.append(('warning', f'Atenção: As seguintes empresas não foram encontradas: {", ".join(sorted(self.nao_encontrados))}'))
+        if self.ambiguos:
+            mensagens.append(('danger', '<b>Empresas com nome ambíguo (não processadas):</b><br>' + '<br>'.join(
+                f'{nome} (possíveis: {"; ".join(candidatas)})' for nome, candidatas in sorted(self.ambiguos.items()))))
+        if self.aproximados:
+            mensagens.append(('info', '<b>Empresas associadas por semelhança de nome:</b><br>' + '<br>'.join(
+                f'{nome} &rarr; {razao_social}' for nome, razao_social in sorted(self.aproximados.items()))))
+        contadores.update(nao_encontrados=len(self.nao_encontrados), ambiguos=len(self.ambiguos),
+                          aproximados=len(self.aproximados))
+        return mensagens, contadores
+
+
+class _ImportacaoDocMotorista(_ImportacaoValidades):
+    # Com a coluna opcional 'CPF' preenchida, a linha é associada pelo CPF; sem ela, pelo nome.
+    tabelas = ('motoristas',)
+    acumuladores = _ImportacaoValidades.acumuladores + ('nao_encontrados', 'duplicados', 'cpfs_nao_encontrados')
+    modelo, rotulo = DocumentoMotorista, 'de motoristas'
+    aviso_colunas = "Arquivo de motorista deve conter: 'Tipo evento', 'Nome', 'Data vencimento'."
+    colunas_dono = ('nome', 'cpf')
+
+    def __init__(self, retrato=None):
+        super().__init__(retrato)
+        self.nao_encontrados, self.duplicados, self.cpfs_nao_encontrados = set(), set(), set()
+
+    def criar_resolvedor(self):
+        return ResolvedorMotoristas(None if self.retrato is None else self.retrato['motoristas'])
+
+    def resolver(self, row):
+        cpf = row.get('cpf')
+        if pd.notna(cpf):
+            resolucao = self.resolvedor.por_cpf(cpf)
+            if resolucao.id is None:
+                self.cpfs_nao_encontrados.add(str(cpf).strip())
+                return None, resolucao.situacao, 'Nenhum motorista com este CPF.' if resolucao.situacao == 'nao_encontrado' else 'CPF inválido.'
+        else:
+            nome = str(row['nome']).strip()
+            resolucao = self.resolvedor.por_nome(nome)
+            if resolucao.situacao == 'ambiguo':
+                self.duplicados.add(nome)
+                return None, 'ambiguo', 'Mais de um motorista com este nome; informe o CPF.'
+            if resolucao.id is None:
+                self.nao_encontrados.add(nome)
+                return None, 'nao_encontrado', 'Nenhum motorista com este nome.'
+        return {'motorista_id': resolucao.id}, resolucao.situacao, ''
+
+    def concluir(self):
+        mensagens, contadores = super().concluir()
+        if self.nao_encontrados:
+            mensagens.append(('warning', f'Motoristas não encontrados: {", ".join(sorted(self.nao_encontrados))}'))
+        if self.cpfs_nao_encontrados:
+            mensagens.append(('warning', f'CPFs não encontrados ou inválidos: {", ".join(sorted(self.cpfs_nao_encontrados))}'))
+        if self.duplicados:
+            mensagens.append(('danger', f'Motoristas com nome duplicado (não processados, informe o CPF): {", ".join(sorted(self.duplicados))}'))
+        contadores.update(nao_encontrados=len(self.nao_encontrados) + len(self.cpfs_nao_encontrados),
+                          duplicados=len(self.duplicados))
+        return mensagens, contadores
+
+
+class _ImportacaoDocVeiculo(_ImportacaoValidades):
+    # A coluna 'Nome' traz a placa.
+    tabelas = ('veiculos',)
+    acumuladores = _ImportacaoValidades.acumuladores + ('nao_encontrados',)
+    modelo, rotulo = DocumentoVeiculo, 'de veículos'
+    aviso_colunas = "Arquivo de veículo deve conter: 'Tipo evento', 'Nome' (placa), 'Data vencimento'."
+
+    def __init__(self, retrato=None):
+        super().__init__(retrato)
+        self.nao_encontrados = set()
+
+    def criar_resolvedor(self):
+        return ResolvedorVeiculos(None if self.retrato is None else self.retrato['veiculos'])
+
+    def resolver(self, row):
+        placa_limpa = str(row['nome']).strip().upper()
+        resolucao = self.resolvedor.por_placa(placa_limpa)
+        if resolucao.id is None:
+            self.nao_encontrados.add(placa_limpa)
+            return None, 'nao_encontrado', 'Nenhum veículo com esta placa.'
+        return {'veiculo_id': resolucao.id}, 'exato', ''
+
+    def concluir(self):
+        mensagens, contadores = super().concluir()
+        if self.nao_encontrados:
+            mensagens.append(('warning', f'Placas não encontradas: {", ".join(sorted(self.nao_encontrados))}'))
+        contadores['nao_encontrados'] = len(self.nao_encontrados)
+        return mensagens, contadores
+
+
+_IMPORTACOES = {
+    'empresas': _ImportacaoEmpresas,
+    'motoristas': _ImportacaoMotoristas,
+    'veiculos': _ImportacaoVeiculos,
+    'doc_fiscal': _ImportacaoDocFiscal,
+    'doc_motorista': _ImportacaoDocMotorista,
+    'doc_veiculo': _ImportacaoDocVeiculo,
+}
+TIPOS_IMPORTACAO = tuple(_IMPORTACOES)
+
+
+def _importar_arquivo(importacao, caminho, progresso, previa=None, planilha=None):
+    """Lê, prepara, grava e confirma lote a lote uma planilha do arquivo."""
+    for lote in _lotes(caminho, progresso, importacao.normalizar_colunas, importacao.colunas_texto,
+                       importacao.encoding_csv, planilha):
+        _confirmar(previa, importacao.gravar(importacao.preparar(lote, previa, progresso), previa))
+    return importacao.concluir()
+
+
+# --- Vários arquivos e planilhas em paralelo ---
+
+# Uma planilha de um dos arquivos enviados; `planilha` é None no CSV.
+Parte = namedtuple('Parte', 'tipo caminho planilha nome')
+
+
+def partes_do_envio(tipo, caminho):
+    """
+    Planilhas com dados do envio em `caminho`: um arquivo ou um diretório com os
+    arquivos (veja `tarefas.salvar_envio`). As partes são nomeadas pelo arquivo
+    e, em pastas de trabalho com mais de uma planilha, também pela planilha; os
+    arquivos de um diretório seguem a ordem dos nomes.
+    """
+    if os.path.isdir(caminho):
+        arquivos = [os.path.join(caminho, nome) for nome in sorted(os.listdir(caminho))]
+    else:
+        arquivos = [caminho]
+    partes = []
+    for arquivo in arquivos:
+        planilhas = planilhas_com_dados(arquivo)
+        for planilha in planilhas:
+            nome = os.path.basename(arquivo) if len(planilhas) == 1 else f'{os.path.basename(arquivo)} / {planilha}'
+            partes.append(Parte(tipo, arquivo, planilha, nome))
+    return partes
+
+
+def preparar_parte(parte, retrato, linhas_por_lote, simular=False, progresso=None):
+    """
+    Lê uma parte em lotes e prepara cada um com o `retrato`, sem acessar o banco
+    nem o contexto da aplicação: é o que roda nos processos da fila. Os lotes
+    preparados vão para um arquivo temporário, um após o outro, para que nem o
+    processo que prepara nem o que grava precisem guardar a parte inteira.
+    Devolve (caminho desse arquivo, quantos lotes, os acumuladores, linhas
+    lidas, linhas da prévia); quem recebe apaga o arquivo (`_lotes_preparados`).
+    O `progresso` (das linhas da parte) só serve a quem prepara no próprio
+    processo.
+    """
+    progresso = progresso or _sem_progresso
+    importacao = _IMPORTACOES[parte.tipo](retrato)
+    previa = Previa(parte.nome) if simular else None
+    lotes, linhas = 0, 0
+    descritor, caminho = tempfile.mkstemp(prefix='importacao-', suffix='.lotes')
+    try:
+        with os.fdopen(descritor, 'wb') as arquivo:
+            for lote in _lotes(parte.caminho, progresso, importacao.normalizar_colunas, importacao.colunas_texto,
+                               importacao.encoding_csv, parte.planilha, linhas_por_lote):
+                pickle.dump(importacao.preparar(lote, previa, progresso), arquivo, pickle.HIGHEST_PROTOCOL)
+                lotes += 1
+                linhas += len(lote)
+    except BaseException:
+        os.remove(caminho)
+        raise
+    return caminho, lotes, importacao.acumulado(), linhas, previa.linhas if previa is not None else []
+
+
+def _lotes_preparados(caminho, lotes):
+    """Lê de volta, um de cada vez, os lotes que `preparar_parte` guardou; apaga o arquivo no fim."""
+    try:
+        with open(caminho, 'rb') as arquivo:
+            for _ in range(lotes):
+                yield pickle.load(arquivo)
+    finally:
+        os.remove(caminho)
+
+
+def _aguardar(futuro, sinal):
+    """Resultado de `futuro`, chamando `sinal()` a cada INTERVALO_SINAL segundos de espera."""
+    while not wait([futuro], timeout=INTERVALO_SINAL).done:
+        sinal()
+    return futuro.result()
+
+
+def _descartar_preparo(futuro):
+    # Parte que não chegou a ser gravada (outra falhou antes): só o arquivo temporário fica para trás.
+    if not futuro.cancelled() and futuro.exception() is None:
+        os.remove(futuro.result()[0])
+
+
+def importar_partes(partes, progresso=None, executor=None, previa=None):
+    """
+    Importa várias planilhas do mesmo tipo de uma vez. As chaves das tabelas que
+    a validação consulta são lidas uma vez (`tirar_retrato`) e as partes são
+    lidas, validadas e resolvidas em paralelo no `executor` (um
+    ProcessPoolExecutor; sem ele, uma após a outra neste processo), no máximo
+    uma por processo do executor ao mesmo tempo. A gravação fica neste
+    processo, parte a parte (na ordem de `partes`) e lote a lote, com uma
+    confirmação por lote.
+
+    Uma parte sem as colunas obrigatórias é ignorada com uma mensagem; se todas
+    forem, levanta ArquivoInvalido. Mensagens e contadores são os da importação
+    do tipo, somando as partes.
+    """
+    progresso = progresso or _sem_progresso
+    linhas_por_lote = current_app.config['IMPORTACAO_LINHAS_POR_LOTE']
+    estimativas = [inspecionar(parte.caminho, parte.planilha)[0] for parte in partes]
+    total = None if None in estimativas else sum(estimativas)
+    classe = _IMPORTACOES[partes[0].tipo]
+    importacao, erros, processadas = classe(), [], 0
+    progresso(0, total)
+
+    retrato = tirar_retrato(classe.tabelas)
+    argumentos = deque((parte, retrato, linhas_por_lote, previa is not None) for parte in partes)
+    # Partes em preparo no executor, na ordem de `partes`: uma por processo,
+    # e a seguinte entra assim que a mais antiga sai para ser gravada.
+    em_preparo = deque()
+    simultaneas = getattr(executor, '_max_workers', 1) if executor else 0
+    importadas = []
+
+    def submeter():
+        while argumentos and len(em_preparo) < simultaneas:
+            em_preparo.append(executor.submit(preparar_parte, *argumentos.popleft()))
+
+    def sinal(*_):
+        # Enquanto uma parte é preparada, o progresso é repetido sem avançar:
+        # a tarefa não pode parecer abandonada (veja INTERVALO_SINAL).
+        progresso(processadas, None)
+
+    submeter()
+    try:
+        for parte in partes:
+            try:
+                if executor:
+                    futuro = em_preparo.popleft()
+                    submeter()
+                    resultado = _aguardar(futuro, sinal)
+                else:
+                    resultado = preparar_parte(*argumentos.popleft(), progresso=sinal)
+            except ArquivoInvalido as e:
+                erros.append(f'<b>{escape(parte.nome)}:</b> {escape(str(e))}')
+                continue
+            caminho, lotes, acumulado, linhas, linhas_previa = resultado
+            importacao.juntar(acumulado)
+            if previa is not None:
+                previa.linhas += linhas_previa
+                previa.planilha = parte.nome
+            with closing(_lotes_preparados(caminho, lotes)) as preparados:
+                for preparado in preparados:
+                    _confirmar(previa, importacao.gravar(preparado, previa))
+            importadas.append(parte.nome)
+            processadas += linhas
+            progresso(processadas, None if total is None else max(total, processadas))
+    finally:
+        for futuro in em_preparo:
+            futuro.cancel()
+            futuro.add_done_callback(_descartar_preparo)
+
+    if not importadas:
+        raise ArquivoInvalido('<br>'.join(erros) or 'Nenhuma planilha com dados foi encontrada.')
+    progresso(processadas, processadas)
+    mensagens = [('info', f'{len(importadas)} planilhas processadas: ' + ', '.join(escape(nome) for nome in importadas))]
+    if erros:
+        mensagens.append(('danger', '<b>Planilhas ignoradas:</b><br>' + '<br>'.join(erros)))
+    mensagens_tipo, contadores = importacao.concluir()
+    mensagens += mensagens_tipo
+    contadores['planilhas'] = len(importadas)
+    return mensagens, contadores
+
+
+def _importar(tipo, caminho, progresso, executor, previa):
+    partes = partes_do_envio(tipo, caminho)
+    if len(partes) > 1:
+        return importar_partes(partes, progresso, executor, previa)
+    if partes:
+        caminho, planilha = partes[0].caminho, partes[0].planilha
+    elif os.path.isdir(caminho):
+        raise ArquivoInvalido('Nenhuma planilha com dados foi encontrada.')
+    else:
+        planilha = None
+    return _importar_arquivo(_IMPORTACOES[tipo](), caminho, progresso, previa, planilha)
+
+
+def executar_importacao(tipo, caminho, progresso=None, executor=None):
+    """
+    Lê o arquivo em `caminho` em lotes (app/planilhas.py) e roda a importação do
+    `tipo`, confirmando a transação e invalidando o cache do painel a cada lote:
+    a memória usada depende do tamanho do lote, e se o processamento falhar no
+    meio os lotes anteriores continuam gravados. Devolve as mensagens (pares
+    categoria, texto, como as mensagens flash) e um dict de contadores.
+
+    Se `caminho` for um diretório com vários arquivos ou uma pasta de trabalho
+    com várias planilhas preenchidas, as planilhas são importadas por
+    `importar_partes`, em paralelo no `executor`.
+
+    `progresso(processadas, total)` é chamado entre os lotes, durante a
+    conferência das linhas de validade (com total None, já informado antes) e ao
+    final; nunca enquanto há gravações pendentes na sessão, então o chamador pode
+    confirmar a própria sessão dentro dele. Levanta ArquivoInvalido se faltarem
+    colunas obrigatórias.
+    """
+    return _importar(tipo, caminho, progresso or _sem_progresso, executor, None)
+
+
+def simular_importacao(tipo, caminho, executor=None):
+    """
+    Percorre o arquivo como `executar_importacao`, mas em uma transação somente
+    leitura e sem gravar nada. Devolve (Previa, mensagens, contadores); as
+    mensagens e os contadores são os que a importação real produziria.
+    """
+    previa = Previa()
+    with transacao_somente_leitura(db.session):
+        mensagens, contadores = _importar(tipo, caminho, _sem_progresso, executor, previa)
+    return previa, mensagens, contadores
+
+
+def _sem_progresso(processadas, total):
+    pass
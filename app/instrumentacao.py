@@ -0,0 +1,167 @@
+"""
+Instrumentação das consultas SQL de cada requisição.
+
+Com SQL_INSTRUMENTACAO ligada, os eventos before/after_cursor_execute dos
+engines do `db` (principal e réplica) alimentam o `ColetorSQL` da requisição
+atual, guardado em `g`: quantidade de instruções, tempo total no banco e
+execuções por texto de instrução. Ao fim da requisição:
+
+- a resposta recebe o cabeçalho Server-Timing (`sql` com a quantidade e o
+  tempo no banco, `app` com o tempo total), visível nas ferramentas do
+  navegador;
+- requisições acima de SQL_LIMITE_LENTO_MS são registradas no log;
+- a mesma instrução executada com SQL_REPETICOES_N_MAIS_1 parâmetros
+  diferentes ou mais (um laço que consulta linha a linha, um relacionamento
+  carregado sob demanda em cada item) é registrada como provável N+1.
+
+Em respostas em fluxo (exportações), o cabeçalho só conta as consultas feitas
+até o início do envio; o log é feito quando o envio termina e conta todas. Consultas
+fora de requisições (importações em segundo plano, CLI) não são coletadas.
+
+Ligada, também conta as execuções do processo inteiro (requisições,
+importações, CLI) pela situação no cache de compilação do SQLAlchemy
+(`metricas_compilacao`, exibidas em /admin/metricas/consultas).
+
+Desligada (o padrão), nada é registrado nos engines nem no app: custo zero.
+"""
+import threading
+import time
+from collections import Counter
+from functools import partial
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+
+from . import db
+
+# Trecho da instrução mostrado no log de N+1.
+TAMANHO_INSTRUCAO_LOG = 300
+
+
+class ColetorSQL:
+    """Instruções executadas em uma requisição: quantidade, tempo no banco e repetições por texto."""
+
+    def __init__(self, repeticoes_n_mais_1):
+        self.inicio = time.perf_counter()
+        self.quantidade = 0
+        self.tempo_banco = 0.0
+        self.repeticoes_n_mais_1 = repeticoes_n_mais_1
+        self.em_fluxo = False
+        # instrução -> [execuções, parâmetros distintos vistos (até repeticoes_n_mais_1)]
+        self._por_instrucao = {}
+
+    def registrar(self, instrucao, parametros, duracao, executemany):
+        self.quantidade += 1
+        self.tempo_banco += duracao
+        if executemany:
+            # Um executemany já é a gravação em lote; não é repetição.
+            return
+        execucoes = self._por_instrucao.get(instrucao)
+        if execucoes is None:
+            execucoes = self._por_instrucao[instrucao] = [0, set()]
+        execucoes[0] += 1
+        if len(execucoes[1]) < self.repeticoes_n_mais_1:
+            execucoes[1].add(repr(parametros))
+
+    def provaveis_n_mais_1(self):
+        """(instrução, execuções) das instruções repetidas com parâmetros diferentes ao menos repeticoes_n_mais_1 vezes."""
+        return [(instrucao, execucoes) for instrucao, (execucoes, parametros) in self._por_instrucao.items()
+                if len(parametros) >= self.repeticoes_n_mais_1]
+
+    def server_timing(self):
+        decorrido = (time.perf_counter() - self.inicio) * 1000
+        return (f'sql;dur={self.tempo_banco * 1000:.1f};desc="{self.quantidade} consultas", '
+                f'app;dur={decorrido:.1f}')
+
+
+def _antes_da_execucao(conexao, cursor, instrucao, parametros, contexto, executemany):
+    if has_app_context() and 'coletor_sql' in g:
+        contexto.inicio_coletor_sql = time.perf_counter()
+
+
+def _depois_da_execucao(conexao, cursor, instrucao, parametros, contexto, executemany):
+    inicio = getattr(contexto, 'inicio_coletor_sql', None)
+    if inicio is not None and 'coletor_sql' in g:
+        g.coletor_sql.registrar(instrucao, parametros, time.perf_counter() - inicio, executemany)
+
+
+# --- Métricas do cache de compilação do SQLAlchemy ---
+
+_metricas = Counter()
+_trava_metricas = threading.Lock()
+
+
+def _contar_compilacao(conexao, cursor, instrucao, parametros, contexto, executemany):
+    dialeto = contexto.dialect
+    situacao = getattr(contexto, 'cache_hit', None)
+    if situacao == dialeto.CACHE_HIT:
+        chave = 'reaproveitadas'
+    elif situacao == dialeto.CACHE_MISS:
+        chave = 'compiladas'
+    else:
+        # SQL textual, DDL ou instrução sem chave de cache.
+        chave = 'sem_cache'
+    with _trava_metricas:
+        _metricas[chave] += 1
+
+
+def metricas_compilacao():
+    """Execuções do processo atual por situação no cache de compilação e a taxa de reaproveitamento."""
+    with _trava_metricas:
+        metricas = {chave: _metricas[chave] for chave in ('reaproveitadas', 'compiladas', 'sem_cache')}
+    com_cache = metricas['reaproveitadas'] + metricas['compiladas']
+    metricas['taxa_reaproveitamento'] = round(metricas['reaproveitadas'] / com_cache, 4) if com_cache else None
+    return metricas
+
+
+class InstrumentacaoSQL:
+    """Liga o coletor às requisições e aos engines do app, se SQL_INSTRUMENTACAO estiver ligada."""
+
+    def __init__(self, limite_lento_ms=500.0, repeticoes_n_mais_1=10):
+        self.limite_lento_ms = limite_lento_ms
+        self.repeticoes_n_mais_1 = repeticoes_n_mais_1
+
+    def init_app(self, app):
+        if not app.config.get('SQL_INSTRUMENTACAO'):
+            return
+        self.limite_lento_ms = app.config.get('SQL_LIMITE_LENTO_MS', self.limite_lento_ms)
+        self.repeticoes_n_mais_1 = app.config.get('SQL_REPETICOES_N_MAIS_1', self.repeticoes_n_mais_1)
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', _antes_da_execucao)
+                event.listen(engine, 'after_cursor_execute', _depois_da_execucao)
+                event.listen(engine, 'after_cursor_execute', _contar_compilacao)
+        app.before_request(self._iniciar)
+        app.after_request(self._cabecalho)
+        app.teardown_request(self._encerrar)
+
+    def _iniciar(self):
+        g.coletor_sql = ColetorSQL(self.repeticoes_n_mais_1)
+
+    def _cabecalho(self, resposta):
+        coletor = g.get('coletor_sql')
+        if coletor is not None:
+            resposta.headers['Server-Timing'] = coletor.server_timing()
+            if resposta.is_streamed:
+                # O corpo é gerado depois do encerramento da requisição; o log espera o fim do envio.
+                coletor.em_fluxo = True
+                resposta.call_on_close(partial(self._registrar, coletor, request.method, request.path,
+                                               current_app.logger))
+        return resposta
+
+    def _encerrar(self, erro):
+        coletor = g.get('coletor_sql')
+        if coletor is not None and not coletor.em_fluxo:
+            self._registrar(coletor, request.method, request.path, current_app.logger)
+
+    def _registrar(self, coletor, metodo, caminho, logger):
+        decorrido = (time.perf_counter() - coletor.inicio) * 1000
+        if decorrido >= self.limite_lento_ms:
+            logger.warning('Requisição lenta: %s %s em %.0f ms, %d consultas SQL (%.0f ms no banco).',
+                           metodo, caminho, decorrido, coletor.quantidade, coletor.tempo_banco * 1000)
+        for instrucao, execucoes in coletor.provaveis_n_mais_1():
+            logger.warning('Provável N+1 em %s %s: instrução executada %d vezes: %s',
+                           metodo, caminho, execucoes, ' '.join(instrucao.split())[:TAMANHO_INSTRUCAO_LOG])
+
+
+instrumentacao_sql = InstrumentacaoSQL()
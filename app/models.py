@@ -23,6 +23,33 @@ def format_cpf(cpf_str):
         raise ValueError("CPF deve conter exatamente 11 dígitos.")
     return f'{digits[:3]}.{digits[3:6]}.{digits[6:9]}-{digits[9:]}'
 
+# Placa antiga (AAA9999): a quinta posição vira letra na placa Mercosul (0 -> A, 1 -> B, ...).
+_RE_PLACA_ANTIGA = re.compile(r'^[A-Z]{3}[0-9]{4}$')
+
+def chave_cnpj(cnpj):
+    """CNPJ como inteiro, só com os dígitos: '11.222.333/0001-81' vira 11222333000181."""
+    digits = re.sub(r'\D', '', str(cnpj))
+    if len(digits) != 14:
+        raise ValueError("CNPJ deve conter exatamente 14 dígitos.")
+    return int(digits)
+
+def chave_cpf(cpf):
+    """CPF como inteiro, só com os dígitos: '123.456.789-01' vira 12345678901."""
+    digits = re.sub(r'\D', '', str(cpf))
+    if len(digits) != 11:
+        raise ValueError("CPF deve conter exatamente 11 dígitos.")
+    return int(digits)
+
+def chave_placa(placa):
+    """
+    Placa em maiúsculas, sem pontuação e no padrão Mercosul: 'abc-1234' e
+    'ABC1C34' (a mesma placa convertida) têm a chave 'ABC1C34'.
+    """
+    chave = re.sub(r'[^A-Z0-9]', '', str(placa).upper())
+    if _RE_PLACA_ANTIGA.match(chave):
+        chave = chave[:4] + chr(ord('A') + int(chave[4])) + chave[5:]
+    return chave
+
 def convert_to_uppercase(value):
     if isinstance(value, str):
         return value.upper()
@@ -47,6 +74,8 @@ class Empresa(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     razao_social = db.Column(db.String(120), unique=True, nullable=False)
     cnpj = db.Column(db.String(18), unique=True, nullable=False)
+    # Chave das buscas por CNPJ (só os dígitos); `cnpj` guarda a forma formatada, exibida nas telas.
+    cnpj_chave = db.Column(db.BigInteger, nullable=False)
     # MODIFICADO: Alterado de 'status' para 'ativo' para maior clareza.
     ativo = db.Column(db.Boolean, nullable=False, default=True)
     
@@ -55,8 +84,15 @@ class Empresa(db.Model):
     veiculos = relationship('Veiculo', back_populates='empresa', lazy='dynamic')
     documentos_fiscais = relationship('DocumentoFiscal', back_populates='empresa', lazy='dynamic', cascade="all, delete-orphan")
 
+    # Comparações sem diferenciar maiúsculas (upper(razao_social) = ...) usam este índice.
+    __table_args__ = (
+        db.UniqueConstraint('cnpj_chave', name='uq_empresas_cnpj_chave'),
+        db.Index('ix_empresas_razao_social_upper', db.func.upper(razao_social)),
+    )
+
     @validates('cnpj')
     def validate_cnpj_format(self, key, cnpj):
+        self.cnpj_chave = chave_cnpj(cnpj)
         return format_cnpj(cnpj)
 
     @validates('razao_social')
@@ -73,6 +109,8 @@ class Usuario(db.Model, UserMixin):
     status = db.Column(db.String(50), nullable=False, default='ativo')
     empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=True)
 
+    __table_args__ = (db.Index('ix_usuarios_empresa_id', 'empresa_id'),)
+
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
 
@@ -95,12 +133,17 @@ class Motorista(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(120), nullable=False)
     cpf = db.Column(db.String(14), unique=True, nullable=False)
+    cpf_chave = db.Column(db.BigInteger, nullable=False)  # Só os dígitos, para as buscas
     cnh = db.Column(db.String(20), unique=True, nullable=True)
     operacao = db.Column(db.String(120), nullable=True)
     empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False)
     
     empresa = relationship('Empresa', back_populates='motoristas')
     documentos = relationship('DocumentoMotorista', back_populates='motorista', lazy='dynamic', cascade="all, delete-orphan")
+    __table_args__ = (
+        db.UniqueConstraint('cpf_chave', name='uq_motoristas_cpf_chave'),
+        db.Index('ix_motoristas_empresa_id', 'empresa_id'),
+    )
 
     @validates('nome', 'operacao')
     def validate_uppercase(self, key, value):
@@ -108,20 +151,29 @@ class Motorista(db.Model):
     
     @validates('cpf')
     def validate_cpf_format(self, key, cpf):
+        self.cpf_chave = chave_cpf(cpf)
         return format_cpf(cpf)
 
 class Veiculo(db.Model):
     __tablename__ = 'veiculos'
     id = db.Column(db.Integer, primary_key=True)
     placa = db.Column(db.String(10), unique=True, nullable=False)
+    # Chave das buscas por placa (veja chave_placa); `placa` fica como foi cadastrada.
+    placa_chave = db.Column(db.String(10), nullable=False)
     operacao = db.Column(db.String(120), nullable=True)
     empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False)
 
     empresa = relationship('Empresa', back_populates='veiculos')
     documentos = relationship('DocumentoVeiculo', back_populates='veiculo', lazy='dynamic', cascade="all, delete-orphan")
+    __table_args__ = (
+        db.UniqueConstraint('placa_chave', name='uq_veiculos_placa_chave'),
+        db.Index('ix_veiculos_empresa_id', 'empresa_id'),
+    )
 
     @validates('placa', 'operacao')
     def validate_uppercase(self, key, value):
+        if key == 'placa':
+            self.placa_chave = chave_placa(value)
         return convert_to_uppercase(value)
 
 # --- Modelos para Documentos / Validades ---
@@ -134,7 +186,10 @@ class DocumentoFiscal(db.Model):
     empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False)
 
     empresa = relationship('Empresa', back_populates='documentos_fiscais')
-    __table_args__ = (db.UniqueConstraint('empresa_id', 'nome_documento', name='_empresa_docfiscal_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('empresa_id', 'nome_documento', name='_empresa_docfiscal_uc'),
+        db.Index('ix_documentos_fiscais_empresa_id_vencimento', 'empresa_id', 'data_vencimento'),
+    )
 
     @validates('nome_documento')
     def validate_uppercase(self, key, value):
@@ -148,7 +203,10 @@ class DocumentoMotorista(db.Model):
     motorista_id = db.Column(db.Integer, db.ForeignKey('motoristas.id'), nullable=True)
 
     motorista = relationship('Motorista', back_populates='documentos')
-    __table_args__ = (db.UniqueConstraint('motorista_id', 'nome_documento', name='_motorista_documento_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('motorista_id', 'nome_documento', name='_motorista_documento_uc'),
+        db.Index('ix_documentos_motoristas_motorista_id_vencimento', 'motorista_id', 'data_vencimento'),
+    )
 
     @validates('nome_documento')
     def validate_uppercase(self, key, value):
@@ -162,8 +220,99 @@ class DocumentoVeiculo(db.Model):
     veiculo_id = db.Column(db.Integer, db.ForeignKey('veiculos.id'), nullable=True)
 
     veiculo = relationship('Veiculo', back_populates='documentos')
-    __table_args__ = (db.UniqueConstraint('veiculo_id', 'nome_documento', name='_veiculo_documento_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('veiculo_id', 'nome_documento', name='_veiculo_documento_uc'),
+        db.Index('ix_documentos_veiculos_veiculo_id_vencimento', 'veiculo_id', 'data_vencimento'),
+    )
 
     @validates('nome_documento')
     def validate_uppercase(self, key, value):
         return convert_to_uppercase(value)
+
+# --- Controle de Cache ---
+
+class VersaoDados(db.Model):
+    """Contador (linha única, id=1) incrementado sempre que os dados exibidos no painel mudam."""
+    __tablename__ = 'versao_dados'
+    id = db.Column(db.Integer, primary_key=True)
+    versao = db.Column(db.Integer, nullable=False, default=0)
+
+# --- Índice Unificado de Vencimentos ---
+
+class Vencimento(db.Model):
+    """
+    Uma linha por documento (de motorista, veículo ou empresa), já com o nome do
+    dono, a empresa, o tipo canônico e o prazo efetivo. É uma cópia
+    desnormalizada das tabelas de documentos, mantida por app/vencimentos.py,
+    para que o painel e as exportações leiam uma única tabela indexada.
+    """
+    __tablename__ = 'vencimentos'
+    id = db.Column(db.Integer, primary_key=True)
+    entidade = db.Column(db.String(20), nullable=False)  # 'motorista', 'veiculo' ou 'empresa'
+    documento_id = db.Column(db.Integer, nullable=False)
+    owner_id = db.Column(db.Integer, nullable=False)
+    nome = db.Column(db.String(120), nullable=False)  # Nome do motorista, placa ou razão social
+    empresa_id = db.Column(db.Integer, db.ForeignKey('empresas.id'), nullable=False)
+    empresa_nome = db.Column(db.String(120), nullable=False)
+    nome_documento = db.Column(db.String(120), nullable=False)
+    tipo_documento = db.Column(db.String(120), nullable=False)
+    nome_exibicao = db.Column(db.String(120), nullable=False)
+    data_vencimento = db.Column(db.Date, nullable=False)
+    prazo_alerta_dias = db.Column(db.Integer, nullable=False)
+    # Nome e documento normalizados (maiúsculas, sem acentos nem pontuação) para a busca do painel.
+    termos_busca = db.Column(db.String(250), nullable=False, server_default='')
+
+    __table_args__ = (
+        db.UniqueConstraint('entidade', 'documento_id', name='_vencimento_documento_uc'),
+        db.Index('ix_vencimentos_empresa_vencimento', 'empresa_id', 'data_vencimento'),
+        # Mesma chave da ordenação e do cursor de paginação do painel.
+        db.Index('ix_vencimentos_ordem', 'data_vencimento', 'entidade', 'id'),
+        db.Index('ix_vencimentos_tipo_documento', 'tipo_documento'),
+        # Ressincronização e remoção das linhas de um dono (sincronizar_donos e o flush da sessão).
+        db.Index('ix_vencimentos_entidade_dono', 'entidade', 'owner_id'),
+    )
+
+# --- Importações em Segundo Plano ---
+
+class TarefaImportacao(db.Model):
+    """
+    Uma importação de planilha enviada pela página de upload. O arquivo fica em
+    disco até ser processado por app/tarefas.py, que grava aqui o estado, o
+    progresso, os contadores e as mensagens exibidas ao usuário.
+    """
+    __tablename__ = 'tarefas_importacao'
+    id = db.Column(db.Integer, primary_key=True)
+    tipo = db.Column(db.String(30), nullable=False)  # 'empresas', 'motoristas', 'doc_fiscal', ...
+    nome_arquivo = db.Column(db.String(255), nullable=False)
+    caminho_arquivo = db.Column(db.String(500), nullable=False)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'), nullable=True)
+    estado = db.Column(db.String(20), nullable=False, default='pendente')  # 'pendente', 'processando', 'concluida' ou 'erro'
+    linhas_total = db.Column(db.Integer, nullable=True)
+    linhas_processadas = db.Column(db.Integer, nullable=False, default=0)
+    contadores = db.Column(db.JSON, nullable=True)
+    mensagens = db.Column(db.JSON, nullable=True)  # Lista de [categoria, texto], como as mensagens flash
+    criada_em = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow)
+    iniciada_em = db.Column(db.DateTime, nullable=True)
+    # Última gravação de progresso: sem ela há muito tempo, a tarefa ficou sem processo (app/tarefas.py).
+    atualizada_em = db.Column(db.DateTime, nullable=True)
+    concluida_em = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (db.Index('ix_tarefas_importacao_usuario', 'usuario_id', 'id'),)
+
+    @property
+    def finalizada(self):
+        return self.estado in ('concluida', 'erro')
+
+    def como_dict(self):
+        progresso = None
+        if self.finalizada:
+            progresso = 100
+        elif self.linhas_total:
+            progresso = min(100, round(100 * self.linhas_processadas / self.linhas_total))
+        return {
+            'id': self.id, 'tipo': self.tipo, 'nome_arquivo': self.nome_arquivo, 'estado': self.estado,
+            'linhas_total': self.linhas_total, 'linhas_processadas': self.linhas_processadas, 'progresso': progresso,
+            'contadores': self.contadores or {}, 'mensagens': self.mensagens or [],
+            'criada_em': self.criada_em.isoformat() if self.criada_em else None,
+            'concluida_em': self.concluida_em.isoformat() if self.concluida_em else None,
+        }
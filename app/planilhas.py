@@ -0,0 +1,167 @@
+"""
+Leitura em lotes das planilhas enviadas para importação.
+
+Em vez de carregar o arquivo inteiro em um DataFrame, `ler_em_lotes` entrega
+DataFrames de no máximo `linhas_por_lote` linhas: CSV pelo `chunksize` do
+pandas e .xlsx pelo openpyxl em modo somente leitura (`iter_rows`), então a
+memória usada depende do tamanho do lote e não do tamanho do arquivo. O índice
+dos lotes continua a numeração do arquivo (0 é a primeira linha de dados), como
+acontecia com o DataFrame único. Arquivos .xls não têm leitura incremental e são
+lidos inteiros (o formato é limitado a 65.536 linhas).
+
+Sem `planilha`, as funções leem a primeira planilha da pasta de trabalho;
+`planilhas_com_dados` lista as que têm ao menos o cabeçalho preenchido.
+"""
+import csv
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+# Tamanho dos blocos lidos ao inspecionar um CSV que o módulo csv não lê.
+_BLOCO_CARACTERES = 1024 * 1024
+
+
+def extensao(caminho):
+    return caminho.rsplit('.', 1)[-1].lower()
+
+
+def _registros_csv(caminho, encoding):
+    """Registros não vazios do CSV lido com `encoding`, ou None se o módulo csv não conseguir lê-lo."""
+    with open(caminho, encoding=encoding, newline='') as arquivo:
+        try:
+            return sum(1 for registro in csv.reader(arquivo) if registro)
+        except csv.Error:
+            # Um campo acima de csv.field_size_limit(), por exemplo: o pandas lê, mas o total fica
+            # desconhecido. O resto do arquivo ainda é decodificado para validar a codificação.
+            while arquivo.read(_BLOCO_CARACTERES):
+                pass
+            return None
+
+
+def _inspecionar_csv(caminho):
+    """
+    Percorre o CSV contando as linhas de dados e verificando se ele é UTF-8
+    válido; se não for, a contagem é refeita em latin-1. A codificação precisa
+    ser decidida antes do primeiro lote: um erro de decodificação no meio do
+    arquivo chegaria depois de lotes já gravados.
+
+    As linhas são contadas pelo módulo csv, como o pandas as lê: um campo entre
+    aspas com quebras de linha é uma linha só e as linhas em branco não contam.
+    """
+    for encoding in ('utf-8', 'latin-1'):
+        try:
+            registros = _registros_csv(caminho, encoding)
+        except UnicodeDecodeError:
+            continue
+        # Desconta o cabeçalho.
+        return (max(registros - 1, 0) if registros is not None else None), encoding
+
+
+def _valor_da_celula(valor, como_texto):
+    # Mesma conversão do leitor openpyxl do pandas: vazio vira NaN e números inteiros viram int.
+    if valor is None or valor == '':
+        return np.nan
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    if como_texto and not isinstance(valor, str):
+        return str(valor)
+    return valor
+
+
+def _lotes_xlsx(caminho, linhas_por_lote, colunas_texto, planilha):
+    livro = load_workbook(caminho, read_only=True, data_only=True)
+    try:
+        folha = livro[planilha] if planilha is not None else livro.worksheets[0]
+        linhas = folha.iter_rows(values_only=True)
+        cabecalho = next(linhas, ())
+        while cabecalho and cabecalho[-1] is None:
+            cabecalho = cabecalho[:-1]
+        colunas = [str(nome) if nome is not None else f'Unnamed: {i}' for i, nome in enumerate(cabecalho)]
+        como_texto = [colunas_texto is None or nome in colunas_texto for nome in colunas]
+
+        vazia = [np.nan] * len(colunas)
+        inicio, lote, vazias_pendentes = 0, [], 0
+        for linha in linhas:
+            valores = [_valor_da_celula(valor, texto) for valor, texto in zip(linha, como_texto)]
+            if all(valor is np.nan for valor in valores):
+                # Como no read_excel, linhas vazias no meio dos dados são mantidas e as do final, descartadas.
+                vazias_pendentes += 1
+                continue
+            linhas_novas = [vazia] * vazias_pendentes + [valores + [np.nan] * (len(colunas) - len(valores))]
+            vazias_pendentes = 0
+            for registro in linhas_novas:
+                lote.append(registro)
+                if len(lote) == linhas_por_lote:
+                    yield pd.DataFrame(lote, columns=colunas, index=range(inicio, inicio + len(lote)), dtype=object)
+                    inicio, lote = inicio + len(lote), []
+        if lote or not inicio:
+            yield pd.DataFrame(lote, columns=colunas, index=range(inicio, inicio + len(lote)), dtype=object)
+    finally:
+        livro.close()
+
+
+def planilhas_com_dados(caminho):
+    """
+    Nomes das planilhas do arquivo com alguma célula preenchida na primeira
+    linha, na ordem da pasta de trabalho. Um CSV tem uma única planilha, [None].
+    """
+    if extensao(caminho) == 'csv':
+        return [None]
+    if extensao(caminho) == 'xlsx':
+        livro = load_workbook(caminho, read_only=True)
+        try:
+            return [folha.title for folha in livro.worksheets
+                    if any(valor not in (None, '') for linha in folha.iter_rows(max_row=1, values_only=True)
+                           for valor in linha)]
+        finally:
+            livro.close()
+    cabecalhos = pd.read_excel(caminho, sheet_name=None, header=None, nrows=1)
+    return [nome for nome, cabecalho in cabecalhos.items() if cabecalho.notna().any(axis=None)]
+
+
+def inspecionar(caminho, planilha=None):
+    """
+    Devolve (linhas de dados, codificação do CSV). As linhas são estimadas no
+    .xlsx e ficam None quando não dá para sabê-las sem ler o arquivo; a
+    codificação é None para planilhas Excel.
+    """
+    if extensao(caminho) == 'csv':
+        return _inspecionar_csv(caminho)
+    if extensao(caminho) == 'xlsx':
+        livro = load_workbook(caminho, read_only=True)
+        try:
+            # Vem da dimensão gravada no arquivo, que pode não existir ou estar errada.
+            maximo = (livro[planilha] if planilha is not None else livro.worksheets[0]).max_row
+        finally:
+            livro.close()
+        return (maximo - 1 if maximo and maximo > 1 else None), None
+    return None, None
+
+
+def ler_em_lotes(caminho, linhas_por_lote, colunas_texto=None, encoding_csv=None, planilha=None):
+    """
+    Gera DataFrames com até `linhas_por_lote` linhas do arquivo; há sempre ao
+    menos um (vazio, só com as colunas, se o arquivo não tiver dados).
+
+    `colunas_texto` são os nomes (do cabeçalho original) das colunas lidas como
+    texto; None lê todas como texto. Sem `encoding_csv` (o devolvido por
+    `inspecionar`), o CSV é inspecionado aqui.
+    """
+    if extensao(caminho) == 'csv':
+        encoding = encoding_csv or _inspecionar_csv(caminho)[1]
+        dtype = str if colunas_texto is None else {nome: str for nome in colunas_texto}
+        with pd.read_csv(caminho, dtype=dtype, encoding=encoding, chunksize=linhas_por_lote) as leitor:
+            vazio = True
+            for lote in leitor:
+                vazio = False
+                yield lote
+            if vazio:
+                yield pd.read_csv(caminho, dtype=dtype, encoding=encoding, nrows=0)
+    elif extensao(caminho) == 'xlsx':
+        yield from _lotes_xlsx(caminho, linhas_por_lote, colunas_texto, planilha)
+    else:
+        dtype = str if colunas_texto is None else {nome: str for nome in colunas_texto}
+        df = pd.read_excel(caminho, dtype=dtype, sheet_name=planilha if planilha is not None else 0)
+        for inicio in range(0, max(len(df), 1), linhas_por_lote):
+            yield df.iloc[inicio:inicio + linhas_por_lote]
@@ -0,0 +1,182 @@
+"""
+Réplica de leitura: as rotas somente leitura consultam o bind 'replica'.
+
+Com REPLICA_DATABASE_URL configurada, o Flask-SQLAlchemy cria o engine
+`db.engines['replica']` (SQLALCHEMY_BINDS). As rotas marcadas com
+`@leitura_na_replica` (painel, exportações e listagens) passam a ler dele pela
+`SessaoRoteada`; todo o resto, e qualquer flush ou INSERT/UPDATE/DELETE,
+continua no banco principal.
+
+A réplica só é usada enquanto estiver atualizada: o momento até o qual ela
+reflete o principal (`Replica.momento`) não pode estar mais de
+REPLICA_ATRASO_MAXIMO segundos atrás, nem antes da última gravação do próprio
+usuário, guardada na sessão do Flask ao fim de cada requisição POST. Assim o
+redirecionamento depois de salvar lê do principal até a réplica alcançá-lo.
+Réplica inacessível, nunca sincronizada ou atrasada: a leitura vai para o
+principal.
+
+Em SQLite (desenvolvimento e verificações) a réplica é uma cópia local do
+arquivo, atualizada pela API de backup online (`flask replica sincronizar`);
+o momento da cópia fica no PRAGMA user_version dela. Em PostgreSQL é um
+standby da replicação do próprio servidor e o atraso vem de
+pg_last_xact_replay_timestamp().
+"""
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from functools import wraps
+
+import click
+from flask import current_app, g, has_app_context, has_request_context, request, session
+from flask.cli import AppGroup
+from flask_sqlalchemy.session import Session
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.sql.dml import UpdateBase
+
+from .dialeto import aplicar_pragmas_sqlite
+
+BIND_REPLICA = 'replica'
+# Por quanto tempo (em segundos) o momento consultado na réplica é reaproveitado por este processo.
+INTERVALO_VERIFICACAO = 1.0
+
+_CHAVE_GRAVACAO = '_gravado_em'
+_METODOS_LEITURA = ('GET', 'HEAD', 'OPTIONS')
+
+# Standby em dia (tudo o que recebeu já foi aplicado) ou servidor que não é standby: reflete o presente.
+_MOMENTO_POSTGRESQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+        THEN extract(epoch FROM clock_timestamp())
+    ELSE extract(epoch FROM pg_last_xact_replay_timestamp())
+END
+"""
+
+
+class Replica:
+    """Decide, por requisição, se as leituras vão para a réplica ou para o principal."""
+
+    def __init__(self, atraso_maximo=30.0):
+        self.atraso_maximo = atraso_maximo
+        self._momentos = {}
+        self._trava = threading.Lock()
+
+    def init_app(self, app):
+        self.atraso_maximo = app.config.get('REPLICA_ATRASO_MAXIMO', self.atraso_maximo)
+        with app.app_context():
+            engine = app.extensions['sqlalchemy'].engines.get(BIND_REPLICA)
+        if engine is None:
+            return
+        # A cópia SQLite só é gravada pela sincronização, por outra conexão.
+        aplicar_pragmas_sqlite(engine, {'query_only': 'ON'})
+        app.after_request(_registrar_gravacao)
+
+    def momento(self, engine):
+        """
+        Instante (segundos desde a época) até o qual a réplica reflete o
+        principal, ou None se ela não responder. Consultado no máximo uma vez
+        por INTERVALO_VERIFICACAO: o valor guardado só pode estar atrasado, o
+        que manda mais leituras para o principal, nunca menos.
+        """
+        agora = time.monotonic()
+        with self._trava:
+            verificado_em, momento = self._momentos.get(engine, (None, None))
+        if verificado_em is not None and agora - verificado_em < INTERVALO_VERIFICACAO:
+            return momento
+        try:
+            with engine.connect() as conexao:
+                if conexao.dialect.name == 'sqlite':
+                    momento = conexao.exec_driver_sql('PRAGMA user_version').scalar() or None
+                else:
+                    momento = conexao.exec_driver_sql(_MOMENTO_POSTGRESQL).scalar()
+        except DBAPIError:
+            current_app.logger.warning('Réplica de leitura indisponível; lendo do banco principal.', exc_info=True)
+            momento = None
+        momento = float(momento) if momento is not None else None
+        with self._trava:
+            self._momentos[engine] = (agora, momento)
+        return momento
+
+    def engine_para_leitura(self, engines):
+        """O engine da réplica, se ela estiver em dia para o usuário da requisição; senão None (principal)."""
+        engine = engines.get(BIND_REPLICA)
+        if engine is None:
+            return None
+        momento = self.momento(engine)
+        if momento is None or time.time() - momento > self.atraso_maximo:
+            return None
+        if has_request_context() and session.get(_CHAVE_GRAVACAO, 0) > momento:
+            return None
+        return engine
+
+
+replica = Replica()
+
+
+def _registrar_gravacao(resposta):
+    # Requisições que podem ter gravado: as leituras seguintes do usuário vão ao principal até a réplica chegar aqui.
+    if request.method not in _METODOS_LEITURA:
+        session[_CHAVE_GRAVACAO] = time.time()
+    return resposta
+
+
+def leitura_na_replica(f):
+    """Marca a rota como somente leitura: as consultas dela podem ir para a réplica."""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.leitura_na_replica = True
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+class SessaoRoteada(Session):
+    """
+    Sessão do `db` que manda as leituras das rotas `@leitura_na_replica` para a
+    réplica. A escolha é feita na primeira consulta da requisição e vale até o
+    fim dela, para que todas as consultas vejam o mesmo estado dos dados.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and not isinstance(clause, UpdateBase)
+                and has_app_context() and g.get('leitura_na_replica')):
+            if 'engine_leitura' not in g:
+                g.engine_leitura = replica.engine_para_leitura(self._db.engines)
+            if g.engine_leitura is not None:
+                return g.engine_leitura
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def sincronizar_copia_sqlite(origem, destino):
+    """
+    Copia o banco SQLite `origem` para `destino` pela API de backup online (um
+    retrato consistente, sem parar quem grava na origem) e registra no
+    user_version da cópia o instante em que ela começou. Devolve esse instante.
+    """
+    inicio = time.time()
+    with closing(sqlite3.connect(origem)) as fonte, closing(sqlite3.connect(destino)) as copia:
+        fonte.backup(copia)
+        copia.execute(f'PRAGMA user_version = {int(inicio)}')
+    return inicio
+
+
+replica_cli = AppGroup('replica', help='Réplica de leitura (bind "replica").')
+
+
+@replica_cli.command('sincronizar')
+@click.option('--intervalo', type=float, default=0.0,
+              help='Segundos entre uma cópia e a seguinte; 0 faz uma cópia e termina.')
+def sincronizar_command(intervalo):
+    """Atualiza a cópia SQLite da réplica a partir do banco principal."""
+    engines = current_app.extensions['sqlalchemy'].engines
+    if BIND_REPLICA not in engines:
+        raise click.UsageError('Configure REPLICA_DATABASE_URL para usar a réplica.')
+    principal, copia = engines[None], engines[BIND_REPLICA]
+    if principal.dialect.name != 'sqlite' or copia.dialect.name != 'sqlite':
+        raise click.UsageError('A sincronização por backup vale só para SQLite; '
+                               'no PostgreSQL a réplica é mantida pela replicação do servidor.')
+    while True:
+        inicio = sincronizar_copia_sqlite(principal.url.database, copia.url.database)
+        click.echo(f'Réplica sincronizada em {time.time() - inicio:.2f}s.')
+        if not intervalo:
+            return
+        time.sleep(intervalo)
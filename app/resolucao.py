@@ -0,0 +1,205 @@
+"""
+Resolução dos donos citados nas planilhas de validade.
+
+As planilhas de documentos identificam o dono pelo nome (razão social da
+empresa, nome do motorista, placa do veículo), não pela chave. Em vez de uma consulta por linha, o resolvedor lê os
+nomes uma única vez por importação, monta índices em memória e responde cada
+linha com uma busca em dicionário ou uma busca binária; só os nomes que não
+casam assim passam pela comparação de trigramas.
+"""
+import bisect
+import re
+from collections import namedtuple
+
+import numpy as np
+from sqlalchemy import select
+
+from . import db
+from .models import Empresa, Motorista, Veiculo, chave_placa
+from .vencimentos import normalizar_busca
+
+# Sufixos societários ignorados no fim da razão social, já normalizados ('S/A' vira 'S A').
+_SUFIXOS_SOCIETARIOS = ('LTDA', 'LIMITADA', 'S A', 'SA', 'ME', 'EPP', 'EIRELI', 'MEI')
+# Semelhança mínima (trigramas em comum / trigramas no total) para aceitar um nome aproximado.
+LIMIAR_SEMELHANCA = 0.5
+# Candidatas cuja semelhança fica a menos disto da melhor tornam o nome ambíguo.
+MARGEM_AMBIGUIDADE = 0.05
+# Quantas candidatas são listadas quando o nome é ambíguo.
+_CANDIDATAS_EXIBIDAS = 5
+
+# `situacao`: 'exato', 'prefixo', 'contido', 'semelhante', 'ambiguo', 'nao_encontrado' ou 'invalido'.
+# `candidatas` são as razões sociais consideradas nos casos 'ambiguo' e 'semelhante'.
+Resolucao = namedtuple('Resolucao', 'id situacao candidatas')
+
+
+def chave_nome_empresa(nome):
+    """Razão social normalizada para comparação: 'Transportes Alfa Ltda. - ME' vira 'TRANSPORTES ALFA'."""
+    chave = normalizar_busca(str(nome))
+    removeu = True
+    while removeu:
+        removeu = False
+        for sufixo in _SUFIXOS_SOCIETARIOS:
+            if chave.endswith(' ' + sufixo):
+                chave = chave[:-len(sufixo) - 1]
+                removeu = True
+    return chave
+
+
+def _trigramas(chave):
+    # Como no pg_trgm: cada palavra com dois espaços antes e um depois.
+    trigramas = set()
+    for palavra in chave.split():
+        palavra = f'  {palavra} '
+        trigramas.update(palavra[i:i + 3] for i in range(len(palavra) - 2))
+    return trigramas
+
+
+class ResolvedorEmpresas:
+    """
+    Índice das razões sociais das empresas, montado uma vez por importação.
+
+    Um nome é procurado, nesta ordem: igual à razão social normalizada
+    (dicionário), como início dela ou como início de uma das palavras dela
+    (busca binária em listas ordenadas; o segundo caso cobre o antigo
+    ILIKE '%nome%') e, por fim, por semelhança de trigramas, contados para todas
+    as empresas de uma vez sobre um índice invertido. Em cada etapa, mais
+    de uma empresa encontrada torna o nome ambíguo e nenhuma é escolhida. O
+    resultado de cada nome é guardado, então nomes repetidos no arquivo custam
+    uma consulta ao dicionário.
+    """
+
+    def __init__(self, empresas=None):
+        if empresas is None:
+            empresas = db.session.execute(select(Empresa.id, Empresa.razao_social)).all()
+        self._razoes = {}
+        self._exatas = {}
+        inicios, palavras = [], []
+        # Índice invertido trigrama -> posições em `self._ids`, para contar os trigramas em comum com numpy.
+        self._ids, tamanhos, por_trigrama = [], [], {}
+        for id_, razao_social in empresas:
+            chave = chave_nome_empresa(razao_social)
+            if not chave:
+                continue
+            self._razoes[id_] = razao_social
+            self._exatas.setdefault(chave, []).append(id_)
+            inicios.append((chave, id_))
+            tokens = chave.split()
+            # Sufixos da razão a partir da segunda palavra: 'ALFA LOG' acha 'TRANSPORTES ALFA LOGISTICA'.
+            palavras.extend((' '.join(tokens[i:]), id_) for i in range(1, len(tokens)))
+            trigramas = _trigramas(chave)
+            for trigrama in trigramas:
+                por_trigrama.setdefault(trigrama, []).append(len(self._ids))
+            self._ids.append(id_)
+            tamanhos.append(len(trigramas))
+        self._tamanhos = np.array(tamanhos, dtype=np.int32)
+        self._por_trigrama = {trigrama: np.array(posicoes, dtype=np.int32) for trigrama, posicoes in por_trigrama.items()}
+        inicios.sort()
+        palavras.sort()
+        self._inicios = inicios
+        self._palavras = palavras
+        self._resultados = {}
+
+    def resolver(self, nome):
+        chave = chave_nome_empresa(nome)
+        if chave not in self._resultados:
+            self._resultados[chave] = self._resolver(chave)
+        return self._resultados[chave]
+
+    def _resultado(self, ids, situacao):
+        if len(ids) == 1:
+            return Resolucao(ids[0], situacao, ())
+        candidatas = tuple(sorted(self._razoes[id_] for id_ in ids[:_CANDIDATAS_EXIBIDAS]))
+        return Resolucao(None, 'ambiguo', candidatas)
+
+    def _resolver(self, chave):
+        if not chave:
+            return Resolucao(None, 'nao_encontrado', ())
+        if chave in self._exatas:
+            return self._resultado(self._exatas[chave], 'exato')
+        for lista, situacao in ((self._inicios, 'prefixo'), (self._palavras, 'contido')):
+            ids = self._com_prefixo(lista, chave)
+            if ids:
+                return self._resultado(ids, situacao)
+        return self._semelhante(chave)
+
+    @staticmethod
+    def _com_prefixo(lista, chave):
+        """Empresas (sem repetição, no máximo uma além das exibidas) com alguma entrada começando por `chave`."""
+        ids = []
+        for entrada, id_ in lista[bisect.bisect_left(lista, (chave,)):]:
+            if not entrada.startswith(chave):
+                break
+            if id_ not in ids:
+                ids.append(id_)
+                if len(ids) > _CANDIDATAS_EXIBIDAS:
+                    break
+        return ids
+
+    def _semelhante(self, chave):
+        trigramas = _trigramas(chave)
+        postagens = [self._por_trigrama[trigrama] for trigrama in trigramas if trigrama in self._por_trigrama]
+        if not postagens:
+            return Resolucao(None, 'nao_encontrado', ())
+        comuns = np.bincount(np.concatenate(postagens), minlength=len(self._ids))
+        notas = comuns / (len(trigramas) + self._tamanhos - comuns)
+        melhor = notas.max()
+        if melhor < LIMIAR_SEMELHANCA:
+            return Resolucao(None, 'nao_encontrado', ())
+        posicoes = np.flatnonzero(notas >= max(melhor - MARGEM_AMBIGUIDADE, LIMIAR_SEMELHANCA))
+        ids = [self._ids[posicao] for posicao in posicoes[np.argsort(-notas[posicoes], kind='stable')]]
+        if len(ids) > 1:
+            return self._resultado(ids, 'ambiguo')
+        return Resolucao(ids[0], 'semelhante', (self._razoes[ids[0]],))
+
+
+class ResolvedorMotoristas:
+    """
+    Motoristas por nome normalizado (sem acentos, maiúsculo, pontuação como
+    espaço) e pela chave do CPF, lidos em uma única consulta por importação. Nomes
+    compartilhados por mais de um motorista são ambíguos e só podem ser
+    resolvidos pelo CPF.
+    """
+
+    def __init__(self, motoristas=None):
+        if motoristas is None:
+            motoristas = db.session.execute(select(Motorista.id, Motorista.nome, Motorista.cpf_chave)).all()
+        self._por_nome = {}
+        self._por_cpf = {}
+        for id_, nome, cpf_chave in motoristas:
+            self._por_nome.setdefault(normalizar_busca(nome or ''), []).append(id_)
+            self._por_cpf[cpf_chave] = id_
+
+    def por_nome(self, nome):
+        """Resolução pelo nome: 'exato', 'ambiguo' ou 'nao_encontrado'."""
+        ids = self._por_nome.get(normalizar_busca(str(nome)), ())
+        if len(ids) == 1:
+            return Resolucao(ids[0], 'exato', ())
+        return Resolucao(None, 'ambiguo' if ids else 'nao_encontrado', ())
+
+    def por_cpf(self, cpf):
+        """Resolução pelo CPF (com ou sem máscara): 'exato', 'nao_encontrado' ou 'invalido'."""
+        digitos = re.sub(r'\D', '', str(cpf))
+        # CPFs gravados como número na planilha perdem os zeros à esquerda.
+        if 9 <= len(digitos) < 11:
+            digitos = digitos.zfill(11)
+        if len(digitos) != 11:
+            return Resolucao(None, 'invalido', ())
+        id_ = self._por_cpf.get(int(digitos))
+        return Resolucao(id_, 'exato' if id_ else 'nao_encontrado', ())
+
+
+class ResolvedorVeiculos:
+    """
+    Veículos pela chave da placa (maiúsculas, sem pontuação, no padrão
+    Mercosul; veja chave_placa), lidos em uma única consulta.
+    """
+
+    def __init__(self, veiculos=None):
+        if veiculos is None:
+            veiculos = db.session.execute(select(Veiculo.id, Veiculo.placa_chave)).all()
+        self._por_placa = {placa_chave: id_ for id_, placa_chave in veiculos}
+
+    def por_placa(self, placa):
+        """Resolução pela placa, em qualquer formato: 'exato' ou 'nao_encontrado'."""
+        id_ = self._por_placa.get(chave_placa(placa))
+        return Resolucao(id_, 'exato' if id_ else 'nao_encontrado', ())
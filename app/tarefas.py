@@ -0,0 +1,251 @@
+"""
+Fila local das importações de planilhas em segundo plano.
+
+A rota de upload só salva o arquivo em disco, cria a TarefaImportacao e a
+enfileira; um pool de threads do próprio processo roda `executar_importacao` e
+grava na tarefa o estado, o progresso, os contadores e as mensagens, que a
+página de upload consulta pela rota de status.
+
+Envios com mais de uma planilha (vários arquivos ou uma pasta de trabalho com
+várias planilhas) são lidos e validados em um pool de processos, também da
+fila; a gravação continua na thread da tarefa (veja `importar_partes`).
+
+A fila vive só na memória do processo. Tarefas que ficaram para trás quando o
+processo terminou (um reinício do servidor, por exemplo) são recuperadas no
+primeiro envio para a fila e quando a página de upload consulta o estado delas:
+as pendentes cujo arquivo ainda existe voltam para a fila; as que estão em
+processamento sem gravar progresso há IMPORTACAO_TEMPO_SEM_PROGRESSO segundos, e
+as pendentes sem arquivo, terminam em erro e têm o arquivo apagado.
+"""
+import datetime
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from flask import current_app
+from sqlalchemy import update
+from werkzeug.utils import secure_filename
+
+from . import db
+from .importacao import ArquivoInvalido, executar_importacao
+from .models import TarefaImportacao
+
+# Intervalo mínimo (em segundos) entre duas gravações do progresso de uma tarefa.
+INTERVALO_PROGRESSO = 1.0
+
+MENSAGEM_INTERROMPIDA = ('A importação foi interrompida antes de terminar (o servidor pode ter sido reiniciado). '
+                         'Envie o arquivo novamente.')
+MENSAGEM_SEM_ARQUIVO = 'O arquivo enviado não está mais disponível para a importação. Envie-o novamente.'
+
+
+def _extensao(nome):
+    return nome.rsplit('.', 1)[-1].lower() if '.' in nome else 'xlsx'
+
+
+def salvar_envio(arquivos, base):
+    """
+    Grava os arquivos enviados no diretório `base`, com os nomes originais
+    (sanitizados), que nomeiam as planilhas nas mensagens e na prévia, e devolve
+    o caminho que `executar_importacao` recebe.
+    """
+    os.makedirs(base)
+    for numero, arquivo in enumerate(arquivos, start=1):
+        nome = secure_filename(arquivo.filename) or f'arquivo.{_extensao(arquivo.filename)}'
+        if os.path.exists(os.path.join(base, nome)):
+            nome = f'{numero}_{nome}'
+        arquivo.save(os.path.join(base, nome))
+    return base
+
+
+def remover_envio(caminho):
+    if os.path.isdir(caminho):
+        shutil.rmtree(caminho, ignore_errors=True)
+    else:
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+
+
+class FilaImportacao:
+    """Pool de threads que executa as tarefas de importação deste processo."""
+
+    def __init__(self, workers=2, processos=None, tempo_sem_progresso=600):
+        self.workers = workers
+        self.processos = processos if processos is not None else (os.cpu_count() or 1)
+        self.tempo_sem_progresso = tempo_sem_progresso
+        self._executor = None
+        self._executor_processos = None
+        # Tarefas enviadas ao pool deste processo que ainda não terminaram.
+        self._enfileiradas = set()
+        self._trava = threading.Lock()
+
+    def init_app(self, app):
+        self.workers = app.config.get('IMPORTACAO_WORKERS', self.workers)
+        self.processos = app.config.get('IMPORTACAO_PROCESSOS', self.processos)
+        self.tempo_sem_progresso = app.config.get('IMPORTACAO_TEMPO_SEM_PROGRESSO', self.tempo_sem_progresso)
+
+    def _obter_executor(self):
+        """O pool de threads e se ele acabou de ser criado."""
+        # Criado no primeiro uso, para que comandos da CLI e processos que nunca
+        # recebem upload não abram threads.
+        with self._trava:
+            if self._executor is not None:
+                return self._executor, False
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='importacao')
+            return self._executor, True
+
+    def obter_processos(self):
+        """
+        Pool de processos que prepara as planilhas dos envios com várias delas, ou
+        None com IMPORTACAO_PROCESSOS = 0. Os processos são iniciados com 'spawn':
+        um fork de um servidor com threads poderia herdar travas ocupadas.
+        """
+        if not self.processos:
+            return None
+        with self._trava:
+            if self._executor_processos is None:
+                self._executor_processos = ProcessPoolExecutor(
+                    max_workers=self.processos, mp_context=multiprocessing.get_context('spawn'))
+            return self._executor_processos
+
+    def salvar_arquivos(self, tipo, arquivos, usuario_id):
+        """Grava os arquivos enviados no diretório de importações e cria a tarefa pendente (sem enfileirar)."""
+        diretorio = current_app.config['IMPORTACAO_DIRETORIO']
+        os.makedirs(diretorio, exist_ok=True)
+        caminho = salvar_envio(arquivos, os.path.join(diretorio, uuid.uuid4().hex))
+
+        nome_arquivo = ', '.join(arquivo.filename for arquivo in arquivos)
+        tarefa = TarefaImportacao(tipo=tipo, nome_arquivo=nome_arquivo[:255], caminho_arquivo=caminho,
+                                  usuario_id=usuario_id)
+        db.session.add(tarefa)
+        db.session.commit()
+        return tarefa
+
+    def enfileirar(self, tarefa_id):
+        executor, novo = self._obter_executor()
+        if novo:
+            # Primeiro uso da fila neste processo: retoma o que um processo anterior deixou.
+            self.recuperar_tarefas()
+        return self._submeter(executor, tarefa_id)
+
+    def _submeter(self, executor, tarefa_id):
+        with self._trava:
+            self._enfileiradas.add(tarefa_id)
+        return executor.submit(self._executar, current_app._get_current_object(), tarefa_id)
+
+    def recuperar_tarefas(self):
+        """Recupera (veja `recuperar`) todas as tarefas ainda não finalizadas."""
+        tarefas = TarefaImportacao.query.filter(TarefaImportacao.estado.in_(('pendente', 'processando'))).all()
+        for tarefa in tarefas:
+            self.recuperar(tarefa)
+
+    def recuperar(self, tarefa):
+        """
+        Devolve à fila a tarefa pendente que o pool deste processo não recebeu,
+        se o arquivo dela ainda existir; sem o arquivo, ou em processamento sem
+        progresso há `tempo_sem_progresso` segundos, a tarefa termina em erro.
+        """
+        with self._trava:
+            nesta_fila = tarefa.id in self._enfileiradas
+        if tarefa.finalizada or nesta_fila:
+            return
+        if tarefa.estado == 'pendente':
+            if os.path.exists(tarefa.caminho_arquivo):
+                self._submeter(self._obter_executor()[0], tarefa.id)
+            else:
+                self._encerrar_abandonada(tarefa, MENSAGEM_SEM_ARQUIVO)
+            return
+        atividade = tarefa.atualizada_em or tarefa.iniciada_em or tarefa.criada_em
+        if datetime.datetime.utcnow() - atividade > datetime.timedelta(seconds=self.tempo_sem_progresso):
+            self._encerrar_abandonada(tarefa, MENSAGEM_INTERROMPIDA)
+
+    def _encerrar_abandonada(self, tarefa, mensagem):
+        # Só se ninguém mexeu na tarefa desde a leitura: outro processo pode tê-la iniciado ou concluído.
+        caminho = tarefa.caminho_arquivo
+        encerrada = db.session.execute(
+            update(TarefaImportacao)
+            .where(TarefaImportacao.id == tarefa.id, TarefaImportacao.estado == tarefa.estado,
+                   TarefaImportacao.atualizada_em == tarefa.atualizada_em)
+            .values(estado='erro', mensagens=[['danger', mensagem]], contadores={},
+                    concluida_em=datetime.datetime.utcnow())
+        ).rowcount
+        db.session.commit()
+        if encerrada:
+            current_app.logger.warning('Importação %s abandonada: %s', tarefa.id, mensagem)
+            remover_envio(caminho)
+
+    def _executar(self, app, tarefa_id):
+        try:
+            with app.app_context():
+                self._processar(tarefa_id)
+        finally:
+            with self._trava:
+                self._enfileiradas.discard(tarefa_id)
+
+    def _processar(self, tarefa_id):
+        # A tarefa pode ter sido enfileirada por mais de um processo: só o primeiro a marcá-la a executa.
+        agora = datetime.datetime.utcnow()
+        iniciada = db.session.execute(
+            update(TarefaImportacao)
+            .where(TarefaImportacao.id == tarefa_id, TarefaImportacao.estado == 'pendente')
+            .values(estado='processando', iniciada_em=agora, atualizada_em=agora)
+        ).rowcount
+        db.session.commit()
+        if not iniciada:
+            return
+        tarefa = db.session.get(TarefaImportacao, tarefa_id)
+        tipo, caminho = tarefa.tipo, tarefa.caminho_arquivo
+        # As gravações abaixo só valem enquanto a tarefa está em processamento:
+        # se outro processo a deu por abandonada (veja `_encerrar_abandonada`),
+        # o erro que ele gravou não é sobrescrito.
+        em_processamento = (TarefaImportacao.id == tarefa_id, TarefaImportacao.estado == 'processando')
+        ultima_gravacao = [0.0]
+
+        def progresso(processadas, total):
+            # Chamado só quando a importação não tem gravações pendentes na
+            # sessão, então o commit aqui grava apenas a própria tarefa.
+            # Sem total (None), mantém o último informado.
+            agora = time.monotonic()
+            final = total is not None and processadas >= total
+            if not final and agora - ultima_gravacao[0] < INTERVALO_PROGRESSO:
+                return
+            ultima_gravacao[0] = agora
+            valores = {'linhas_processadas': processadas, 'atualizada_em': datetime.datetime.utcnow()}
+            if total is not None:
+                valores['linhas_total'] = total
+            db.session.execute(update(TarefaImportacao).where(*em_processamento).values(**valores))
+            db.session.commit()
+
+        try:
+            mensagens, contadores = executar_importacao(tipo, caminho, progresso, self.obter_processos())
+            estado = 'concluida'
+        except ArquivoInvalido as e:
+            db.session.rollback()
+            mensagens, contadores = [('danger', str(e))], {}
+            estado = 'erro'
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.exception('Falha na importação %s', tarefa_id)
+            mensagens, contadores = [('danger', f'Ocorreu um erro inesperado ao processar o arquivo: {e}')], {}
+            estado = 'erro'
+        finally:
+            remover_envio(caminho)
+
+        encerrada = db.session.execute(
+            update(TarefaImportacao)
+            .where(*em_processamento)
+            .values(estado=estado, mensagens=[list(mensagem) for mensagem in mensagens], contadores=contadores,
+                    concluida_em=datetime.datetime.utcnow())
+        ).rowcount
+        db.session.commit()
+        if not encerrada:
+            current_app.logger.warning('Importação %s já tinha sido encerrada por outro processo; resultado descartado.',
+                                       tarefa_id)
+
+
+fila_importacao = FilaImportacao()
@@ -0,0 +1,373 @@
+"""
+Manutenção do índice unificado de vencimentos (tabela `vencimentos`).
+
+Cada documento de motorista, veículo ou empresa tem uma linha em Vencimento
+com o nome do dono, a empresa, o tipo canônico e o prazo efetivo. O evento de
+flush da sessão mantém o índice em dia a cada gravação feita pelo ORM; rotinas
+que escrevem direto no banco devem chamar `sincronizar_documentos`. O comando
+`flask vencimentos reconstruir` refaz o índice inteiro.
+
+O módulo também é o único ponto de consulta do índice: o painel e os relatórios
+percorrem `iterar_vencimentos`, cujas instruções são montadas com `lambda_stmt`
+e parâmetros vinculados, para que o SQLAlchemy reaproveite a instrução montada
+e compilada entre requisições (veja `metricas_compilacao` em app/instrumentacao.py).
+"""
+import re
+import unicodedata
+from collections import defaultdict, namedtuple
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import (DDL, Date, and_, bindparam, case, column, delete, event, false, func, insert, inspect,
+                        lambda_stmt, select, table, tuple_, update)
+from sqlalchemy.orm import Session
+
+from . import db
+from .cache import invalidar_cache
+from .classificador import obter_classificador
+from .dialeto import dias_entre
+from .models import (ConfiguracaoAlerta, DocumentoFiscal, DocumentoMotorista, DocumentoVeiculo, Empresa,
+                     Motorista, Veiculo, Vencimento)
+
+ROTULOS_ENTIDADE = {'motorista': 'Motorista', 'veiculo': 'Veículo', 'empresa': 'Empresa'}
+
+_ENTIDADE_DOCUMENTO = {DocumentoMotorista: 'motorista', DocumentoVeiculo: 'veiculo', DocumentoFiscal: 'empresa'}
+# Atributos do dono que são copiados para o índice.
+_ENTIDADE_DONO = {Motorista: ('motorista', ('nome', 'empresa_id')), Veiculo: ('veiculo', ('placa', 'empresa_id'))}
+
+_TAMANHO_LOTE = 500
+_tabela = Vencimento.__table__
+
+_RE_NAO_ALFANUMERICO = re.compile(r'[^A-Z0-9]+')
+
+# Busca textual do painel: no SQLite, uma tabela FTS5 sobre `termos_busca` mantida
+# por gatilhos (vale para qualquer escrita na tabela de vencimentos); no
+# PostgreSQL, um índice GIN de trigramas, que atende ao LIKE '%termo%'.
+# As migrações criam os mesmos objetos; aqui eles acompanham o db.create_all().
+_busca = table('vencimentos_busca', column('rowid'), column('termos_busca'))
+_DDL_BUSCA = {
+    'sqlite': (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS vencimentos_busca USING fts5("
+        "termos_busca, content='vencimentos', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        "CREATE TRIGGER IF NOT EXISTS vencimentos_busca_ai AFTER INSERT ON vencimentos BEGIN "
+        "INSERT INTO vencimentos_busca(rowid, termos_busca) VALUES (new.id, new.termos_busca); END",
+        "CREATE TRIGGER IF NOT EXISTS vencimentos_busca_ad AFTER DELETE ON vencimentos BEGIN "
+        "INSERT INTO vencimentos_busca(vencimentos_busca, rowid, termos_busca) "
+        "VALUES ('delete', old.id, old.termos_busca); END",
+        "CREATE TRIGGER IF NOT EXISTS vencimentos_busca_au AFTER UPDATE OF termos_busca ON vencimentos BEGIN "
+        "INSERT INTO vencimentos_busca(vencimentos_busca, rowid, termos_busca) "
+        "VALUES ('delete', old.id, old.termos_busca); "
+        "INSERT INTO vencimentos_busca(rowid, termos_busca) VALUES (new.id, new.termos_busca); END",
+    ),
+    'postgresql': (
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS ix_vencimentos_termos_busca_trgm ON vencimentos "
+        "USING gin (termos_busca gin_trgm_ops)",
+    ),
+}
+for _dialeto, _comandos in _DDL_BUSCA.items():
+    for _comando in _comandos:
+        event.listen(_tabela, 'after_create', DDL(_comando).execute_if(dialect=_dialeto))
+event.listen(_tabela, 'before_drop', DDL("DROP TABLE IF EXISTS vencimentos_busca").execute_if(dialect='sqlite'))
+
+
+def normalizar_busca(texto):
+    """Maiúsculas, sem acentos e com a pontuação trocada por espaços: 'João S/A' vira 'JOAO S A'."""
+    sem_acentos = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(_RE_NAO_ALFANUMERICO.sub(' ', sem_acentos.upper()).split())
+
+
+def _lotes(ids):
+    ids = sorted(ids)
+    for inicio in range(0, len(ids), _TAMANHO_LOTE):
+        yield ids[inicio:inicio + _TAMANHO_LOTE]
+
+
+def _consulta_origem(entidade):
+    """Consulta que produz as linhas do índice de uma entidade, com as colunas do dono e da empresa."""
+    if entidade == 'motorista':
+        doc, dono, nome = DocumentoMotorista, Motorista, Motorista.nome
+        consulta = select(doc.id.label('documento_id'), dono.id.label('owner_id'), nome.label('nome'),
+                          Empresa.id.label('empresa_id'), Empresa.razao_social.label('empresa_nome'),
+                          doc.nome_documento, doc.data_vencimento) \
+            .join(dono, doc.motorista_id == dono.id).join(Empresa, dono.empresa_id == Empresa.id)
+    elif entidade == 'veiculo':
+        doc, dono, nome = DocumentoVeiculo, Veiculo, Veiculo.placa
+        consulta = select(doc.id.label('documento_id'), dono.id.label('owner_id'), nome.label('nome'),
+                          Empresa.id.label('empresa_id'), Empresa.razao_social.label('empresa_nome'),
+                          doc.nome_documento, doc.data_vencimento) \
+            .join(dono, doc.veiculo_id == dono.id).join(Empresa, dono.empresa_id == Empresa.id)
+    else:
+        doc, dono = DocumentoFiscal, Empresa
+        consulta = select(doc.id.label('documento_id'), Empresa.id.label('owner_id'), Empresa.razao_social.label('nome'),
+                          Empresa.id.label('empresa_id'), Empresa.razao_social.label('empresa_nome'),
+                          doc.nome_documento, doc.data_vencimento) \
+            .join(Empresa, doc.empresa_id == Empresa.id)
+    return consulta, doc.id, dono.id
+
+
+def _gravar(conexao, entidade, linhas, classificador):
+    registros = []
+    for linha in linhas:
+        classificacao = classificador.classificar(linha.nome_documento)
+        registros.append({
+            'entidade': entidade,
+            'documento_id': linha.documento_id,
+            'owner_id': linha.owner_id,
+            'nome': linha.nome,
+            'empresa_id': linha.empresa_id,
+            'empresa_nome': linha.empresa_nome,
+            'nome_documento': linha.nome_documento,
+            'tipo_documento': classificacao.tipo,
+            'nome_exibicao': classificacao.nome_exibicao,
+            'data_vencimento': linha.data_vencimento,
+            'prazo_alerta_dias': classificacao.prazo,
+            'termos_busca': normalizar_busca(f"{linha.nome} {linha.nome_documento}"),
+        })
+    if registros:
+        conexao.execute(insert(_tabela), registros)
+    return len(registros)
+
+
+def sincronizar_documentos(conexao, entidade, documento_ids):
+    """Recria as linhas do índice dos documentos informados (ausentes no banco são removidos)."""
+    classificador = obter_classificador(conexao)
+    consulta, coluna_documento, _ = _consulta_origem(entidade)
+    for lote in _lotes(documento_ids):
+        conexao.execute(delete(_tabela).where(_tabela.c.entidade == entidade, _tabela.c.documento_id.in_(lote)))
+        _gravar(conexao, entidade, conexao.execute(consulta.where(coluna_documento.in_(lote))).all(), classificador)
+
+
+def sincronizar_donos(conexao, entidade, owner_ids):
+    """Recria as linhas do índice de todos os documentos dos donos informados."""
+    classificador = obter_classificador(conexao)
+    consulta, _, coluna_dono = _consulta_origem(entidade)
+    for lote in _lotes(owner_ids):
+        conexao.execute(delete(_tabela).where(_tabela.c.entidade == entidade, _tabela.c.owner_id.in_(lote)))
+        _gravar(conexao, entidade, conexao.execute(consulta.where(coluna_dono.in_(lote))).all(), classificador)
+
+
+def atualizar_prazos(conexao, tipos_documento):
+    """Reaplica o prazo configurado às linhas dos tipos de documento informados."""
+    classificador = obter_classificador(conexao)
+    for tipo in tipos_documento:
+        prazo = classificador.prazos.get(tipo, classificador.prazo_padrao)
+        conexao.execute(update(_tabela).where(_tabela.c.tipo_documento == tipo).values(prazo_alerta_dias=prazo))
+
+
+def reconstruir_indice(conexao):
+    """Apaga e recria o índice inteiro a partir das tabelas de documentos."""
+    classificador = obter_classificador(conexao)
+    conexao.execute(delete(_tabela))
+    total = 0
+    for entidade in ROTULOS_ENTIDADE:
+        consulta, coluna_documento, _ = _consulta_origem(entidade)
+        ultimo_id = 0
+        # Percorre em lotes pela chave primária para não carregar a tabela toda.
+        while True:
+            linhas = conexao.execute(
+                consulta.where(coluna_documento > ultimo_id).order_by(coluna_documento).limit(_TAMANHO_LOTE * 4)
+            ).all()
+            if not linhas:
+                break
+            total += _gravar(conexao, entidade, linhas, classificador)
+            ultimo_id = linhas[-1].documento_id
+    return total
+
+
+def _alterou(objeto, atributos):
+    estado = inspect(objeto)
+    return any(estado.attrs[atributo].history.has_changes() for atributo in atributos)
+
+
+@event.listens_for(Session, 'after_flush')
+def _sincronizar_apos_flush(session, flush_context):
+    """Propaga para o índice as alterações de documentos, donos, empresas e prazos feitas neste flush."""
+    documentos, removidos, donos, donos_removidos = (defaultdict(set) for _ in range(4))
+    empresas_renomeadas, empresas_removidas, tipos_alterados = {}, set(), set()
+
+    for objeto in session.new:
+        entidade = _ENTIDADE_DOCUMENTO.get(type(objeto))
+        if entidade:
+            documentos[entidade].add(objeto.id)
+        elif isinstance(objeto, ConfiguracaoAlerta):
+            tipos_alterados.add(objeto.nome_documento)
+
+    for objeto in session.dirty:
+        classe = type(objeto)
+        if classe in _ENTIDADE_DOCUMENTO:
+            if session.is_modified(objeto, include_collections=False):
+                documentos[_ENTIDADE_DOCUMENTO[classe]].add(objeto.id)
+        elif classe in _ENTIDADE_DONO:
+            entidade, atributos = _ENTIDADE_DONO[classe]
+            if _alterou(objeto, atributos):
+                donos[entidade].add(objeto.id)
+        elif classe is Empresa:
+            if _alterou(objeto, ('razao_social',)):
+                empresas_renomeadas[objeto.id] = objeto.razao_social
+                # Os documentos da própria empresa levam a razão social no nome e nos termos de busca.
+                donos['empresa'].add(objeto.id)
+        elif classe is ConfiguracaoAlerta:
+            historico = inspect(objeto).attrs.nome_documento.history
+            tipos_alterados.update(historico.deleted or ())
+            tipos_alterados.add(objeto.nome_documento)
+
+    for objeto in session.deleted:
+        classe = type(objeto)
+        if classe in _ENTIDADE_DOCUMENTO:
+            removidos[_ENTIDADE_DOCUMENTO[classe]].add(objeto.id)
+        elif classe in _ENTIDADE_DONO:
+            donos_removidos[_ENTIDADE_DONO[classe][0]].add(objeto.id)
+        elif classe is Empresa:
+            empresas_removidas.add(objeto.id)
+        elif classe is ConfiguracaoAlerta:
+            tipos_alterados.add(objeto.nome_documento)
+
+    if not any((documentos, removidos, donos, donos_removidos, empresas_renomeadas, empresas_removidas, tipos_alterados)):
+        return
+
+    conexao = session.connection()
+    for entidade, ids in removidos.items():
+        for lote in _lotes(ids):
+            conexao.execute(delete(_tabela).where(_tabela.c.entidade == entidade, _tabela.c.documento_id.in_(lote)))
+    for entidade, ids in donos_removidos.items():
+        for lote in _lotes(ids):
+            conexao.execute(delete(_tabela).where(_tabela.c.entidade == entidade, _tabela.c.owner_id.in_(lote)))
+    for lote in _lotes(empresas_removidas):
+        conexao.execute(delete(_tabela).where(_tabela.c.empresa_id.in_(lote)))
+
+    for empresa_id, razao_social in empresas_renomeadas.items():
+        conexao.execute(update(_tabela).where(_tabela.c.empresa_id == empresa_id).values(empresa_nome=razao_social))
+
+    for entidade, ids in donos.items():
+        sincronizar_donos(conexao, entidade, ids)
+    for entidade, ids in documentos.items():
+        sincronizar_documentos(conexao, entidade, ids)
+    if tipos_alterados:
+        atualizar_prazos(conexao, tipos_alterados)
+
+
+# --- Consulta do painel e dos relatórios ---
+
+# Filtros do painel. `empresa_id` já vem resolvido pelo perfil do usuário (o 'comum' só vê a própria empresa).
+FiltrosVencimento = namedtuple('FiltrosVencimento', 'empresa_id entidade status busca ocultar_vencidos')
+
+# A data de referência entra como parâmetro, então a mesma instrução compilada serve para qualquer dia.
+_HOJE = bindparam('hoje', type_=Date)
+_DIAS_RESTANTES = dias_entre(_HOJE, Vencimento.data_vencimento)
+_VENCIDO = Vencimento.data_vencimento < _HOJE
+_NO_PRAZO_DE_ALERTA = _DIAS_RESTANTES <= Vencimento.prazo_alerta_dias
+_STATUS = case((_VENCIDO, 'vencido'), (_NO_PRAZO_DE_ALERTA, 'vencendo'), else_='ok')
+
+
+def _filtrar_termo(stmt, padrao):
+    # Um escopo por termo: lambdas criados no mesmo laço compartilham a variável do closure,
+    # e o SQLAlchemy leria o último termo para todos eles.
+    return stmt + (lambda s: s.where(Vencimento.termos_busca.like(padrao)))
+
+
+def consulta_vencimentos(filtros, cursor=None, limite=None):
+    """
+    Monta a consulta de vencimentos com os filtros informados, já ordenada pela
+    chave (data_vencimento, entidade, id) usada na paginação por cursor.
+
+    Cada trecho é um lambda: o SQLAlchemy guarda a instrução construída e
+    compilada por combinação de trechos, e os valores (empresa, entidade, busca,
+    cursor, limite) viram parâmetros vinculados.
+    """
+    stmt = lambda_stmt(lambda: select(
+        Vencimento.id, Vencimento.entidade, Vencimento.nome, Vencimento.nome_exibicao, Vencimento.empresa_nome,
+        Vencimento.data_vencimento, _DIAS_RESTANTES.label('days_left'), _STATUS.label('status')))
+
+    if filtros.empresa_id:
+        empresa_id = filtros.empresa_id
+        stmt += lambda s: s.where(Vencimento.empresa_id == empresa_id)
+    if filtros.entidade:
+        entidade = filtros.entidade
+        stmt += lambda s: s.where(Vencimento.entidade == entidade)
+    termos = normalizar_busca(filtros.busca or '').split()
+    if termos and db.engine.dialect.name == 'sqlite':
+        # Cada termo casa com o início de uma palavra: "joao sil" encontra "JOÃO SILVA".
+        consulta_fts = ' '.join(f'"{termo}"*' for termo in termos)
+        stmt += lambda s: s.where(Vencimento.id.in_(
+            select(_busca.c.rowid).where(_busca.c.termos_busca.op('MATCH')(consulta_fts))))
+    else:
+        # Um LIKE por termo, em qualquer ordem, como no FTS; o índice de trigramas atende a cada um.
+        for termo in termos:
+            stmt = _filtrar_termo(stmt, f'%{termo}%')
+
+    if filtros.status == 'vencido':
+        stmt += lambda s: s.where(_VENCIDO)
+    elif filtros.status == 'vencendo':
+        stmt += lambda s: s.where(~_VENCIDO, _NO_PRAZO_DE_ALERTA)
+    elif filtros.status == 'ok':
+        stmt += lambda s: s.where(~_VENCIDO, ~_NO_PRAZO_DE_ALERTA)
+    elif filtros.status:
+        stmt += lambda s: s.where(false())
+    else:
+        # Sem filtro, o painel mostra vencidos e próximos a vencer.
+        stmt += lambda s: s.where(_NO_PRAZO_DE_ALERTA)
+    if filtros.ocultar_vencidos:
+        stmt += lambda s: s.where(~_VENCIDO)
+
+    if cursor:
+        data_cursor, entidade_cursor, id_cursor = cursor
+        stmt += lambda s: s.where(tuple_(Vencimento.data_vencimento, Vencimento.entidade, Vencimento.id)
+                                  > tuple_(data_cursor, entidade_cursor, id_cursor))
+    stmt += lambda s: s.order_by(Vencimento.data_vencimento, Vencimento.entidade, Vencimento.id)
+    if limite:
+        stmt += lambda s: s.limit(limite)
+    return stmt
+
+
+def iterar_vencimentos(filtros, hoje, cursor=None, limite=None, lote=1000):
+    """
+    Percorre as linhas de vencimento (id, entidade, nome, nome_exibicao,
+    empresa_nome, data_vencimento, days_left, status) em lotes de `lote` linhas.
+    """
+    resultado = db.session.execute(consulta_vencimentos(filtros, cursor, limite), {'hoje': hoje},
+                                   execution_options={'yield_per': lote})
+    yield from resultado
+
+
+def consulta_contadores(empresa_id=None):
+    """
+    Monta a instrução única dos contadores dos cards do painel: somas
+    condicionais sobre o índice (com o prazo configurado de cada documento, como
+    na tabela do painel) e subconsultas para os totais.
+    """
+    if empresa_id:
+        stmt = lambda_stmt(lambda: select(
+            func.coalesce(func.sum(case((_VENCIDO, 1), else_=0)), 0).label('vencidos'),
+            func.coalesce(func.sum(case((and_(~_VENCIDO, _NO_PRAZO_DE_ALERTA), 1), else_=0)), 0).label('vencendo'),
+            select(func.count(Empresa.id)).where(Empresa.id == empresa_id).scalar_subquery().label('empresas'),
+            select(func.count(Motorista.id)).where(Motorista.empresa_id == empresa_id)
+            .scalar_subquery().label('motoristas'),
+        ).select_from(Vencimento).where(Vencimento.empresa_id == empresa_id))
+    else:
+        stmt = lambda_stmt(lambda: select(
+            func.coalesce(func.sum(case((_VENCIDO, 1), else_=0)), 0).label('vencidos'),
+            func.coalesce(func.sum(case((and_(~_VENCIDO, _NO_PRAZO_DE_ALERTA), 1), else_=0)), 0).label('vencendo'),
+            select(func.count(Empresa.id)).scalar_subquery().label('empresas'),
+            select(func.count(Motorista.id)).scalar_subquery().label('motoristas'),
+        ).select_from(Vencimento))
+    return stmt
+
+
+def contadores_painel(hoje, empresa_id=None):
+    """Contadores dos cards do painel (vencidos, vencendo, empresas, motoristas)."""
+    return dict(db.session.execute(consulta_contadores(empresa_id), {'hoje': hoje}).one()._mapping)
+
+
+# --- Comandos de linha de comando (flask vencimentos ...) ---
+
+vencimentos_cli = AppGroup('vencimentos', help='Manutenção do índice unificado de vencimentos.')
+
+
+@vencimentos_cli.command('reconstruir')
+def reconstruir_command():
+    """Recria a tabela de vencimentos a partir das tabelas de documentos."""
+    with db.engine.begin() as conexao:
+        total = reconstruir_indice(conexao)
+    invalidar_cache()
+    click.echo(f'{total} vencimentos indexados.')
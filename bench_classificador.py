@@ -0,0 +1,71 @@
+# bench_classificador.py
+"""
+Microbenchmark da classificação de documentos em tipos de alerta.
+
+Compara o laço antigo (substring por tipo genérico + re.sub por linha) com o
+ClassificadorDocumentos compilado, em linhas classificadas por segundo.
+
+Uso: python bench_classificador.py [quantidade_de_linhas]
+"""
+import random
+import re
+import sys
+import time
+
+from app.classificador import ClassificadorDocumentos
+
+PRAZOS = {'CNH': 45, 'ASO': 60, 'CRLV': 30, 'ALVARÁ': 90, 'SEGURO': 15}
+NOMES_BASE = [
+    'CNH', 'CNH DOCUMENTO 2', 'ASO PERIODICO', 'CRLV 2025', 'ALVARA SANITARIO', 'ALVARÁ DE FUNCIONAMENTO',
+    'CIPP', 'CIV - INSPECAO', 'CVVTR', 'ANTT RNTRC', 'LICENCIAMENTO ANUAL', 'SEGURO 1', 'SEGURO RCTR-C',
+    'CERTIDAO NEGATIVA DOCUMENTO', 'MOPP NAME: TREINAMENTO', 'TACOGRAFO 03.2025', 'EXAME TOXICOLOGICO',
+]
+
+
+def classificar_legado(nome, configs_dict, default_prazo=30):
+    """Reprodução do laço executado por linha antes do classificador."""
+    known_generic_types = ['CVVTR', 'CIV', 'CIPP', 'CRLV', 'ANTT', 'CNH', 'ASO', 'ALVARÁ', 'LICENCIAMENTO']
+    doc_name_upper = str(nome).upper()
+    prazo_alerta = default_prazo
+    found_generic = False
+    for generic_type in known_generic_types:
+        type_to_check = 'ALVARA' if generic_type == 'ALVARÁ' else generic_type
+        if type_to_check in doc_name_upper:
+            prazo_alerta = configs_dict.get(generic_type, default_prazo)
+            found_generic = True
+            break
+    if not found_generic:
+        cleaned = re.sub(r'[\s\d.-]+$', '', doc_name_upper.replace('DOCUMENTO', '').strip()).strip()
+        prazo_alerta = configs_dict.get(cleaned, default_prazo)
+    display = re.sub(r'\s*(NAME|DTYPE):.*', '', str(nome), flags=re.IGNORECASE).strip()
+    display = re.sub(r'DOCUMENTO', '', display, flags=re.IGNORECASE).strip()
+    display = re.sub(r'\s+', ' ', display).strip().upper()
+    return prazo_alerta, display
+
+
+def medir(rotulo, funcao, nomes):
+    inicio = time.perf_counter()
+    for nome in nomes:
+        funcao(nome)
+    duracao = time.perf_counter() - inicio
+    print(f"{rotulo:<45} {len(nomes) / duracao:>14,.0f} linhas/s  ({duracao:.3f}s)")
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    random.seed(42)
+
+    # Cenário real: muitos documentos, poucos nomes distintos.
+    repetidos = [random.choice(NOMES_BASE) for _ in range(quantidade)]
+    # Pior caso: todos os nomes distintos (memo sempre frio).
+    distintos = [f"{random.choice(NOMES_BASE)} {i}X" for i in range(quantidade)]
+
+    print(f"--- {quantidade:,} linhas ---")
+    medir('legado (nomes repetidos)', lambda n: classificar_legado(n, PRAZOS), repetidos)
+    medir('classificador (nomes repetidos)', ClassificadorDocumentos(PRAZOS).classificar, repetidos)
+    medir('legado (nomes distintos)', lambda n: classificar_legado(n, PRAZOS), distintos)
+    medir('classificador (nomes distintos, memo frio)', ClassificadorDocumentos(PRAZOS).classificar, distintos)
+
+
+if __name__ == '__main__':
+    main()
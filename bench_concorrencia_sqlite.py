@@ -0,0 +1,143 @@
+# bench_concorrencia_sqlite.py
+"""
+Benchmark de leituras do painel durante uma importação, por perfil SQLite.
+
+Para cada perfil de PERFIS_SQLITE (app/dialeto.py), em um banco temporário novo
+com motoristas e validades já importados, uma thread reimporta a planilha de
+validades com todas as datas alteradas (confirmando a cada lote) enquanto N
+threads leem o painel em laço (primeira página de vencimentos e contadores,
+como a rota do painel sem cache). Mostra o tempo da importação, as leituras
+feitas, a latência das leituras (mediana, p95 e máxima) e quantas falharam com
+"database is locked".
+
+Uso: python bench_concorrencia_sqlite.py [leitores] [linhas] [linhas_por_lote]
+"""
+import datetime
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import pandas as pd
+from sqlalchemy import insert
+
+QUANTIDADE_MOTORISTAS = 20_000
+TIPOS_EVENTO = ['CNH', 'ASO', 'TOXICOLOGICO', 'MOPP', 'NR 35', 'INTEGRACAO']
+
+
+def gerar_planilha(caminho, linhas, deslocamento):
+    """Validades de motoristas; `deslocamento` (em dias) muda todas as datas entre uma planilha e outra."""
+    random.seed(42)
+    inicio = datetime.date.today() - datetime.timedelta(days=60) + datetime.timedelta(days=deslocamento)
+    pd.DataFrame({
+        'Tipo evento': [TIPOS_EVENTO[i % len(TIPOS_EVENTO)] for i in range(linhas)],
+        'Nome': [f'MOTORISTA {(i // len(TIPOS_EVENTO)) % QUANTIDADE_MOTORISTAS}' for i in range(linhas)],
+        'Data vencimento': [(inicio + datetime.timedelta(days=random.randrange(400))).strftime('%d/%m/%Y')
+                            for _ in range(linhas)],
+    }).to_csv(caminho, index=False)
+
+
+def popular(app, planilha):
+    from app import db
+    from app.importacao import executar_importacao
+    from app.models import Empresa, Motorista, format_cpf
+
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(Empresa), [{'razao_social': 'EMPRESA 1', 'cnpj': '11.222.333/0001-81',
+                                              'cnpj_chave': 11222333000181}])
+        db.session.execute(insert(Motorista), [
+            {'nome': f'MOTORISTA {i}', 'cpf': format_cpf(f'{i:011d}'), 'cpf_chave': i, 'empresa_id': 1}
+            for i in range(QUANTIDADE_MOTORISTAS)])
+        db.session.commit()
+        executar_importacao('doc_motorista', planilha)
+
+
+def ler_painel(app, parar, latencias, erros):
+    from sqlalchemy.exc import OperationalError
+
+    from app import db
+    from app.vencimentos import FiltrosVencimento, contadores_painel, iterar_vencimentos
+
+    filtros = FiltrosVencimento(empresa_id=None, entidade=None, status=None, busca=None, ocultar_vencidos=False)
+    with app.app_context():
+        while not parar.is_set():
+            hoje = datetime.date.today()
+            inicio = time.perf_counter()
+            try:
+                list(iterar_vencimentos(filtros, hoje, limite=100))
+                contadores_painel(hoje)
+            except OperationalError as erro:
+                erros.append(str(erro.orig))
+            else:
+                latencias.append(time.perf_counter() - inicio)
+            finally:
+                # Encerra a transação de leitura, como ao fim de uma requisição.
+                db.session.rollback()
+
+
+def medir(perfil, caminho_banco, planilhas, leitores, linhas_por_lote):
+    """Executado no processo filho: a configuração é lida quando config.py é importado."""
+    os.environ.update(DEV_DATABASE_URL='sqlite:///' + caminho_banco, SQLITE_PERFIL=perfil,
+                      IMPORTACAO_LINHAS_POR_LOTE=str(linhas_por_lote))
+    from sqlalchemy.exc import OperationalError
+
+    from app import create_app
+    from app.importacao import executar_importacao
+
+    app = create_app('development')
+    popular(app, planilhas[0])
+
+    parar, latencias, erros = threading.Event(), [], []
+    threads = [threading.Thread(target=ler_painel, args=(app, parar, latencias, erros)) for _ in range(leitores)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.5)
+
+    falha = ''
+    with app.app_context():
+        inicio = time.perf_counter()
+        try:
+            _, contadores = executar_importacao('doc_motorista', planilhas[1])
+        except OperationalError as erro:
+            falha, contadores = str(erro.orig), {}
+        duracao = time.perf_counter() - inicio
+    parar.set()
+    for thread in threads:
+        thread.join()
+
+    latencias.sort()
+    p95 = latencias[int(len(latencias) * 0.95)] if latencias else float('nan')
+    print(f"{perfil:<10} importação {duracao:>7.2f}s  atualizados={contadores.get('atualizados', 0):<7}"
+          f" leituras={len(latencias):<6} mediana={statistics.median(latencias or [float('nan')]) * 1000:>7.1f}ms"
+          f" p95={p95 * 1000:>7.1f}ms máx={(latencias[-1] if latencias else float('nan')) * 1000:>7.1f}ms"
+          f" bloqueadas={sum('locked' in erro for erro in erros)}" + (f"  FALHA NA IMPORTAÇÃO: {falha}" if falha else ''))
+
+
+def main():
+    leitores = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    linhas = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    linhas_por_lote = int(sys.argv[3]) if len(sys.argv) > 3 else 5_000
+
+    from app.dialeto import PERFIS_SQLITE
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        planilhas = [os.path.join(diretorio, f'validades_{n}.csv') for n in (1, 2)]
+        gerar_planilha(planilhas[0], linhas, 0)
+        gerar_planilha(planilhas[1], linhas, 30)
+        print(f"--- {leitores} leitores, importação de {linhas:,} linhas em lotes de {linhas_por_lote:,} ---")
+        for perfil in PERFIS_SQLITE:
+            caminho_banco = os.path.join(diretorio, f'bench_{perfil}.db')
+            subprocess.run([sys.executable, __file__, '--filho', perfil, caminho_banco, *planilhas,
+                            str(leitores), str(linhas_por_lote)], check=True)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--filho':
+        medir(sys.argv[2], sys.argv[3], sys.argv[4:6], int(sys.argv[6]), int(sys.argv[7]))
+    else:
+        main()
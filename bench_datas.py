@@ -0,0 +1,100 @@
+# bench_datas.py
+"""
+Benchmark da conversão das datas de vencimento das planilhas.
+
+Compara a conversão por linha usada antes (pd.to_datetime em cada célula, com o
+dia primeiro) e a mesma conversão memorizada por valor com a conversão da
+coluna inteira de app/datas.py, em linhas por segundo, para colunas de texto
+brasileiro, ISO, números de série do Excel, datas do Excel e uma mistura delas.
+A última coluna conta as células em que o resultado difere da conversão por
+linha, e as diferenças são erros dela: com o dia primeiro, ela troca dia e mês
+de datas ISO com dia até 12 ('2020-05-03' vira 5 de março) e lê os
+números de série como nanossegundos desde 1970.
+
+Uso: python bench_datas.py [linhas] [linhas_por_linha]
+A conversão por linha roda, por padrão, em uma amostra de 20.000 células.
+"""
+import datetime
+import random
+import sys
+import time
+import warnings
+
+import pandas as pd
+
+from app.datas import NormalizadorDatas
+
+INICIO = datetime.date(2020, 1, 1)
+
+
+def gerar_colunas(quantidade):
+    random.seed(42)
+    dias = [random.randrange(3650) for _ in range(quantidade)]
+    datas = [INICIO + datetime.timedelta(days=dia) for dia in dias]
+    serie_inicio = (INICIO - datetime.date(1899, 12, 30)).days
+    misto = []
+    for i, data in enumerate(datas):
+        formas = (data.strftime('%d/%m/%Y'), data.isoformat(), datetime.datetime.combine(data, datetime.time()),
+                  serie_inicio + dias[i])
+        misto.append(formas[i % len(formas)])
+    return {
+        'texto dd/mm/aaaa': pd.Series([data.strftime('%d/%m/%Y') for data in datas], dtype=object),
+        'texto ISO': pd.Series([data.isoformat() for data in datas], dtype=object),
+        'série do Excel': pd.Series([serie_inicio + dia for dia in dias], dtype=object),
+        'datas do Excel': pd.Series([datetime.datetime.combine(data, datetime.time()) for data in datas], dtype=object),
+        'misto': pd.Series(misto, dtype=object),
+    }
+
+
+def por_linha(valores):
+    """Conversão do laço antigo: uma chamada ao pandas por célula."""
+    resultado = []
+    for valor in valores:
+        try:
+            convertida = pd.to_datetime(valor, dayfirst=True, errors='coerce')
+            resultado.append(None if pd.isna(convertida) else convertida.date())
+        except (ValueError, TypeError):
+            resultado.append(None)
+    return resultado
+
+
+def por_valor(valores):
+    """A conversão por linha memorizada por valor distinto."""
+    memoria, resultado = {}, []
+    for valor in valores:
+        chave = valor if isinstance(valor, str) else repr(valor)
+        if chave not in memoria:
+            memoria[chave] = por_linha([valor])[0]
+        resultado.append(memoria[chave])
+    return resultado
+
+
+def por_coluna(valores):
+    return NormalizadorDatas().converter(valores).tolist()
+
+
+def medir(nome, funcao, valores, referencia):
+    inicio = time.perf_counter()
+    resultado = funcao(valores)
+    duracao = time.perf_counter() - inicio
+    diferencas = sum(1 for a, b in zip(resultado, referencia) if a != b)
+    print(f"  {nome:<22} {len(valores) / duracao:>14,.0f} linhas/s  ({duracao:.3f}s)  diferenças={diferencas}")
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    quantidade_por_linha = int(sys.argv[2]) if len(sys.argv) > 2 else min(quantidade, 20_000)
+    # O pandas avisa a cada célula quando o dia primeiro não se aplica (ISO); o aviso só atrapalha a medição.
+    warnings.simplefilter('ignore', UserWarning)
+
+    for nome, coluna in gerar_colunas(quantidade).items():
+        print(f"--- {nome}: {quantidade:,} linhas (por linha: {quantidade_por_linha:,}) ---")
+        amostra = coluna.head(quantidade_por_linha)
+        referencia = por_linha(amostra)
+        medir('por linha', por_linha, amostra, referencia)
+        medir('por valor (memória)', por_valor, coluna, referencia)
+        medir('coluna (app/datas.py)', por_coluna, coluna, referencia)
+
+
+if __name__ == '__main__':
+    main()
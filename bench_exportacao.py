@@ -0,0 +1,106 @@
+# bench_exportacao.py
+"""
+Benchmark das exportações do painel de vencimentos (CSV e XLSX).
+
+Cria um banco SQLite temporário com N linhas na tabela de vencimentos e chama
+cada endpoint de exportação em um processo separado, medindo linhas por segundo
+o tempo até o primeiro byte e o pico de memória (RSS) do processo durante a
+geração do arquivo.
+
+Uso: python bench_exportacao.py [quantidade_de_linhas]
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+FORMATOS = {'csv': '/admin/export/dashboard/csv', 'xlsx': '/admin/export/dashboard/xlsx'}
+
+
+def _criar_app(caminho_banco):
+    os.environ['DEV_DATABASE_URL'] = 'sqlite:///' + caminho_banco
+    from app import create_app
+    app = create_app('development')
+    app.config['WTF_CSRF_ENABLED'] = False
+    return app
+
+
+def popular_banco(caminho_banco, quantidade):
+    from sqlalchemy import insert
+
+    app = _criar_app(caminho_banco)
+    from app import db
+    from app.models import Empresa, Usuario, Vencimento
+
+    with app.app_context():
+        db.create_all()
+        empresa = Empresa(razao_social='EMPRESA BENCHMARK LTDA', cnpj='11222333000181')
+        db.session.add(empresa)
+        db.session.flush()
+        usuario = Usuario(nome='BENCH', login='bench', role='master', status='ativo')
+        usuario.set_password('bench')
+        db.session.add(usuario)
+        db.session.commit()
+
+        hoje = date.today()
+        # Todas as datas dentro do prazo de alerta, para que o filtro padrão do painel exporte todas as linhas.
+        entidades = ('motorista', 'veiculo', 'empresa')
+        lote = []
+        for i in range(quantidade):
+            lote.append({
+                'entidade': entidades[i % 3], 'documento_id': i + 1, 'owner_id': i % 5000 + 1,
+                'nome': f'DONO {i % 5000}', 'empresa_id': empresa.id, 'empresa_nome': empresa.razao_social,
+                'nome_documento': f'DOCUMENTO {i % 40}', 'tipo_documento': f'DOCUMENTO {i % 40}',
+                'nome_exibicao': f'DOCUMENTO {i % 40}', 'data_vencimento': hoje + timedelta(days=i % 60 - 30),
+                'prazo_alerta_dias': 30,
+            })
+            if len(lote) == 10_000:
+                db.session.execute(insert(Vencimento), lote)
+                lote = []
+        if lote:
+            db.session.execute(insert(Vencimento), lote)
+        db.session.commit()
+
+
+def medir_exportacao(caminho_banco, formato, quantidade):
+    """Executado no processo filho: faz a requisição e consome a resposta inteira."""
+    app = _criar_app(caminho_banco)
+    cliente = app.test_client()
+    cliente.post('/login', data={'username': 'bench', 'password': 'bench'})
+    memoria_inicial = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    inicio = time.perf_counter()
+    resposta = cliente.get(FORMATOS[formato], buffered=False)
+    tamanho, primeiro_byte = 0, None
+    for bloco in resposta.response:
+        if primeiro_byte is None and bloco:
+            primeiro_byte = time.perf_counter() - inicio
+        tamanho += len(bloco)
+    resposta.close()
+    duracao = time.perf_counter() - inicio
+
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{formato:<6} {quantidade / duracao:>12,.0f} linhas/s  ({duracao:.2f}s)  "
+          f"primeiro byte {primeiro_byte * 1000:>6.0f}ms  arquivo {tamanho / 1024 / 1024:>7.1f} MB  "
+          f"pico RSS {pico / 1024:>7.1f} MB (+{(pico - memoria_inicial) / 1024:.1f} MB na exportação)")
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho_banco = os.path.join(diretorio, 'bench.db')
+        popular_banco(caminho_banco, quantidade)
+        print(f"--- {quantidade:,} linhas ---")
+        # Um processo por formato, para que o pico de RSS de um não contamine o outro.
+        for formato in FORMATOS:
+            subprocess.run([sys.executable, __file__, '--filho', caminho_banco, formato, str(quantidade)], check=True)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--filho':
+        medir_exportacao(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+    else:
+        main()
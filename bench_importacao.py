@@ -0,0 +1,188 @@
+# bench_importacao.py
+"""
+Benchmark da importação de motoristas e veículos.
+
+Compara o laço antigo (df.iterrows() com uma consulta por linha para a empresa e
+outra para a duplicata) com o pipeline vetorizado de app/importacao.py, em
+linhas por segundo. Cada execução usa um banco SQLite temporário novo, com 500
+empresas e 10% dos motoristas/veículos do arquivo já cadastrados.
+
+Uso: python bench_importacao.py [linhas] [linhas_do_legado]
+O legado faz duas consultas por linha; por padrão roda em uma amostra de 10.000 linhas.
+"""
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+from sqlalchemy import insert
+
+QUANTIDADE_EMPRESAS = 500
+
+
+def _cnpj(i):
+    return f"{10_000_000 + i:08d}000{i % 10}{i % 7}{i % 3}"[:14]
+
+
+def gerar_planilhas(quantidade):
+    random.seed(42)
+    cnpjs = [_cnpj(i) for i in range(QUANTIDADE_EMPRESAS)]
+    motoristas, veiculos = [], []
+    for i in range(quantidade):
+        cnpj = random.choice(cnpjs)
+        cpf = f"{i:011d}"
+        placa = f"B{i:06d}"
+        if i % 50 == 0:
+            cpf = cpf[:5]  # CPF inválido
+        if i % 97 == 0:
+            cnpj = '99999999000199'  # empresa inexistente
+        if i % 40 == 1:
+            cpf, placa = f"{i - 1:011d}", f"B{i - 1:06d}"  # repetido dentro do arquivo
+        motoristas.append({'nome': f'motorista {i}', 'cpf': cpf, 'cnpj_transportador': cnpj,
+                           'cnh': str(90_000_000_000 + i), 'operacao': 'sul'})
+        veiculos.append({'placa': placa.lower(), 'cnpj_transportador': cnpj, 'operacao': 'norte'})
+    return pd.DataFrame(motoristas, dtype=str), pd.DataFrame(veiculos, dtype=str)
+
+
+def criar_app():
+    from app import create_app
+    return create_app('development')
+
+
+def popular(app, quantidade):
+    from app import db
+    from app.models import Empresa, Motorista, Veiculo, format_cnpj, format_cpf
+
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(Empresa), [
+            {'razao_social': f'EMPRESA {i}', 'cnpj': format_cnpj(_cnpj(i)), 'cnpj_chave': int(_cnpj(i))}
+            for i in range(QUANTIDADE_EMPRESAS)])
+        # 10% do arquivo já cadastrado (as linhas múltiplas de 10).
+        db.session.execute(insert(Motorista), [
+            {'nome': f'MOTORISTA {i}', 'cpf': format_cpf(f"{i:011d}"), 'cpf_chave': i, 'empresa_id': 1}
+            for i in range(10, quantidade, 10)])
+        db.session.execute(insert(Veiculo), [
+            {'placa': f"B{i:06d}", 'placa_chave': f"B{i:06d}", 'empresa_id': 1} for i in range(10, quantidade, 10)])
+        db.session.commit()
+
+
+def importar_motoristas_legado(df):
+    """Reprodução do laço executado por linha antes do pipeline vetorizado."""
+    from app import db
+    from app.models import Empresa, Motorista, format_cnpj, format_cpf
+
+    cadastrados, existentes, nao_encontradas, invalidos = 0, 0, set(), []
+    for index, row in df.iterrows():
+        linha_num = index + 2
+        nome, cpf, cnpj = row.get('nome'), row.get('cpf'), row.get('cnpj_transportador')
+        if pd.isna(nome) or pd.isna(cpf) or pd.isna(cnpj):
+            invalidos.append(f"Linha {linha_num}: Faltando nome, cpf ou cnpj.")
+            continue
+        cnpj_limpo = re.sub(r'[^0-9]', '', str(cnpj))
+        if len(cnpj_limpo) != 14:
+            invalidos.append(f"Linha {linha_num}: CNPJ '{cnpj}' inválido.")
+            continue
+        empresa = Empresa.query.filter_by(cnpj=format_cnpj(cnpj_limpo)).first()
+        if not empresa:
+            nao_encontradas.add(format_cnpj(cnpj_limpo))
+            continue
+        cpf_limpo = re.sub(r'[^0-9]', '', str(cpf))
+        if len(cpf_limpo) != 11:
+            invalidos.append(f"Linha {linha_num}: CPF '{cpf}' inválido.")
+            continue
+        if Motorista.query.filter_by(cpf=format_cpf(cpf_limpo)).first():
+            existentes += 1
+            continue
+        db.session.add(Motorista(
+            nome=str(nome).upper(), cpf=cpf_limpo,
+            cnh=str(row.get('cnh')) if pd.notna(row.get('cnh')) else None,
+            operacao=str(row.get('operacao')).upper() if pd.notna(row.get('operacao')) else None,
+            empresa_id=empresa.id
+        ))
+        cadastrados += 1
+    return cadastrados, existentes, nao_encontradas, invalidos
+
+
+def importar_veiculos_legado(df):
+    from app import db
+    from app.models import Empresa, Veiculo, format_cnpj
+
+    cadastrados, existentes, nao_encontradas, invalidos = 0, 0, set(), []
+    for index, row in df.iterrows():
+        linha_num = index + 2
+        placa, cnpj = row.get('placa'), row.get('cnpj_transportador')
+        if pd.isna(placa) or pd.isna(cnpj):
+            invalidos.append(f"Linha {linha_num}: Faltando placa ou cnpj.")
+            continue
+        cnpj_limpo = re.sub(r'[^0-9]', '', str(cnpj))
+        if len(cnpj_limpo) != 14:
+            invalidos.append(f"Linha {linha_num}: CNPJ '{cnpj}' inválido.")
+            continue
+        empresa = Empresa.query.filter_by(cnpj=format_cnpj(cnpj_limpo)).first()
+        if not empresa:
+            nao_encontradas.add(format_cnpj(cnpj_limpo))
+            continue
+        placa_upper = str(placa).strip().upper()
+        if not placa_upper:
+            invalidos.append(f"Linha {linha_num}: Placa não pode estar em branco.")
+            continue
+        if Veiculo.query.filter_by(placa=placa_upper).first():
+            existentes += 1
+            continue
+        db.session.add(Veiculo(placa=placa_upper,
+                               operacao=str(row.get('operacao')).upper() if pd.notna(row.get('operacao')) else None,
+                               empresa_id=empresa.id))
+        cadastrados += 1
+    return cadastrados, existentes, nao_encontradas, invalidos
+
+
+def medir(caminho_banco, cenario, quantidade, quantidade_legado):
+    """Executado no processo filho: popula um banco novo e importa a planilha do cenário."""
+    # A URL do banco é lida quando config.py é importado, antes de qualquer import de `app`.
+    os.environ['DEV_DATABASE_URL'] = 'sqlite:///' + caminho_banco
+    from app import db
+    from app.importacao import importar_motoristas, importar_veiculos
+
+    cenarios = {
+        'motoristas legado': (importar_motoristas_legado, 0, quantidade_legado),
+        'motoristas vetorizado': (importar_motoristas, 0, quantidade),
+        'veículos legado': (importar_veiculos_legado, 1, quantidade_legado),
+        'veículos vetorizado': (importar_veiculos, 1, quantidade),
+    }
+    funcao, planilha, linhas = cenarios[cenario]
+    df = gerar_planilhas(quantidade)[planilha].head(linhas)
+
+    app = criar_app()
+    popular(app, quantidade)
+    with app.app_context():
+        inicio = time.perf_counter()
+        cadastrados, existentes, nao_encontradas, invalidos = funcao(df)
+        db.session.commit()
+        duracao = time.perf_counter() - inicio
+    print(f"{cenario:<24} {len(df) / duracao:>12,.0f} linhas/s  ({duracao:.2f}s)  "
+          f"novos={cadastrados} existentes={existentes} sem_empresa={len(nao_encontradas)} invalidos={len(invalidos)}")
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    quantidade_legado = int(sys.argv[2]) if len(sys.argv) > 2 else min(quantidade, 10_000)
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        print(f"--- {quantidade:,} linhas (legado: {quantidade_legado:,}) ---")
+        for numero, cenario in enumerate(('motoristas legado', 'motoristas vetorizado',
+                                          'veículos legado', 'veículos vetorizado')):
+            caminho_banco = os.path.join(diretorio, f'bench_{numero}.db')
+            subprocess.run([sys.executable, __file__, '--filho', caminho_banco, cenario,
+                            str(quantidade), str(quantidade_legado)], check=True)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--filho':
+        medir(sys.argv[2], sys.argv[3], int(sys.argv[4]), int(sys.argv[5]))
+    else:
+        main()
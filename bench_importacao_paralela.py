@@ -0,0 +1,105 @@
+# bench_importacao_paralela.py
+"""
+Benchmark da importação de várias planilhas de uma vez.
+
+Gera um envio com uma pasta de trabalho .xlsx de validades de motoristas por
+filial e mede o tempo de `executar_importacao` sobre o diretório, primeiro com
+as planilhas preparadas uma após a outra no próprio processo e depois com 1, 2,
+4... processos (até o número de núcleos). Cada execução usa um banco SQLite
+temporário novo, com os motoristas já cadastrados.
+
+Uso: python bench_importacao_paralela.py [arquivos] [linhas_por_arquivo]
+"""
+import datetime
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+from sqlalchemy import insert
+
+QUANTIDADE_MOTORISTAS = 20_000
+TIPOS_EVENTO = ['CNH', 'ASO', 'TOXICOLOGICO', 'MOPP', 'NR 35', 'INTEGRACAO']
+
+
+def gerar_envio(diretorio, arquivos, linhas):
+    random.seed(42)
+    inicio = datetime.date(2026, 1, 1)
+    for numero in range(arquivos):
+        motoristas = random.sample(range(QUANTIDADE_MOTORISTAS), min(linhas, QUANTIDADE_MOTORISTAS))
+        df = pd.DataFrame({
+            'Tipo evento': [TIPOS_EVENTO[i % len(TIPOS_EVENTO)] for i in range(linhas)],
+            'Nome': [f'MOTORISTA {motoristas[i % len(motoristas)]}' for i in range(linhas)],
+            'Data vencimento': [inicio + datetime.timedelta(days=random.randrange(900)) for _ in range(linhas)],
+        })
+        df.to_excel(os.path.join(diretorio, f'filial_{numero:02d}.xlsx'), index=False)
+
+
+def popular(app):
+    from app import db
+    from app.models import Empresa, Motorista, format_cpf
+
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(Empresa), [{'razao_social': 'EMPRESA 1', 'cnpj': '11.222.333/0001-81',
+                                              'cnpj_chave': 11222333000181}])
+        db.session.execute(insert(Motorista), [
+            {'nome': f'MOTORISTA {i}', 'cpf': format_cpf(f'{i:011d}'), 'cpf_chave': i, 'empresa_id': 1}
+            for i in range(QUANTIDADE_MOTORISTAS)])
+        db.session.commit()
+
+
+def medir(caminho_banco, envio, processos):
+    """Executado no processo filho: popula um banco novo e importa o envio."""
+    # A URL do banco é lida quando config.py é importado, antes de qualquer import de `app`.
+    os.environ['DEV_DATABASE_URL'] = 'sqlite:///' + caminho_banco
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+
+    from app import create_app
+    from app.importacao import executar_importacao
+
+    app = create_app('development')
+    popular(app)
+    executor = None
+    if processos:
+        executor = ProcessPoolExecutor(max_workers=processos, mp_context=multiprocessing.get_context('spawn'))
+        # Inicia os processos antes de medir, como no pool da fila, que fica ativo entre as importações.
+        list(executor.map(abs, range(processos)))
+    with app.app_context():
+        inicio = time.perf_counter()
+        _, contadores = executar_importacao('doc_motorista', envio, executor=executor)
+        duracao = time.perf_counter() - inicio
+    if executor:
+        executor.shutdown()
+    rotulo = f'{processos} processo(s)' if processos else 'sem processos'
+    print(f"{rotulo:<16} {duracao:>8.2f}s  novos={contadores['novos']} atualizados={contadores['atualizados']} "
+          f"planilhas={contadores['planilhas']}")
+
+
+def main():
+    arquivos = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    linhas = int(sys.argv[2]) if len(sys.argv) > 2 else 20_000
+    nucleos = os.cpu_count() or 1
+    quantidades = [0] + [n for n in (1, 2, 4, 8, 16, 32) if n <= nucleos]
+    if nucleos not in quantidades:
+        quantidades.append(nucleos)
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        envio = os.path.join(diretorio, 'envio')
+        os.makedirs(envio)
+        gerar_envio(envio, arquivos, linhas)
+        print(f"--- {arquivos} arquivos x {linhas:,} linhas ({nucleos} núcleos) ---")
+        for processos in quantidades:
+            caminho_banco = os.path.join(diretorio, f'bench_{processos}.db')
+            subprocess.run([sys.executable, __file__, '--filho', caminho_banco, envio, str(processos)], check=True)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--filho':
+        medir(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+    else:
+        main()
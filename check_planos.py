@@ -0,0 +1,147 @@
+# check_planos.py
+"""
+Verificação dos planos de execução das consultas do painel e das importações.
+
+Cria um banco SQLite temporário pelas migrações (o mesmo caminho do
+`flask db upgrade`), roda EXPLAIN QUERY PLAN em cada consulta abaixo e falha
+(código de saída 1) quando alguma percorre uma tabela inteira ("SCAN tabela",
+com ou sem índice) em vez de buscar pelo índice ("SEARCH"). Só a tabela FTS da
+busca textual e as tabelas que cada consulta declara são aceitas: o painel do
+'master', que percorre o índice da ordenação e para no limite, e os contadores
+do 'master', que somam todas as linhas.
+
+Uso: python check_planos.py [-v]
+"""
+import datetime
+import os
+import sys
+import tempfile
+
+from sqlalchemy import delete, event, func, select, update
+
+# A URL do banco é lida quando config.py é importado, antes de qualquer import de `app`.
+_diretorio = tempfile.TemporaryDirectory()
+os.environ['DEV_DATABASE_URL'] = 'sqlite:///' + os.path.join(_diretorio.name, 'planos.db')
+
+from flask_migrate import upgrade  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.models import (DocumentoFiscal, DocumentoMotorista, DocumentoVeiculo, Empresa, Motorista,  # noqa: E402
+                        Usuario, Veiculo, Vencimento)
+from app.vencimentos import (FiltrosVencimento, _consulta_origem, consulta_contadores,  # noqa: E402
+                             consulta_vencimentos)
+
+HOJE = datetime.date(2026, 1, 1)
+IDS = [1, 2, 3]
+
+
+def consultas():
+    """(descrição, instrução, tabelas em que a varredura completa é esperada)."""
+    painel = FiltrosVencimento(empresa_id=None, entidade=None, status=None, busca=None, ocultar_vencidos=False)
+    empresa = painel._replace(empresa_id=1)
+    cursor = (HOJE, 'motorista', 10)
+    # Sem filtro, o painel percorre ix_vencimentos_ordem na ordem da paginação e para no limite.
+    yield 'painel (master)', consulta_vencimentos(painel, limite=100), ('vencimentos',)
+    yield 'painel (master, página seguinte)', consulta_vencimentos(painel, cursor=cursor, limite=100), ()
+    yield 'painel (empresa)', consulta_vencimentos(empresa, limite=100), ()
+    yield 'painel (empresa, vencidos)', consulta_vencimentos(empresa._replace(status='vencido'), limite=100), ()
+    yield 'painel (empresa, motoristas)', consulta_vencimentos(empresa._replace(entidade='motorista'), limite=100), ()
+    yield 'painel (busca)', consulta_vencimentos(painel._replace(busca='joao'), limite=100), ()
+    yield 'contadores (empresa)', consulta_contadores(1), ()
+    # O 'master' soma todas as linhas do índice e conta todas as empresas e motoristas.
+    yield 'contadores (master)', consulta_contadores(), ('vencimentos', 'empresas', 'motoristas')
+
+    yield 'motoristas da empresa', select(Motorista).where(Motorista.empresa_id == 1).order_by(Motorista.nome), ()
+    yield 'veículos da empresa', select(Veiculo).where(Veiculo.empresa_id == 1).order_by(Veiculo.placa), ()
+    yield 'usuários da empresa', select(Usuario).where(Usuario.empresa_id == 1), ()
+    yield 'login', select(Usuario).filter_by(login='ADMIN'), ()
+    yield 'razão social repetida', select(Empresa).where(func.upper(Empresa.razao_social) == 'EMPRESA',
+                                                         Empresa.id != 1), ()
+    yield 'empresa por CNPJ', select(Empresa).where(Empresa.cnpj_chave == 11222333000181), ()
+    yield 'motorista por CPF', select(Motorista).where(Motorista.cpf_chave == 12345678901), ()
+    yield 'veículo por placa', select(Veiculo).where(Veiculo.placa_chave == 'ABC1C34'), ()
+    for documento, coluna in ((DocumentoMotorista, 'motorista_id'), (DocumentoVeiculo, 'veiculo_id'),
+                              (DocumentoFiscal, 'empresa_id')):
+        dono = getattr(documento, coluna)
+        yield (f'{documento.__tablename__} do dono por vencimento',
+               select(documento).where(dono == 1).order_by(documento.data_vencimento), ())
+        yield (f'{documento.__tablename__} vigentes do dono',
+               select(documento).where(dono == 1, documento.data_vencimento >= HOJE), ())
+        yield (f'importação: validades atuais de {documento.__tablename__}',
+               select(dono, documento.nome_documento, documento.data_vencimento).where(dono.in_(IDS)), ())
+
+    for entidade in ('motorista', 'veiculo', 'empresa'):
+        origem, coluna_documento, coluna_dono = _consulta_origem(entidade)
+        yield f'índice: documentos de {entidade}', origem.where(coluna_documento.in_(IDS)), ()
+        yield f'índice: donos de {entidade}', origem.where(coluna_dono.in_(IDS)), ()
+        yield (f'índice: reconstrução de {entidade}',
+               origem.where(coluna_documento > 0).order_by(coluna_documento).limit(2000), ())
+    tabela = Vencimento.__table__
+    yield 'índice: remover documentos', delete(tabela).where(tabela.c.entidade == 'motorista',
+                                                               tabela.c.documento_id.in_(IDS)), ()
+    yield 'índice: remover donos', delete(tabela).where(tabela.c.entidade == 'motorista',
+                                                          tabela.c.owner_id.in_(IDS)), ()
+    yield 'índice: remover empresas', delete(tabela).where(tabela.c.empresa_id.in_(IDS)), ()
+    yield 'índice: renomear empresa', update(tabela).where(tabela.c.empresa_id == 1).values(empresa_nome='X'), ()
+    yield 'índice: prazos do tipo', update(tabela).where(tabela.c.tipo_documento == 'CNH').values(
+        prazo_alerta_dias=30), ()
+
+
+def varreduras(plano, permitidas):
+    """Linhas do plano que leem uma tabela inteira ('SCAN tabela ...') fora das permitidas."""
+    encontradas = []
+    for detalhe in plano:
+        if not detalhe.startswith('SCAN ') or 'VIRTUAL TABLE' in detalhe:
+            continue
+        tabela = detalhe.split()[1]
+        if tabela not in permitidas:
+            encontradas.append(detalhe)
+    return encontradas
+
+
+def _prefixar_explain(conexao, cursor, instrucao, parametros, contexto, executemany):
+    return 'EXPLAIN QUERY PLAN ' + instrucao, parametros
+
+
+def explicar(conexao, instrucao):
+    """
+    Plano da instrução, executada pelo próprio SQLAlchemy (listas do IN
+    expandidas, parâmetros vinculados) com EXPLAIN QUERY PLAN na frente. As
+    linhas são lidas direto do cursor, antes do processamento dos tipos das colunas.
+    """
+    plano = []
+
+    def _ler_plano(conexao, cursor, instrucao, parametros, contexto, executemany):
+        plano.extend(linha[-1] for linha in cursor.fetchall())
+
+    event.listen(conexao, 'before_cursor_execute', _prefixar_explain, retval=True)
+    event.listen(conexao, 'after_cursor_execute', _ler_plano)
+    try:
+        conexao.execute(instrucao, {'hoje': HOJE})
+    finally:
+        event.remove(conexao, 'before_cursor_execute', _prefixar_explain)
+        event.remove(conexao, 'after_cursor_execute', _ler_plano)
+    return plano
+
+
+def main():
+    detalhado = '-v' in sys.argv[1:]
+    app = create_app('development')
+    falhas = 0
+    with app.app_context():
+        upgrade(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'))
+        with db.engine.connect() as conexao:
+            for descricao, instrucao, permitidas in consultas():
+                plano = explicar(conexao, instrucao)
+                problemas = varreduras(plano, permitidas)
+                falhas += bool(problemas)
+                print(f"{'FALHA' if problemas else 'ok':<6} {descricao}")
+                for detalhe in (plano if detalhado else problemas):
+                    print(f"         {detalhe}")
+    _diretorio.cleanup()
+    print(f"--- {falhas} consulta(s) com varredura completa ---")
+    return 1 if falhas else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+# check_replica.py
+"""
+Verificação do roteamento das leituras para a réplica.
+
+Cria um banco SQLite temporário pelas migrações e uma cópia dele como réplica
+(REPLICA_DATABASE_URL), sincronizada pelo comando `flask replica sincronizar`
+(API de backup online), e faz requisições como o usuário 'master', anotando em
+qual engine cada consulta rodou (fora a do usuário logado, sempre no
+principal, e a do atraso da réplica). Falha (código de saída 1) se alguma rota ler do lugar errado:
+
+- rotas somente leitura na réplica, quando ela está em dia;
+- no principal quando a réplica nunca foi sincronizada, quando está mais de
+  REPLICA_ATRASO_MAXIMO segundos atrasada e, depois de um POST, até ela
+  alcançar a gravação (o redirecionamento lê o que acabou de ser salvo);
+- rotas sem marcação sempre no principal.
+
+Uso: python check_replica.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import event
+
+# As URLs dos bancos são lidas quando config.py é importado, antes de qualquer import de `app`.
+_diretorio = tempfile.TemporaryDirectory()
+os.environ['DEV_DATABASE_URL'] = 'sqlite:///' + os.path.join(_diretorio.name, 'principal.db')
+os.environ['REPLICA_DATABASE_URL'] = 'sqlite:///' + os.path.join(_diretorio.name, 'replica.db')
+
+from flask_migrate import upgrade  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.models import Empresa, Motorista, Usuario  # noqa: E402
+from app.replica import INTERVALO_VERIFICACAO, replica  # noqa: E402
+
+
+def preparar(app):
+    with app.app_context():
+        upgrade(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'))
+        usuario = Usuario(nome='Verificação', login='verificacao', role='master')
+        usuario.set_password('senha')
+        db.session.add_all([usuario, Empresa(razao_social='Empresa da verificação', cnpj='11.222.333/0001-81')])
+        db.session.commit()
+
+
+def sincronizar(app):
+    resultado = app.test_cli_runner().invoke(args=['replica', 'sincronizar'])
+    assert resultado.exit_code == 0, resultado.output
+    # O momento da réplica é reaproveitado por INTERVALO_VERIFICACAO segundos.
+    time.sleep(INTERVALO_VERIFICACAO + 0.1)
+
+
+def main():
+    app = create_app('development')
+    app.config['WTF_CSRF_ENABLED'] = False
+    preparar(app)
+
+    consultas = []
+    with app.app_context():
+        for nome, engine in (('principal', db.engines[None]), ('réplica', db.engines['replica'])):
+            def _anotar(conexao, cursor, instrucao, parametros, contexto, executemany, nome=nome):
+                if 'FROM usuarios' not in instrucao and not instrucao.startswith('PRAGMA'):
+                    consultas.append(nome)
+            event.listen(engine, 'before_cursor_execute', _anotar)
+
+    cliente = app.test_client()
+    cliente.post('/login', data={'username': 'verificacao', 'password': 'senha'})
+    falhas = 0
+
+    def verificar(descricao, url, esperado, metodo='get', **kwargs):
+        nonlocal falhas
+        consultas.clear()
+        resposta = getattr(cliente, metodo)(url, **kwargs)
+        resposta.get_data()  # as exportações só consultam o banco enquanto o corpo é gerado
+        usadas = sorted(set(consultas))
+        problema = resposta.status_code >= 400 or usadas != [esperado]
+        falhas += problema
+        print(f"{'FALHA' if problema else 'ok':<6} {descricao}: {', '.join(usadas) or 'nenhuma consulta'}"
+              f" (HTTP {resposta.status_code})")
+
+    # Sessão recém-aberta: o POST do login não conta como gravação para este teste.
+    with cliente.session_transaction() as sessao:
+        sessao.pop('_gravado_em', None)
+
+    verificar('réplica nunca sincronizada: painel', '/admin/', 'principal')
+    sincronizar(app)
+    verificar('painel', '/admin/', 'réplica')
+    verificar('exportação CSV', '/admin/export/dashboard/csv', 'réplica')
+    verificar('exportação XLSX', '/admin/export/dashboard/xlsx', 'réplica')
+    verificar('listagem de empresas', '/admin/empresas', 'réplica')
+    verificar('listagem de motoristas', '/admin/motoristas', 'réplica')
+    verificar('listagem de veículos', '/admin/veiculos', 'réplica')
+    verificar('configurações', '/admin/configuracoes', 'réplica')
+    verificar('página de upload (sem marcação)', '/admin/upload_page', 'principal')
+
+    with app.app_context():
+        # Gravação fora de uma requisição: a réplica fica para trás, dentro do atraso aceito.
+        db.session.add(Motorista(nome='MOTORISTA NOVO', cpf='52998224725', empresa_id=1))
+        db.session.commit()
+    consultas.clear()
+    desatualizada = b'MOTORISTA NOVO' not in cliente.get('/admin/motoristas').data
+    falhas += not desatualizada
+    print(f"{'ok' if desatualizada else 'FALHA':<6} réplica dentro do atraso aceito ainda sem o motorista novo")
+
+    verificar('gravação (POST) com redirecionamento', '/admin/configuracoes/salvar', 'principal', metodo='post',
+              data={'prazo_CNH': '45'}, follow_redirects=True)
+    verificar('painel logo após a gravação', '/admin/', 'principal')
+    # A cópia registra o segundo em que começou: espera o segundo seguinte ao da gravação.
+    time.sleep(1)
+    sincronizar(app)
+    verificar('painel com a réplica já com a gravação', '/admin/', 'réplica')
+
+    atraso_maximo, replica.atraso_maximo = replica.atraso_maximo, 1.0
+    time.sleep(1.5)
+    verificar('réplica além de REPLICA_ATRASO_MAXIMO: painel', '/admin/', 'principal')
+    replica.atraso_maximo = atraso_maximo
+
+    _diretorio.cleanup()
+    print(f"--- {falhas} verificação(ões) com falha ---")
+    return 1 if falhas else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,6 +12,37 @@ class Config:
     # Desativa o rastreamento de modificações do SQLAlchemy para economizar recursos.
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Quantidade máxima de respostas do painel mantidas em cache por processo (LRU).
+    PAINEL_CACHE_TAMANHO = int(os.environ.get('PAINEL_CACHE_TAMANHO', 256))
+
+    # Importações de planilhas em segundo plano: threads por processo e onde os arquivos aguardam o processamento.
+    IMPORTACAO_WORKERS = int(os.environ.get('IMPORTACAO_WORKERS', 2))
+    IMPORTACAO_DIRETORIO = os.environ.get('IMPORTACAO_DIRETORIO') or os.path.join(basedir, 'instance', 'importacoes')
+    # Segundos sem gravar progresso para que uma importação em andamento seja dada como interrompida.
+    IMPORTACAO_TEMPO_SEM_PROGRESSO = int(os.environ.get('IMPORTACAO_TEMPO_SEM_PROGRESSO', 600))
+    # Linhas lidas, validadas e confirmadas por vez; limita a memória usada por uma importação.
+    IMPORTACAO_LINHAS_POR_LOTE = int(os.environ.get('IMPORTACAO_LINHAS_POR_LOTE', 20000))
+    # Processos que leem e validam as planilhas de envios com vários arquivos ou planilhas (0: na própria thread).
+    IMPORTACAO_PROCESSOS = int(os.environ.get('IMPORTACAO_PROCESSOS', os.cpu_count() or 1))
+
+    # PRAGMAs aplicados a cada conexão SQLite (app/dialeto.py): 'padrao' (os do SQLite) ou, com
+    # SQLITE_PERFIL=producao no ambiente, 'producao' (WAL, synchronous=NORMAL, busy_timeout, cache e
+    # mmap maiores). SQLITE_PRAGMAS sobrepõe valores do perfil.
+    SQLITE_PERFIL = os.environ.get('SQLITE_PERFIL', 'padrao')
+    SQLITE_PRAGMAS = {}
+
+    # Réplica de leitura (app/replica.py): painel, exportações e listagens leem dela enquanto ela estiver
+    # no máximo REPLICA_ATRASO_MAXIMO segundos atrás do principal; sem a URL, tudo vai para o principal.
+    REPLICA_DATABASE_URL = os.environ.get('REPLICA_DATABASE_URL')
+    SQLALCHEMY_BINDS = {'replica': REPLICA_DATABASE_URL} if REPLICA_DATABASE_URL else {}
+    REPLICA_ATRASO_MAXIMO = float(os.environ.get('REPLICA_ATRASO_MAXIMO', 30))
+
+    # Instrumentação SQL por requisição (app/instrumentacao.py): cabeçalho Server-Timing e log das requisições
+    # acima de SQL_LIMITE_LENTO_MS e das instruções repetidas com SQL_REPETICOES_N_MAIS_1 parâmetros diferentes.
+    SQL_INSTRUMENTACAO = os.environ.get('SQL_INSTRUMENTACAO', '').lower() in ('1', 'true', 'sim')
+    SQL_LIMITE_LENTO_MS = float(os.environ.get('SQL_LIMITE_LENTO_MS', 500))
+    SQL_REPETICOES_N_MAIS_1 = int(os.environ.get('SQL_REPETICOES_N_MAIS_1', 10))
+
 class DevelopmentConfig(Config):
     """Configurações para o ambiente de desenvolvimento."""
     DEBUG = True
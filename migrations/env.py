@@ -51,6 +51,17 @@ def get_metadata():
     return target_db.metadata
 
 
+# Objetos da busca textual criados por DDL própria (migração c4b91e7a5d02 e
+# app/vencimentos.py), fora do metadata: o autogenerate não deve removê-los.
+_OBJETOS_DA_BUSCA = ('vencimentos_busca', 'ix_vencimentos_termos_busca_trgm')
+
+
+def include_name(name, type_, parent_names):
+    if type_ in ('table', 'index'):
+        return not name.startswith(_OBJETOS_DA_BUSCA)
+    return True
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -65,7 +76,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_name=include_name
     )
 
     with context.begin_transaction():
@@ -100,6 +112,7 @@ def run_migrations_online():
         context.configure(
             connection=connection,
             target_metadata=get_metadata(),
+            include_name=include_name,
             **conf_args
         )
 
@@ -0,0 +1,25 @@
+"""indice de paginacao dos vencimentos
+
+Revision ID: 5b8e2d0f6c13
+Revises: a3f1c9d27b40
+Create Date: 2026-10-18 10:03:27.551904
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e2d0f6c13'
+down_revision = 'a3f1c9d27b40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('vencimentos', schema=None) as batch_op:
+        batch_op.create_index('ix_vencimentos_ordem', ['data_vencimento', 'entidade', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('vencimentos', schema=None) as batch_op:
+        batch_op.drop_index('ix_vencimentos_ordem')
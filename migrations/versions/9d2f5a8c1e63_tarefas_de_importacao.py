@@ -0,0 +1,45 @@
+"""tarefas de importacao
+
+Revision ID: 9d2f5a8c1e63
+Revises: c4b91e7a5d02
+Create Date: 2026-10-18 14:41:08.315290
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d2f5a8c1e63'
+down_revision = 'c4b91e7a5d02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('tarefas_importacao',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('tipo', sa.String(length=30), nullable=False),
+    sa.Column('nome_arquivo', sa.String(length=255), nullable=False),
+    sa.Column('caminho_arquivo', sa.String(length=500), nullable=False),
+    sa.Column('usuario_id', sa.Integer(), nullable=True),
+    sa.Column('estado', sa.String(length=20), nullable=False),
+    sa.Column('linhas_total', sa.Integer(), nullable=True),
+    sa.Column('linhas_processadas', sa.Integer(), nullable=False),
+    sa.Column('contadores', sa.JSON(), nullable=True),
+    sa.Column('mensagens', sa.JSON(), nullable=True),
+    sa.Column('criada_em', sa.DateTime(), nullable=False),
+    sa.Column('iniciada_em', sa.DateTime(), nullable=True),
+    sa.Column('concluida_em', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['usuario_id'], ['usuarios.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('tarefas_importacao', schema=None) as batch_op:
+        batch_op.create_index('ix_tarefas_importacao_usuario', ['usuario_id', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('tarefas_importacao', schema=None) as batch_op:
+        batch_op.drop_index('ix_tarefas_importacao_usuario')
+
+    op.drop_table('tarefas_importacao')
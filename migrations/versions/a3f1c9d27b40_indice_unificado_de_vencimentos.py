@@ -0,0 +1,116 @@
+"""indice unificado de vencimentos
+
+Revision ID: a3f1c9d27b40
+Revises: 63e752e421f5
+Create Date: 2026-10-18 09:12:41.318502
+
+A tabela é preenchida aqui com os documentos já cadastrados, como faz o
+`flask vencimentos reconstruir`.
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f1c9d27b40'
+down_revision = '63e752e421f5'
+branch_labels = None
+depends_on = None
+
+
+# Cópia da classificação de app/classificador.py do momento desta migração.
+_TIPOS_GENERICOS = ('CVVTR', 'CIV', 'CIPP', 'CRLV', 'ANTT', 'CNH', 'ASO', 'ALVARÁ', 'LICENCIAMENTO')
+_PRAZO_PADRAO = 30
+_RE_METADADOS = re.compile(r'\s*(NAME|DTYPE):.*', re.IGNORECASE | re.DOTALL)
+_RE_TIPOS_GENERICOS = re.compile(
+    '(?=(' + '|'.join(re.escape(tipo).replace('Á', '[AÁ]') for tipo in _TIPOS_GENERICOS) + '))')
+
+
+def _classificar(nome_documento, prazos):
+    """(tipo, nome de exibição, prazo) do nome bruto do documento."""
+    nome = str(nome_documento).upper()
+    if ':' in nome:
+        nome = _RE_METADADOS.sub('', nome)
+    nome = nome.strip()
+    encontrados = [tipo.replace('ALVARA', 'ALVARÁ') for tipo in _RE_TIPOS_GENERICOS.findall(nome)]
+    if encontrados:
+        tipo = min(encontrados, key=_TIPOS_GENERICOS.index)
+    else:
+        tipo = nome.replace('DOCUMENTO', '').strip().rstrip(' \t\n\r\f\v0123456789.-').strip()
+    return tipo, ' '.join(nome.replace('DOCUMENTO', '').split()), prazos.get(tipo, _PRAZO_PADRAO)
+
+
+# Linhas do índice de cada entidade (como app.vencimentos._consulta_origem), em lotes pelo id do documento.
+_ORIGENS = {
+    'motorista': "SELECT d.id, m.id, m.nome, e.id, e.razao_social, d.nome_documento, d.data_vencimento "
+                 "FROM documentos_motoristas d JOIN motoristas m ON d.motorista_id = m.id "
+                 "JOIN empresas e ON m.empresa_id = e.id",
+    'veiculo': "SELECT d.id, v.id, v.placa, e.id, e.razao_social, d.nome_documento, d.data_vencimento "
+               "FROM documentos_veiculos d JOIN veiculos v ON d.veiculo_id = v.id "
+               "JOIN empresas e ON v.empresa_id = e.id",
+    'empresa': "SELECT d.id, e.id, e.razao_social, e.id, e.razao_social, d.nome_documento, d.data_vencimento "
+               "FROM documentos_fiscais d JOIN empresas e ON d.empresa_id = e.id",
+}
+_TAMANHO_LOTE = 2000
+
+
+def _preencher(conexao, vencimentos):
+    prazos = {nome.upper(): prazo for nome, prazo in conexao.execute(
+        sa.text("SELECT nome_documento, prazo_alerta_dias FROM configuracoes_alertas"))}
+    classificacoes = {}
+    for entidade, origem in _ORIGENS.items():
+        consulta = sa.text(f"{origem} WHERE d.id > :ultimo ORDER BY d.id LIMIT :lote").columns(
+            data_vencimento=sa.Date())
+        ultimo_id = 0
+        while True:
+            linhas = conexao.execute(consulta, {'ultimo': ultimo_id, 'lote': _TAMANHO_LOTE}).all()
+            if not linhas:
+                break
+            registros = []
+            for documento_id, owner_id, nome, empresa_id, empresa_nome, nome_documento, data_vencimento in linhas:
+                if nome_documento not in classificacoes:
+                    classificacoes[nome_documento] = _classificar(nome_documento, prazos)
+                tipo, exibicao, prazo = classificacoes[nome_documento]
+                registros.append({
+                    'entidade': entidade, 'documento_id': documento_id, 'owner_id': owner_id, 'nome': nome,
+                    'empresa_id': empresa_id, 'empresa_nome': empresa_nome, 'nome_documento': nome_documento,
+                    'tipo_documento': tipo, 'nome_exibicao': exibicao, 'data_vencimento': data_vencimento,
+                    'prazo_alerta_dias': prazo,
+                })
+            conexao.execute(vencimentos.insert(), registros)
+            ultimo_id = linhas[-1][0]
+
+
+def upgrade():
+    vencimentos = op.create_table('vencimentos',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('entidade', sa.String(length=20), nullable=False),
+    sa.Column('documento_id', sa.Integer(), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('nome', sa.String(length=120), nullable=False),
+    sa.Column('empresa_id', sa.Integer(), nullable=False),
+    sa.Column('empresa_nome', sa.String(length=120), nullable=False),
+    sa.Column('nome_documento', sa.String(length=120), nullable=False),
+    sa.Column('tipo_documento', sa.String(length=120), nullable=False),
+    sa.Column('nome_exibicao', sa.String(length=120), nullable=False),
+    sa.Column('data_vencimento', sa.Date(), nullable=False),
+    sa.Column('prazo_alerta_dias', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['empresa_id'], ['empresas.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('entidade', 'documento_id', name='_vencimento_documento_uc')
+    )
+    with op.batch_alter_table('vencimentos', schema=None) as batch_op:
+        batch_op.create_index('ix_vencimentos_empresa_vencimento', ['empresa_id', 'data_vencimento'], unique=False)
+        batch_op.create_index('ix_vencimentos_tipo_documento', ['tipo_documento'], unique=False)
+
+    _preencher(op.get_bind(), vencimentos)
+
+
+def downgrade():
+    with op.batch_alter_table('vencimentos', schema=None) as batch_op:
+        batch_op.drop_index('ix_vencimentos_tipo_documento')
+        batch_op.drop_index('ix_vencimentos_empresa_vencimento')
+
+    op.drop_table('vencimentos')
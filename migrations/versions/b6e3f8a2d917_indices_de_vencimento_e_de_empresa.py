@@ -0,0 +1,67 @@
+"""indices de vencimento e de empresa
+
+Revision ID: b6e3f8a2d917
+Revises: 9d2f5a8c1e63
+Create Date: 2026-10-18 16:12:40.208733
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e3f8a2d917'
+down_revision = '9d2f5a8c1e63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('documentos_fiscais', schema=None) as batch_op:
+        batch_op.create_index('ix_documentos_fiscais_empresa_id_vencimento', ['empresa_id', 'data_vencimento'], unique=False)
+
+    with op.batch_alter_table('documentos_motoristas', schema=None) as batch_op:
+        batch_op.create_index('ix_documentos_motoristas_motorista_id_vencimento', ['motorista_id', 'data_vencimento'], unique=False)
+
+    with op.batch_alter_table('documentos_veiculos', schema=None) as batch_op:
+        batch_op.create_index('ix_documentos_veiculos_veiculo_id_vencimento', ['veiculo_id', 'data_vencimento'], unique=False)
+
+    with op.batch_alter_table('motoristas', schema=None) as batch_op:
+        batch_op.create_index('ix_motoristas_empresa_id', ['empresa_id'], unique=False)
+
+    with op.batch_alter_table('veiculos', schema=None) as batch_op:
+        batch_op.create_index('ix_veiculos_empresa_id', ['empresa_id'], unique=False)
+
+    with op.batch_alter_table('usuarios', schema=None) as batch_op:
+        batch_op.create_index('ix_usuarios_empresa_id', ['empresa_id'], unique=False)
+
+    with op.batch_alter_table('vencimentos', schema=None) as batch_op:
+        batch_op.create_index('ix_vencimentos_entidade_dono', ['entidade', 'owner_id'], unique=False)
+
+    # Índice de expressão: fora do batch_alter_table, que não recria a tabela para ele.
+    op.create_index('ix_empresas_razao_social_upper', 'empresas', [sa.text('upper(razao_social)')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_empresas_razao_social_upper', table_name='empresas')
+
+    with op.batch_alter_table('vencimentos', schema=None) as batch_op:
+        batch_op.drop_index('ix_vencimentos_entidade_dono')
+
+    with op.batch_alter_table('usuarios', schema=None) as batch_op:
+        batch_op.drop_index('ix_usuarios_empresa_id')
+
+    with op.batch_alter_table('veiculos', schema=None) as batch_op:
+        batch_op.drop_index('ix_veiculos_empresa_id')
+
+    with op.batch_alter_table('motoristas', schema=None) as batch_op:
+        batch_op.drop_index('ix_motoristas_empresa_id')
+
+    with op.batch_alter_table('documentos_veiculos', schema=None) as batch_op:
+        batch_op.drop_index('ix_documentos_veiculos_veiculo_id_vencimento')
+
+    with op.batch_alter_table('documentos_motoristas', schema=None) as batch_op:
+        batch_op.drop_index('ix_documentos_motoristas_motorista_id_vencimento')
+
+    with op.batch_alter_table('documentos_fiscais', schema=None) as batch_op:
+        batch_op.drop_index('ix_documentos_fiscais_empresa_id_vencimento')
@@ -0,0 +1,77 @@
+"""busca textual dos vencimentos
+
+Revision ID: c4b91e7a5d02
+Revises: e7d4a61b9f28
+Create Date: 2026-10-18 13:02:17.640215
+
+"""
+import re
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4b91e7a5d02'
+down_revision = 'e7d4a61b9f28'
+branch_labels = None
+depends_on = None
+
+
+def _normalizar(texto):
+    # Mesma normalização de app.vencimentos.normalizar_busca.
+    sem_acentos = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(re.sub(r'[^A-Z0-9]+', ' ', sem_acentos.upper()).split())
+
+
+def upgrade():
+    with op.batch_alter_table('vencimentos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('termos_busca', sa.String(length=250), server_default='', nullable=False))
+
+    conexao = op.get_bind()
+    linhas = conexao.execute(sa.text("SELECT id, nome, nome_documento FROM vencimentos")).all()
+    if linhas:
+        conexao.execute(
+            sa.text("UPDATE vencimentos SET termos_busca = :termos WHERE id = :id"),
+            [{'id': id_, 'termos': _normalizar(f"{nome} {documento}")} for id_, nome, documento in linhas]
+        )
+
+    if conexao.dialect.name == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE vencimentos_busca USING fts5("
+            "termos_busca, content='vencimentos', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+        )
+        op.execute(
+            "CREATE TRIGGER vencimentos_busca_ai AFTER INSERT ON vencimentos BEGIN "
+            "INSERT INTO vencimentos_busca(rowid, termos_busca) VALUES (new.id, new.termos_busca); END"
+        )
+        op.execute(
+            "CREATE TRIGGER vencimentos_busca_ad AFTER DELETE ON vencimentos BEGIN "
+            "INSERT INTO vencimentos_busca(vencimentos_busca, rowid, termos_busca) "
+            "VALUES ('delete', old.id, old.termos_busca); END"
+        )
+        op.execute(
+            "CREATE TRIGGER vencimentos_busca_au AFTER UPDATE OF termos_busca ON vencimentos BEGIN "
+            "INSERT INTO vencimentos_busca(vencimentos_busca, rowid, termos_busca) "
+            "VALUES ('delete', old.id, old.termos_busca); "
+            "INSERT INTO vencimentos_busca(rowid, termos_busca) VALUES (new.id, new.termos_busca); END"
+        )
+        op.execute("INSERT INTO vencimentos_busca(vencimentos_busca) VALUES ('rebuild')")
+    elif conexao.dialect.name == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute("CREATE INDEX ix_vencimentos_termos_busca_trgm ON vencimentos USING gin (termos_busca gin_trgm_ops)")
+
+
+def downgrade():
+    conexao = op.get_bind()
+    if conexao.dialect.name == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS vencimentos_busca_au")
+        op.execute("DROP TRIGGER IF EXISTS vencimentos_busca_ad")
+        op.execute("DROP TRIGGER IF EXISTS vencimentos_busca_ai")
+        op.execute("DROP TABLE IF EXISTS vencimentos_busca")
+    elif conexao.dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_vencimentos_termos_busca_trgm")
+
+    with op.batch_alter_table('vencimentos', schema=None) as batch_op:
+        batch_op.drop_column('termos_busca')
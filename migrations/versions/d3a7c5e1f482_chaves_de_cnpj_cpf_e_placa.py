@@ -0,0 +1,102 @@
+"""chaves de cnpj, cpf e placa
+
+Revision ID: d3a7c5e1f482
+Revises: b6e3f8a2d917
+Create Date: 2026-10-18 17:05:19.640118
+
+Preenche as chaves a partir dos valores cadastrados. Se dois cadastros tiverem a
+mesma chave (ex.: as placas 'ABC-1234' e 'ABC1C34'), a migração para e lista
+os ids, para que o cadastro repetido seja corrigido antes.
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3a7c5e1f482'
+down_revision = 'b6e3f8a2d917'
+branch_labels = None
+depends_on = None
+
+
+# Cópias de chave_cnpj, chave_cpf e chave_placa (app/models.py) do momento desta migração.
+def _digitos(quantidade):
+    def chave(valor):
+        digitos = re.sub(r'\D', '', str(valor))
+        if len(digitos) != quantidade:
+            raise ValueError(valor)
+        return int(digitos)
+    return chave
+
+
+def _chave_placa(placa):
+    chave = re.sub(r'[^A-Z0-9]', '', str(placa).upper())
+    if re.match(r'^[A-Z]{3}[0-9]{4}$', chave):
+        chave = chave[:4] + chr(ord('A') + int(chave[4])) + chave[5:]
+    return chave
+
+
+# tabela: (coluna de origem, coluna da chave, tipo da chave, função da chave)
+_CHAVES = {
+    'empresas': ('cnpj', 'cnpj_chave', sa.BigInteger(), _digitos(14)),
+    'motoristas': ('cpf', 'cpf_chave', sa.BigInteger(), _digitos(11)),
+    'veiculos': ('placa', 'placa_chave', sa.String(length=10), _chave_placa),
+}
+
+
+def _calcular_chaves(conexao, nome_tabela, origem, coluna, funcao):
+    """Pares {'_id', '_chave'} de todas as linhas; para antes de alterar o banco se houver chave inválida ou repetida."""
+    tabela = sa.table(nome_tabela, sa.column('id'), sa.column(origem))
+    valores, invalidos, por_chave = [], [], {}
+    for id_, valor in conexao.execute(sa.select(tabela.c.id, tabela.c[origem])):
+        try:
+            chave = funcao(valor)
+        except ValueError:
+            invalidos.append(f'{id_} ({valor})')
+            continue
+        por_chave.setdefault(chave, []).append(id_)
+        valores.append({'_id': id_, '_chave': chave})
+    repetidos = [f'{chave}: ids {ids}' for chave, ids in por_chave.items() if len(ids) > 1]
+    if invalidos or repetidos:
+        raise RuntimeError(f'Não foi possível preencher {nome_tabela}.{coluna}. '
+                           f'Inválidos: {invalidos or "nenhum"}. Repetidos: {repetidos or "nenhum"}.')
+    return valores
+
+
+# No SQLite o batch_alter_table recria a tabela e não sabe copiar índices de expressão.
+def _remover_indice_razao_social():
+    op.drop_index('ix_empresas_razao_social_upper', table_name='empresas')
+
+
+def _criar_indice_razao_social():
+    op.create_index('ix_empresas_razao_social_upper', 'empresas', [sa.text('upper(razao_social)')], unique=False)
+
+
+def upgrade():
+    conexao = op.get_bind()
+    # Tudo é validado antes da primeira alteração: no SQLite a DDL não é desfeita se a migração parar no meio.
+    chaves = {nome_tabela: _calcular_chaves(conexao, nome_tabela, origem, coluna, funcao)
+              for nome_tabela, (origem, coluna, _, funcao) in _CHAVES.items()}
+    _remover_indice_razao_social()
+    for nome_tabela, (_, coluna, tipo, _) in _CHAVES.items():
+        with op.batch_alter_table(nome_tabela, schema=None) as batch_op:
+            batch_op.add_column(sa.Column(coluna, tipo, nullable=True))
+        if chaves[nome_tabela]:
+            tabela = sa.table(nome_tabela, sa.column('id'), sa.column(coluna))
+            conexao.execute(tabela.update().where(tabela.c.id == sa.bindparam('_id'))
+                            .values({coluna: sa.bindparam('_chave')}), chaves[nome_tabela])
+        with op.batch_alter_table(nome_tabela, schema=None) as batch_op:
+            batch_op.alter_column(coluna, existing_type=tipo, nullable=False)
+            batch_op.create_unique_constraint(f'uq_{nome_tabela}_{coluna}', [coluna])
+    _criar_indice_razao_social()
+
+
+def downgrade():
+    _remover_indice_razao_social()
+    for nome_tabela, (_, coluna, _, _) in reversed(list(_CHAVES.items())):
+        with op.batch_alter_table(nome_tabela, schema=None) as batch_op:
+            batch_op.drop_constraint(f'uq_{nome_tabela}_{coluna}', type_='unique')
+            batch_op.drop_column(coluna)
+    _criar_indice_razao_social()
@@ -0,0 +1,29 @@
+"""contador de versao dos dados
+
+Revision ID: e7d4a61b9f28
+Revises: 5b8e2d0f6c13
+Create Date: 2026-10-18 11:20:54.904117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7d4a61b9f28'
+down_revision = '5b8e2d0f6c13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    versao_dados = op.create_table('versao_dados',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('versao', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(versao_dados, [{'id': 1, 'versao': 0}])
+
+
+def downgrade():
+    op.drop_table('versao_dados')
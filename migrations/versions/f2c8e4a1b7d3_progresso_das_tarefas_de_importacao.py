@@ -0,0 +1,26 @@
+"""progresso das tarefas de importacao
+
+Revision ID: f2c8e4a1b7d3
+Revises: d3a7c5e1f482
+Create Date: 2026-10-18 19:05:31.482907
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c8e4a1b7d3'
+down_revision = 'd3a7c5e1f482'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('tarefas_importacao', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('atualizada_em', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('tarefas_importacao', schema=None) as batch_op:
+        batch_op.drop_column('atualizada_em')